@@ -34,10 +34,13 @@ class OpenSoulAgent:
         
         Args:
             agent_id (str): Unique identifier for this agent
-            config (dict, optional): Configuration dictionary
+            config (dict, optional): Configuration dictionary. Pass "service" (an
+                AuditLoggerService) to reuse one long-lived logger per agent instead
+                of building a new AuditLogger every session.
         """
         self.agent_id = agent_id
         self.config = config or {}
+        self.service = self.config.get("service")
         
         # Initialize logger (will be set in start_session)
         self.logger = None
@@ -82,10 +85,14 @@ class OpenSoulAgent:
         if "pgp" in self.config:
             opensoul_config["pgp"] = self.config["pgp"]
         
-        self.logger = AuditLogger(
-            priv_wif=os.getenv("BSV_PRIV_WIF"),
-            config=opensoul_config
-        )
+        if self.service is not None:
+            self.logger = self.service.register(self.agent_id, os.getenv("BSV_PRIV_WIF"), opensoul_config)
+            self.logger.new_session()
+        else:
+            self.logger = AuditLogger(
+                priv_wif=os.getenv("BSV_PRIV_WIF"),
+                config=opensoul_config
+            )
         
         # Track session
         self.current_session = {
@@ -307,6 +314,8 @@ class OpenSoulAgent:
         
         # Flush to blockchain
         tx_id = await self.safe_flush()
+        if self.service is None:
+            await self.logger.close(flush=False)  # stop the background auto-flusher
         
         # Print summary
         print(f"\n✓ Session ended: {self.current_session['id']}")
@@ -63,6 +63,9 @@ COLLABORATOR_PUBLIC_KEYS = [
 # Number of logs to accumulate before auto-flushing to blockchain
 FLUSH_THRESHOLD = 10
 
+# Maximum age (seconds) of the oldest unflushed log before a background flush
+FLUSH_MAX_AGE = 300  # 5 minutes
+
 # Session timeout in seconds (auto-end session after this duration of inactivity)
 SESSION_TIMEOUT = 1800  # 30 minutes
 
@@ -142,6 +145,7 @@ def get_opensoul_config():
     config = {
         "agent_id": AGENT_ID,
         "flush_threshold": FLUSH_THRESHOLD,
+        "flush_max_age": FLUSH_MAX_AGE,
     }
     
     # Add PGP configuration if enabled
@@ -174,7 +174,7 @@ class ResearchAgent:
         
         print("\n💾 Flushing logs to blockchain...")
         try:
-            tx_id = await self.logger.flush()
+            tx_id = await self.logger.close()  # final flush + stop auto-flusher
             print(f"✓ Session archived to blockchain")
             print(f"🔗 Transaction: https://whatsonchain.com/tx/{tx_id}")
             return tx_id
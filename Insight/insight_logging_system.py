@@ -10,6 +10,11 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import re
 
+try:
+    from sparse_merkle import SparseMerkleTree  # Scripts/sparse_merkle.py, with Scripts/ on the path
+except ImportError:  # optional: only needed for InsightStorage(index_path=...)
+    SparseMerkleTree = None
+
 
 # ==============================================================================
 # INSIGHT CATEGORIES
@@ -266,11 +271,23 @@ class InsightBuilder:
 # ==============================================================================
 
 class InsightStorage:
-    """Manages storage and retrieval of insights"""
+    """
+    Manages storage and retrieval of insights.
+    With index_path, insights are also kept in a sparse Merkle tree keyed by uuid,
+    so prove(uuid) shows that an insight was, or was never, stored under root().
+    """
     
-    def __init__(self, filepath: str = "insights.json"):
+    def __init__(self, filepath: str = "insights.json", index_path: str = None):
         self.filepath = filepath
         self.insights = self._load()
+        self.index = None
+        if index_path:
+            if SparseMerkleTree is None:
+                raise RuntimeError("index_path requires Scripts/sparse_merkle.py on the import path")
+            self.index = SparseMerkleTree(index_path)
+            if len(self.index) != len({i.get("uuid") for i in self.insights if i.get("uuid")}):
+                self.index.update({i["uuid"]: self._canonical(i) for i in self.insights if i.get("uuid")})
+                self.index.save()
     
     def _load(self) -> List[Dict]:
         """Load insights from file"""
@@ -285,6 +302,28 @@ class InsightStorage:
         self.insights.append(insight)
         with open(self.filepath, 'w') as f:
             json.dump(self.insights, f, indent=2)
+        if self.index is not None and insight.get("uuid"):
+            self.index.set(insight["uuid"], self._canonical(insight))
+            self.index.save()
+
+    @staticmethod
+    def _canonical(insight: Dict) -> bytes:
+        return json.dumps(insight, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    def root(self) -> str:
+        """Root of the uuid index (hex); publish it, e.g. in an audit log entry."""
+        if self.index is None:
+            raise ValueError("InsightStorage has no index_path")
+        return self.index.root().hex()
+
+    def prove(self, insight_uuid: str) -> Dict:
+        """
+        Inclusion or non-inclusion proof for an insight uuid. Check with
+        SparseMerkleTree.verify(proof, bytes.fromhex(root), uuid, canonical_json_or_None).
+        """
+        if self.index is None:
+            raise ValueError("InsightStorage has no index_path")
+        return self.index.prove(insight_uuid)
     
     def get_all(self) -> List[Dict]:
         """Get all insights"""
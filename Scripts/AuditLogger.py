@@ -1,47 +1,138 @@
-
 import asyncio
+import glob
+import heapq
 import json
 import os
+import time
+import uuid
 from datetime import datetime
 
-import requests
 from bsv import PrivateKey, P2PKH, Transaction, TransactionInput, TransactionOutput, Script, Opcode
 from wallet import Wallet
 from pgp_utils import PGPManager
+from chain_backend import ChainBackend, address_to_script, input_pubkey_hash, op_return_data
+from chain_client import ChainClient
+from history_index import HistoryIndex
+from batch_journal import BatchJournal
+from utxo_lanes import LaneManager, DUST_LIMIT
+from utxo_store import UtxoStore
+from shard_utils import ShardUtils, ShardAssembler
+from payload_pipeline import PayloadPipeline
+from metrics_codec import MetricsCodec
+from merkle_anchor import MerkleAnchor
+from sparse_merkle import SparseMerkleTree
+from fee_utils import FeeEngine, P2PKH_SCRIPT_SIZE
+from header_store import HeaderStore, block_hash
 
 API_BASE = Wallet.set_api_base(mainnet=True)
-CACHE_FILE = "audit_cache.json"  # local file for last_txid + last_utxo info
-import asyncio
-import json
-import os
-from datetime import datetime
-
-import requests
-from bsv import PrivateKey, P2PKH, Transaction, TransactionInput, TransactionOutput, Script, Opcode
-from wallet import Wallet
-
-API_BASE = Wallet.set_api_base(mainnet=True)
-CACHE_FILE = "audit_cache.json"  # local file for last_txid + last_utxo info
+CACHE_FILE = "audit_cache.json"  # legacy JSON state (last_txid, seq, lanes); imported into the state store once
+STATE_DB = "audit_state.db"      # shared lane UTXOs, seq and last_txid per address (safe across processes)
+HISTORY_DB = "audit_history.db"  # local index of decoded log payloads
+DEFAULT_CONFIG = {
+    "mode": "session",
+    "min_actions": 1,
+    "max_payload_kb": 4,
+    "batch_mode": "memory",
+    # Auto-flush triggers (None disables); whichever is hit first schedules a background flush
+    "flush_threshold": None,   # pending action count
+    "flush_max_bytes": None,   # pending serialized bytes
+    "flush_max_age": None,     # seconds since the oldest pending action
+    "flush_retry_delay": 5,    # back-off after a failed background flush
+    "max_unconfirmed_chain": 500,  # log txs allowed in flight per lane before waiting for confirmation
+    "lanes": 1,                # parallel change outputs; >1 lets flushes from one key run concurrently
+    "lease_ttl": 120,          # seconds before a crashed worker's leased lane can be taken over
+    "lane_min_value": 2000,    # re-split/merge lanes when any falls below this (sat)
+    "fee_rate": None,          # sat/byte; None = shared FeeEngine (fixed default or discovered rate)
+    "fee_policy_url": None,    # ARC-style policy endpoint to discover the rate from (cached with a TTL)
+    "codec": "zlib",           # payload compression: none / zlib / lzma / zstd (needs zstandard)
+    "codec_level": None,       # codec-specific level (None = codec default)
+    "codec_dictionary": None,  # path to a trained compression dictionary (zlib/zstd)
+    "serializer": "json",      # "columnar" packs metrics as columns with msgpack (smaller, needs msgpack)
+    "sharding": True,          # split payloads over max_payload_kb into shards instead of failing
+    "shard_kb": None,          # shard size (defaults to max_payload_kb); smaller = more outputs/fees
+    "shards_per_tx": 8,        # OP_RETURN shard outputs per tx before chaining another tx
+    "anchor": None,            # "merkle": only a Merkle root + leaf locator goes on chain per flush
+    "leaf_store": "local",     # where anchored actions go: "local" (leaf_dir) or "p2wdb" (public; use PGP)
+    "leaf_dir": "audit_leaves",
+    "session_index": None,     # path of a sparse Merkle tree of logged sessions; payloads then carry its root
+    "merkle_workers": None,    # processes hashing anchor trees of >= 65536 actions in parallel (None/1 = serial)
+    "history_read_ahead": 8,   # decoded txs buffered per lane ahead of an iter_history consumer
+    "history_concurrency": 4,  # chain lookups in flight while walking lanes back
+    "header_store": "audit_headers.bin",  # local block headers for verify_logs (SPV)
+    "header_checkpoint": None,  # height of a recent block the header store starts from; verify_logs needs it
+    "header_checkpoint_hash": None,  # that block's hash, from a source you trust
+    "header_max_target": None,  # easiest proof-of-work target accepted (default: 16x the checkpoint's)
+}
+_WALKING = object()  # walk state of a lane walker that has not finished yet
 
 class AuditLogger:
-    BATCH_FILE = "audit_batch.json"
+    BATCH_FILE = "audit_batch.json"  # legacy file batch, migrated into the journal
+    JOURNAL_DIR = "audit_journal"
     # All wallet/key management, payments, address book, etc. are now in wallet.py (Wallet class)
-    def __init__(self, priv_wif: str, config: dict = None):
+    def __init__(self, priv_wif: str, config: dict = None, client: ChainBackend = None, fees: FeeEngine = None,
+                 history: HistoryIndex = None, broadcaster=None, store: UtxoStore = None):
         self.priv_key = PrivateKey(priv_wif)
         self.address = self.priv_key.address(compressed=True)  # P2PKH default
-        self.config = config or {"mode": "session", "min_actions": 1, "max_payload_kb": 4, "batch_mode": "memory"}
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.cache_file = self.config.get("cache_file") or CACHE_FILE
+        # Lane UTXOs are leased from here, so several processes can share one key
+        self.store = store or UtxoStore.shared(self.config.get("state_db") or STATE_DB)
         self.session_start = datetime.utcnow().isoformat() + "Z"
-        self._load_cache()
+        # Chain backend (ChainBackend); by default the pooled WhatsOnChain client shared by
+        # all loggers on the same API base, or e.g. a SimulatedChain for offline load tests
+        self.client = client or ChainClient.shared(self.config.get("api_base", API_BASE))
+        # Size-based fees; the process-wide engine unless this logger sets its own rate/policy
+        if fees is None and (self.config.get("fee_rate") is not None or self.config.get("fee_policy_url")):
+            fees = FeeEngine(rate=self.config.get("fee_rate"), policy_url=self.config.get("fee_policy_url"))
+        self.fees = fees or FeeEngine.shared()
+        # Optional BroadcastBatcher: txs from many loggers go out in one multi-tx broadcast
+        self.broadcaster = broadcaster
+        self._load_state()
         self._init_batch()
-        # PGP config: expects dict with 'public_key', 'private_key', 'passphrase', 'enabled'
+        # Background auto-flush state (see _flush_loop)
+        self._flush_lock = asyncio.Lock()
+        self._flush_event = None
+        self._flusher = None
+        self._pending_bytes = 0
+        self._pending_since = None
+        self._inflight = set()            # background flush tasks
+        self._inflight_segments = set()   # journal segments claimed by in-flight flushes
+        self._lane_lock = asyncio.Lock()
+        # Local index of decoded log payloads; get_history syncs it incrementally
+        self.history = history or HistoryIndex(self.config.get("history_db", HISTORY_DB))
+        self._history_gaps = False  # a tx we wrote could not be indexed; the next read walks the chain
+        self._pubkey_hash = address_to_script(self.address)[3:23]  # spotting inputs that spend our outputs
+        # PGP config: expects dict with 'public_key', 'private_key', 'passphrase', 'enabled',
+        # and optionally 'multi_public_keys' (every listed agent can decrypt)
         self.pgp = None
         pgp_cfg = self.config.get("pgp")
         if pgp_cfg and pgp_cfg.get("enabled"):
             self.pgp = PGPManager(
                 public_key_str=pgp_cfg.get("public_key"),
                 private_key_str=pgp_cfg.get("private_key"),
-                passphrase=pgp_cfg.get("passphrase")
+                passphrase=pgp_cfg.get("passphrase"),
+                multi_public_keys=pgp_cfg.get("multi_public_keys")
             )
+        dictionary = None
+        if self.config.get("codec_dictionary"):
+            with open(self.config["codec_dictionary"], "rb") as f:
+                dictionary = f.read()
+        self.pipeline = PayloadPipeline(
+            codec=self.config["codec"],
+            level=self.config.get("codec_level"),
+            dictionary=dictionary,
+            pgp=self.pgp,
+            serializer=self.config.get("serializer", "json"),
+        )
+        # Merkle-anchored mode: actions to the leaf store, root on chain (see merkle_anchor.py)
+        self.anchor = None
+        if self.config.get("anchor") == "merkle":
+            self.anchor = MerkleAnchor(self.pipeline, store=self.config.get("leaf_store", "local"),
+                                     leaf_dir=self.config.get("leaf_dir", "audit_leaves"),
+                                     workers=self.config.get("merkle_workers"))
+        # Sessions this agent has logged, provable present or absent (see prove_session)
+        self.sessions = SparseMerkleTree(self.config["session_index"]) if self.config.get("session_index") else None
+        self.headers = None  # HeaderStore, opened by the first verify_logs
     """
     Immutable, on-chain audit logger for AI agents using BSV.
     Usage:
@@ -51,137 +142,574 @@ class AuditLogger:
     """
 
     def _init_batch(self):
+        self.journal = None
+        self.actions = []
         if self.config.get("batch_mode", "memory") == "file":
+            # One journal per address: loggers sharing a directory would replay and discard
+            # each other's segments (BatchJournal also locks its directory against that)
+            journal_dir = self.config.get("journal_dir") or os.path.join(self.JOURNAL_DIR, self.address)
+            if journal_dir != self.JOURNAL_DIR and glob.glob(os.path.join(self.JOURNAL_DIR, "*" + BatchJournal.SUFFIX)):
+                # Written when every logger shared JOURNAL_DIR, so whose batch it is cannot be told
+                print(f"Unflushed journal segments in {self.JOURNAL_DIR}/ predate per-address journals; "
+                      f"move them into {journal_dir}/ to replay them")
+            self.journal = BatchJournal(
+                journal_dir,
+                fsync=self.config.get("journal_fsync", "always"),
+                segment_kb=self.config.get("journal_segment_kb", 1024),
+            )
+            # Migrate a batch left by the old rewrite-whole-file format
             if os.path.exists(self.BATCH_FILE):
                 with open(self.BATCH_FILE, "r") as f:
                     try:
-                        self.actions = json.load(f)
+                        legacy = json.load(f)
                     except Exception:
-                        self.actions = []
-            else:
-                self.actions = []
-        else:
-            self.actions = []
+                        legacy = []
+                for entry in legacy:
+                    self.journal.append(entry)
+                os.remove(self.BATCH_FILE)
+            # Crash recovery: anything still journaled was never flushed
+            self.actions = self.journal.replay()
 
-    def _load_cache(self):
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, "r") as f:
+    def _load_state(self):
+        if self.store.state(self.address) is None and os.path.exists(self.cache_file):
+            # First run against the store: import the JSON cache this logger used to keep
+            with open(self.cache_file, "r") as f:
                 cache = json.load(f)
-                if cache.get("address") == self.address:
-                    self.last_txid = cache.get("last_txid")
-                    self.last_utxo = cache.get("last_utxo")  # {'txid', 'vout', 'value'}
-                    return
-        self.last_txid = None
-        self.last_utxo = None
-
-    def _save_cache(self, txid, utxo):
-        cache = {"address": self.address, "last_txid": txid, "last_utxo": utxo}
-        with open(CACHE_FILE, "w") as f:
-            json.dump(cache, f)
+            if cache.get("address") == self.address:
+                lanes = cache.get("lanes", [])
+                if not lanes and cache.get("last_utxo"):
+                    # Single change UTXO from before lanes existed becomes lane 0
+                    lanes = [{"id": 0, **cache["last_utxo"], "tx_hex": cache.get("last_tx_hex"),
+                              "unconfirmed": cache.get("unconfirmed", [])}]
+                self.store.import_state(self.address, cache.get("last_txid"), cache.get("seq", 0), lanes)
+        state = self.store.state(self.address) or {}
+        self.last_txid = state.get("last_txid")
+        # Each lane: {'id', 'txid', 'vout', 'value', 'tx_hex', 'unconfirmed'}, leased from the store
+        self.lanes = LaneManager(store=self.store, address=self.address,
+                                 lease_ttl=self.config.get("lease_ttl", 120))
+
+    @staticmethod
+    def _reset_lane(lane: dict):
+        # Our view of this lane's unconfirmed chain is no longer trustworthy; refetch its source next time
+        lane["tx_hex"] = None
+        lane["unconfirmed"] = []
+        lane.pop("_tx", None)
+
+    def new_session(self):
+        """Start a new session on a long-lived logger (payloads carry session_start)."""
+        self.session_start = datetime.utcnow().isoformat() + "Z"
+
+    @property
+    def pending_logs(self) -> list:
+        """Actions logged but not yet written to chain."""
+        return list(self.actions)
 
     def log(self, entry: dict):
         """Add a metric/action to batch. entry e.g. {'tokens_in': int, 'tokens_out': int, ...}"""
         entry["ts"] = datetime.utcnow().isoformat() + "Z"
         self.actions.append(entry)
-        if self.config.get("batch_mode", "memory") == "file":
-            import fcntl
-            with open(self.BATCH_FILE, "w") as f:
-                fcntl.flock(f, fcntl.LOCK_EX)
-                json.dump(self.actions, f)
-                fcntl.flock(f, fcntl.LOCK_UN)
+        if self.journal:
+            self.journal.append(entry)
+        self._note_pending(entry)
+
+    def _auto_flush_enabled(self) -> bool:
+        return any(self.config.get(k) for k in ("flush_threshold", "flush_max_bytes", "flush_max_age"))
+
+    def _note_pending(self, entry: dict):
+        # Never touches the chain: at most wakes the background flusher
+        if not self._auto_flush_enabled():
+            return
+        self._pending_bytes += len(json.dumps(entry))
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop (sync caller): thresholds apply on the next explicit flush
+        if self._flusher is None or self._flusher.done():
+            self._flush_event = asyncio.Event()
+            self._flusher = loop.create_task(self._flush_loop())
+        threshold = self.config.get("flush_threshold")
+        max_bytes = self.config.get("flush_max_bytes")
+        if (threshold and len(self.actions) >= threshold) or (max_bytes and self._pending_bytes >= max_bytes):
+            self._flush_event.set()  # repeated sets coalesce into one flush
+        elif len(self.actions) == 1:
+            self._flush_event.set()  # re-evaluate the max-age deadline
+
+    async def _flush_loop(self):
+        max_age = self.config.get("flush_max_age")
+        while True:
+            timeout = None
+            if max_age and self._pending_since is not None:
+                timeout = max(0.0, self._pending_since + max_age - time.monotonic())
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            if not self.actions or not self._flush_due(time.monotonic()):
+                continue
+            # One flush per lane may be on the network at once
+            task = asyncio.get_running_loop().create_task(self._background_flush())
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            if len(self._inflight) >= max(1, self.config.get("lanes", 1)):
+                await asyncio.wait(set(self._inflight), return_when=asyncio.FIRST_COMPLETED)
+
+    async def _background_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Background flush failed: {e}")
+            await asyncio.sleep(self.config.get("flush_retry_delay", 5))
+            # Retry after the back-off rather than on the next log(); the batch is pending again
+            if self._flush_event is not None:
+                self._flush_event.set()
+
+    def _flush_due(self, now: float) -> bool:
+        threshold = self.config.get("flush_threshold")
+        max_bytes = self.config.get("flush_max_bytes")
+        max_age = self.config.get("flush_max_age")
+        return bool(
+            (threshold and len(self.actions) >= threshold)
+            or (max_bytes and self._pending_bytes >= max_bytes)
+            or (max_age and self._pending_since is not None and now - self._pending_since >= max_age)
+        )
 
     async def flush(self):
-        if self.config.get("batch_mode", "memory") == "file":
-            import fcntl
-            # Reload from file in case of crash recovery
-            if os.path.exists(self.BATCH_FILE):
-                with open(self.BATCH_FILE, "r") as f:
-                    fcntl.flock(f, fcntl.LOCK_SH)
-                    try:
-                        self.actions = json.load(f)
-                    except Exception:
-                        self.actions = []
-                    fcntl.flock(f, fcntl.LOCK_UN)
-        if not self.actions:
-            return  # nothing to log
-
-        # Check config
-        if self.config["mode"] == "session" or len(self.actions) >= self.config["min_actions"]:
-            await self._write_to_chain()
-            self.actions = []  # clear after write
-            if self.config.get("batch_mode", "memory") == "file":
-                # Clear file after flush
-                with open(self.BATCH_FILE, "w") as f:
-                    json.dump([], f)
-
-    async def _write_to_chain(self):
-        import gzip
-        # Get current UTXO (prefer cache, fallback to query)
-        utxo = self.last_utxo or await self._query_current_utxo()
-        if not utxo:
-            raise ValueError("No UTXO found for address - fund it first")
+        """Write all pending actions to chain. Returns the txid, or None if nothing was written."""
+        async with self._flush_lock:
+            segments = []
+            if self.journal:
+                # Seal the active segment and replay everything sealed that no other
+                # in-flight flush has claimed (includes crash leftovers)
+                segments = [p for p in self.journal.rotate() if p not in self._inflight_segments]
+                self.actions = self.journal.replay(segments)
+            if not self.actions:
+                if self.journal:
+                    self.journal.discard(segments)  # sealed but empty
+                return None  # nothing to log
 
-        # Fetch source tx hex
-        source_tx_hex = await self._fetch_tx_hex(utxo["txid"])
-        source_tx = Transaction.from_hex(source_tx_hex)
+            # Check config
+            if not (self.config["mode"] == "session" or len(self.actions) >= self.config["min_actions"]):
+                return None
+            # Detach the batch so log() and other flushes can proceed while we are on the network
+            batch, self.actions = self.actions, []
+            pending_bytes, pending_since = self._pending_bytes, self._pending_since
+            self._pending_bytes, self._pending_since = 0, None
+            self._inflight_segments.update(segments)
+        try:
+            txid = await self._write_to_chain(batch)
+        except BaseException:  # failed or cancelled (wait_for, close): the batch is pending again
+            self.actions = batch + self.actions
+            self._pending_bytes += pending_bytes
+            if pending_since is not None:
+                self._pending_since = pending_since
+            raise
+        finally:
+            self._inflight_segments.difference_update(segments)
+        if self.journal:
+            self.journal.discard(segments)
+        return txid
+
+    async def close(self, flush: bool = True):
+        """Stop the background flusher, optionally flushing what is still pending."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._inflight:
+            await asyncio.wait(set(self._inflight))
+        try:
+            if flush:
+                return await self.flush()
+            return None
+        finally:
+            if self.anchor is not None:
+                self.anchor.close()
+            if self.journal is not None:
+                self.journal.close()  # releases the journal directory
+            if self.headers is not None:
+                self.headers.close()
+                self.headers = None
 
-        # Build payload
+    async def _write_to_chain(self, actions: list):
+        lane = await self._acquire_lane()
+        try:
+            txid = await self._write_on_lane(lane, actions)
+        finally:
+            await self.lanes.release(lane)
+        if self.lanes.low(self.config["lane_min_value"]):
+            # The batch is on chain now; a failed rebalance must not send it to flush()'s retry path
+            try:
+                async with self._lane_lock:
+                    if self.lanes.low(self.config["lane_min_value"]):
+                        await self._rebalance_lanes()
+            except Exception as e:
+                print(f"Lane rebalance failed (retried after the next flush): {e}")
+        return txid
+
+    async def _write_on_lane(self, lane: dict, actions: list):
+        source_tx = await self._source_tx(lane)
+
+        # Build payload; seq gives a total order across lanes (and processes sharing the key)
+        seq = await asyncio.to_thread(self.store.next_seq, self.address)
         payload = {
             "agent_id": self.config.get("agent_id", "default-agent"),
             "session_start": self.session_start,
             "timestamp": datetime.utcnow().isoformat() + "Z",
-            "metrics": self.actions,
+            "seq": seq,
+            "metrics": actions,
         }
-        data = json.dumps(payload).encode("utf-8")
-        # Encrypt if PGP enabled
-        if self.pgp:
-            data = self.pgp.encrypt(data)
-            # Store as string (utf-8) for OP_RETURN
-            data = data.encode("utf-8")
-        if len(data) > self.config["max_payload_kb"] * 1024:
-            # Compress if too large
-            data = gzip.compress(data)
-            if len(data) > self.config["max_payload_kb"] * 1024:
+        if self.sessions is not None:
+            # Sessions logged by earlier flushes; this one shows up in the next payload's root
+            payload["sessions_root"] = self.sessions.root().hex()
+        if self.anchor is not None:
+            payload = await self.anchor.commit(payload)
+            try:
+                txid = await self._send_payload(lane, source_tx, payload, seq)
+            except BaseException:
+                self.anchor.discard(payload["merkle"])  # a retried batch is committed again
+                raise
+            self.anchor.advance(payload["merkle"])
+        else:
+            txid = await self._send_payload(lane, source_tx, payload, seq)
+        if self.sessions is not None:
+            session = self._session_key(payload["agent_id"], payload["session_start"])
+            if session not in self.sessions:
+                self.sessions.set(session, txid.encode("ascii"))  # value: the session's first logged txid
+                self.sessions.save()
+        return txid
+
+    async def _send_payload(self, lane: dict, source_tx, payload: dict, seq: int) -> str:
+        """Encode payload and broadcast it on the lane (several chained txs if sharded). Returns the last txid."""
+        # Serialize -> compress -> encrypt (if PGP enabled), behind a self-describing header
+        data = self.pipeline.encode(payload)
+        max_bytes = self.config["max_payload_kb"] * 1024
+        chunks = [data]
+        if len(data) > max_bytes:
+            if not self.config.get("sharding", True):
                 raise ValueError("Payload too large even after compression")
+            # Shard across several OP_RETURN outputs, chaining more txs when one is not enough
+            shard_size = int((self.config.get("shard_kb") or self.config["max_payload_kb"]) * 1024)
+            chunks = ShardUtils.split(data, shard_size)
+        per_tx = max(1, self.config.get("shards_per_tx", 8))
+        groups = [chunks[i:i + per_tx] for i in range(0, len(chunks), per_tx)]
+        rate = await self.fees.rate_async()
+
+        for n, group in enumerate(groups):
+            tx, change_sat = self._build_log_tx(lane, source_tx, group, rate)
+
+            # Broadcast
+            tx_hex = tx.hex()
+            try:
+                txid = await self._broadcast(tx_hex) or tx.txid()  # some return txid
+            except Exception:
+                # Rejected, or lost on the way: a transport error or timeout may still have
+                # reached the network. If the node has the tx, only the reply was lost
+                txid = await self._landed(tx)
+                if txid is None:
+                    # It may still land: the lane's next holder checks the chain (_recover_lane)
+                    # instead of building a second spend of the same output
+                    self._reset_lane(lane)
+                    lane["_stale"] = True
+                    raise
+
+            # Update lane; the next tx on it chains directly off this one without refetching it
+            prev_txid = lane["txid"]
+            vout = len(group)  # change follows the OP_RETURN output(s)
+            lane.update({"txid": txid, "vout": vout, "value": change_sat, "tx_hex": tx_hex, "_tx": tx})
+            lane["unconfirmed"].append(txid)
+            source_tx = tx
+            self.last_txid = txid
+            await self.lanes.save(lane, last_txid=txid)
+            # Keep the history index warm without another round trip; a sharded
+            # payload is recorded on the tx carrying its last shards
+            last = n == len(groups) - 1
+            if not self.history.append(self.address, txid, prev_txid,
+                                       self._decode_payload(data) if last else None, seq=seq if last else None):
+                self._history_gaps = True
+        if len(groups) > 1 or len(chunks) > 1:
+            print(f"Logged session as {len(chunks)} shard(s) in {len(groups)} tx(s), last {txid}")
+        else:
+            print(f"Logged session to tx {txid}")
+        return txid
+
+    async def _landed(self, tx):
+        """txid of tx if the node already has it, else None."""
+        try:
+            await self.client.get_tx(tx.txid())
+        except Exception:  # not found, or the API is unreachable as well
+            return None
+        return tx.txid()
 
-        # Build tx
+    async def _broadcast(self, tx_hex: str):
+        if self.broadcaster is not None:
+            return await self.broadcaster.submit(tx_hex)
+        return await self.client.broadcast(tx_hex)
+
+    def _build_log_tx(self, lane: dict, source_tx, chunks: list, rate: float = None):
+        """Build and sign a tx spending the lane with one OP_RETURN output per chunk plus change."""
         tx_input = TransactionInput(
             source_transaction=source_tx,
-            source_txid=utxo["txid"],
-            source_output_index=utxo["vout"],
+            source_txid=lane["txid"],
+            source_output_index=lane["vout"],
             unlocking_script_template=P2PKH().unlock(self.priv_key),
         )
 
-        op_return_script = Script() \
-            .add(Opcode.OP_RETURN) \
-            .push_data(data)
-        op_return_out = TransactionOutput(locking_script=op_return_script, satoshis=0)
+        outputs = []
+        for chunk in chunks:
+            op_return_script = Script() \
+                .add(Opcode.OP_RETURN) \
+                .push_data(chunk)
+            outputs.append(TransactionOutput(locking_script=op_return_script, satoshis=0))
 
-        # Fee estimate (SDK auto or simple)
-        fee_sat = 300  # low estimate; use tx.fee() after build for accuracy
-        change_sat = utxo["value"] - fee_sat
-        if change_sat <= 546:  # dust limit approx
-            raise ValueError("Insufficient for fee")
+        # Fee from the signed size: one P2PKH input, the OP_RETURN output(s) and change
+        scripts = [FeeEngine.op_return_size(len(chunk)) for chunk in chunks] + [P2PKH_SCRIPT_SIZE]
+        fee_sat = self.fees.fee_for(1, scripts, rate)
+        change_sat = lane["value"] - fee_sat
+        if change_sat <= DUST_LIMIT:
+            raise ValueError(f"Insufficient for fee ({fee_sat} sat)")
 
-        change_out = TransactionOutput(
+        outputs.append(TransactionOutput(
             locking_script=P2PKH().lock(self.address),
             satoshis=change_sat
-        )
+        ))
 
-        tx = Transaction(inputs=[tx_input], outputs=[op_return_out, change_out], version=1)
+        tx = Transaction(inputs=[tx_input], outputs=outputs, version=1)
         tx.sign()  # SDK handles
+        return tx, change_sat
+
+    async def _acquire_lane(self) -> dict:
+        delay = self.lanes.poll
+        while not len(self.lanes):
+            async with self._lane_lock:
+                if not len(self.lanes) and await self.lanes.try_lock():
+                    try:
+                        if not len(self.lanes):
+                            utxo = await self._query_current_utxo()
+                            if not utxo:
+                                raise ValueError("No UTXO found for address - fund it first")
+                            await self.lanes.reset([{"id": 0, **utxo, "tx_hex": None, "unconfirmed": []}])
+                            if self.config.get("lanes", 1) > 1:
+                                await self._rebalance_lanes()
+                    finally:
+                        await self.lanes.unlock()
+                    continue
+            # Another process sharing the key is creating the lanes; it may also give up
+            # without any, so take the lock ourselves once it is free
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        lane = await self.lanes.acquire()
+        if lane.pop("_stale", False):
+            try:
+                await self._recover_lane(lane)
+            except Exception:
+                lane["_stale"] = True  # still unchecked
+                await self.lanes.release(lane)
+                raise
+        return lane
+
+    async def _recover_lane(self, lane: dict):
+        """
+        The lane was taken over from a worker whose lease expired (it crashed), so it
+        may have spent the stored output without recording the change. If so, the lost
+        change is an unclaimed output of a tx spending that stored output. Other unclaimed
+        outputs may be change a live worker has broadcast but not saved yet, so they are
+        never adopted; the adoption itself is checked again under the lane's lease.
+        """
+        utxos = await self.client.get_unspent(self.address)
+        if any(u["txid"] == lane["txid"] and u["vout"] == lane["vout"] for u in utxos):
+            return
+        claimed = {(other["txid"], other["vout"]) for other in self.lanes.to_list()}
+        spenders = {}  # txid -> whether it spends the lane's stored output
+        candidates = []
+        for utxo in utxos:
+            if (utxo["txid"], utxo["vout"]) in claimed:
+                continue
+            if utxo["txid"] not in spenders:
+                vin = (await self.client.get_tx(utxo["txid"])).get("vin", [])
+                spenders[utxo["txid"]] = any(i.get("txid") == lane["txid"] and i.get("vout") == lane["vout"]
+                                             for i in vin)
+            if spenders[utxo["txid"]]:
+                candidates.append(utxo)
+        utxo = await self.lanes.adopt(lane, candidates)
+        if utxo is None:
+            raise RuntimeError(f"Lane {lane['id']} output is spent and no unclaimed change of it is left to recover")
+        print(f"Recovered lane {lane['id']} onto {utxo['txid']}:{utxo['vout']}")
+
+    async def _rebalance_lanes(self):
+        """
+        Merge all lanes and re-split them into up to config["lanes"] outputs of at least
+        lane_min_value each. Waits for in-flight flushes to hand their lanes back first.
+        Caller holds _lane_lock.
+        """
+        wanted = self.config.get("lanes", 1)
+        min_value = self.config["lane_min_value"]
+        rate = await self.fees.rate_async()
+        split_fee = self.fees.fee_for(len(self.lanes), [P2PKH_SCRIPT_SIZE] * wanted, rate)
+        count = LaneManager.plan_count(self.lanes.total(), wanted, min_value, split_fee)
+        if count == len(self.lanes) == 1:
+            return  # nothing to split or merge; the single lane simply runs down
+        if not await self.lanes.try_lock():
+            return  # another process sharing the key is rebalancing
+        try:
+            await self._rebalance_locked(count, rate)
+        finally:
+            await self.lanes.unlock()
+
+    async def _rebalance_locked(self, count: int, rate: float):
+        lanes = await self.lanes.acquire_all()
+        try:
+            for lane in lanes:
+                if lane.pop("_stale", False):
+                    await self._recover_lane(lane)
+            sources = [(lane, await self._source_tx(lane)) for lane in lanes]
+            fee_sat = self.fees.fee_for(len(sources), [P2PKH_SCRIPT_SIZE] * count, rate)
+            tx, values = LaneManager.build_split_tx(self.priv_key, self.address, sources, count, fee_sat)
+            tx_hex = tx.hex()
+            txid = await self._broadcast(tx_hex) or tx.txid()
+        except Exception:
+            for lane in lanes:
+                await self.lanes.release(lane)
+            raise
+        unconfirmed = max((lane["unconfirmed"] for lane in lanes), key=len) + [txid]
+        await self.lanes.reset([
+            {"id": i, "txid": txid, "vout": i, "value": v, "tx_hex": tx_hex, "_tx": tx,
+             "unconfirmed": list(unconfirmed)}
+            for i, v in enumerate(values)
+        ])
+        # Index the split only if every lane it merged is indexed; a walk stopping at it
+        # would otherwise never reach the other lanes' logs
+        merged = list(dict.fromkeys(lane["txid"] for lane in lanes))
+        if not (all(self.history.contains(t) for t in merged)
+                and self.history.append(self.address, txid, merged[0], None)):
+            self._history_gaps = True
+        print(f"Split funding into {count} lane(s) in tx {txid}")
+
+    def _merkle(self) -> MerkleAnchor:
+        if self.anchor is None:
+            raise ValueError("Merkle anchoring not configured for this logger (set config anchor='merkle')")
+        return self.anchor
+
+    async def _anchor_of(self, txid: str) -> dict:
+        payload = self.history.get_log(txid)
+        if payload is None:
+            payload = self._decode_op_return(await self.client.get_tx(txid))
+        if not isinstance(payload, dict) or "merkle" not in payload:
+            raise ValueError(f"Tx {txid} is not a Merkle-anchored log")
+        return payload["merkle"]
+
+    async def get_anchored_actions(self, txid: str) -> list:
+        """Actions of a Merkle-anchored flush, fetched from the leaf store and checked against its root."""
+        return await self._merkle().load(await self._anchor_of(txid))
+
+    async def prove_action(self, txid: str, index: int) -> dict:
+        """
+        Inclusion proof that action number index was part of the flush anchored in txid:
+        {"action", "index", "proof", "root", "txid"}. Check with MerkleAnchor.verify(proof)
+        and compare proof["root"] with the root in the tx's OP_RETURN.
+        """
+        proof = await self._merkle().prove(await self._anchor_of(txid), index)
+        proof["txid"] = txid
+        return proof
 
-        # Broadcast
-        tx_hex = tx.hex()
-        resp = requests.post(f"{API_BASE}/tx/raw", json={"txhex": tx_hex})
-        if resp.status_code != 200:
-            raise RuntimeError(f"Broadcast failed: {resp.text}")
-        txid = resp.json().get("txid") or tx.txid()  # some return txid
+    async def prove_actions(self, txid: str, indices: list = None, compact: bool = False):
+        """
+        prove_action() for several actions of one flush (default all), building its tree once.
+        With compact=True, returns one multiproof dict instead (check with MerkleAnchor.verify_multi),
+        which ships each shared sibling hash once.
+        """
+        merkle = self._merkle()
+        anchor = await self._anchor_of(txid)
+        if compact:
+            proof = await merkle.prove_multi(anchor, indices)
+            proof["txid"] = txid
+            return proof
+        proofs = await merkle.prove_many(anchor, indices)
+        for proof in proofs:
+            proof["txid"] = txid
+        return proofs
 
-        # Update cache
-        new_utxo = {"txid": txid, "vout": 1, "value": change_sat}  # change is output 1
-        self._save_cache(txid, new_utxo)
-        print(f"Logged session to tx {txid}")
+    @staticmethod
+    def _session_key(agent_id: str, session_start: str) -> str:
+        return f"{agent_id}/{session_start}"
+
+    def prove_session(self, session_start: str = None, agent_id: str = None) -> dict:
+        """
+        Proof that a session was logged (or never was) under the current sessions root:
+        {"key", "siblings", "leaf", "session", "root"}. Check with
+        SparseMerkleTree.verify(proof, bytes.fromhex(root), proof["session"], first_txid.encode() or None);
+        the next flush publishes this root on chain as its payload's "sessions_root".
+        """
+        if self.sessions is None:
+            raise ValueError("Session index not enabled (set config 'session_index')")
+        session = self._session_key(agent_id or self.config.get("agent_id", "default-agent"),
+                                    session_start or self.session_start)
+        proof = self.sessions.prove(session)
+        proof.update({"session": session, "root": self.sessions.root().hex()})
+        return proof
+
+    async def verify_logs(self, txids: list = None, headers: HeaderStore = None) -> dict:
+        """
+        SPV-check log txs (default: every indexed log of this address) against local block
+        headers: {"verified": {txid: height}, "failed": [txid], "unproven": [txid]}.
+        "failed" proofs do not lead to their block's merkle root; "unproven" txs have no
+        proof yet (unconfirmed) or name a block the headers cannot reach. Txs verified
+        before only have their block re-checked locally; the rest fetch one merkle proof
+        each (history_concurrency in flight), and headers are synced once if needed.
+        """
+        if headers is None:
+            if self.headers is None:
+                height, trusted = self.config.get("header_checkpoint"), self.config.get("header_checkpoint_hash")
+                if height is None or not trusted:
+                    raise ValueError("verify_logs needs a trusted checkpoint: set config header_checkpoint "
+                                     "(a recent height) and header_checkpoint_hash, or pass headers")
+                self.headers = HeaderStore(self.config.get("header_store") or "audit_headers.bin",
+                                           base_height=height, checkpoint=trusted,
+                                           max_target=self.config.get("header_max_target"))
+            headers = self.headers
+        txids = list(dict.fromkeys(txids)) if txids is not None else self.history.log_txids(self.address)
+        result = {"verified": {}, "failed": [], "unproven": []}
+        for txid, (known_hash, height) in self.history.verified(txids).items():
+            if headers.height_of(known_hash) == height:  # still on the stored chain (no reorg since)
+                result["verified"][txid] = height
+        limit = asyncio.Semaphore(self.config.get("history_concurrency", 4))
+
+        async def fetch(txid: str):
+            async with limit:
+                try:
+                    return txid, await self.client.get_merkle_proof(txid)
+                except RuntimeError:
+                    return txid, None
+        proofs = dict(await asyncio.gather(*(fetch(t) for t in txids if t not in result["verified"])))
+        if any(p and p.get("targetType", "hash") == "hash" and headers.height_of(p["target"]) is None
+               for p in proofs.values()):
+            await headers.sync(self.client)
+        newly = []
+        for txid, proof in proofs.items():
+            if proof is None:
+                result["unproven"].append(txid)
+                continue
+            try:
+                height = headers.verify_tsc(proof, txid)
+            except ValueError:
+                result["unproven"].append(txid)
+                continue
+            if height is None:
+                result["failed"].append(txid)
+            else:
+                result["verified"][txid] = height
+                newly.append((txid, block_hash(headers.header(height)), height))
+        self.history.mark_verified(newly)
+        return result
+
+    def merkle_root(self) -> dict:
+        """Live {"root", "count"} over every action anchored so far in Merkle mode (no rebuild)."""
+        return self._merkle().running_root()
 
     def decrypt_log(self, encrypted_data: str) -> dict:
         """Decrypts a PGP-encrypted log entry (as string) and returns the JSON dict."""
@@ -191,60 +719,320 @@ class AuditLogger:
         return json.loads(decrypted)
 
     async def _query_current_utxo(self):
-        resp = requests.get(f"{API_BASE}/address/{self.address}/unspent")
-        utxos = resp.json()
+        utxos = await self.client.get_unspent(self.address)
         if not utxos:
             return None
         # Pick latest/confirmed or highest value
         utxo = max(utxos, key=lambda u: u.get("height", 0) or u["value"])
         return {"txid": utxo["txid"], "vout": utxo["vout"], "value": utxo["value"]}
 
+    async def _source_tx(self, lane: dict):
+        """The tx that created the lane's output: our own tx if we built it, else fetched from the API."""
+        if lane.get("tx_hex"):
+            await self._check_unconfirmed_depth(lane)
+            if lane.get("_tx") is None:
+                lane["_tx"] = Transaction.from_hex(lane["tx_hex"])
+            return lane["_tx"]
+        # Fetch source tx hex
+        source_tx_hex = await self._fetch_tx_hex(lane["txid"])
+        return Transaction.from_hex(source_tx_hex)
+
+    async def _check_unconfirmed_depth(self, lane: dict):
+        """
+        Bound the number of our txs in flight on a lane. Only called at the limit: ancestors confirm
+        before descendants, so a binary search finds the newest confirmed one in O(log n) calls.
+        """
+        unconfirmed = lane["unconfirmed"]
+        limit = self.config.get("max_unconfirmed_chain", 500)
+        if len(unconfirmed) < limit:
+            return
+        lo, hi = 0, len(unconfirmed)  # invariant: [0, lo) confirmed, [hi, end) unconfirmed
+        while lo < hi:
+            mid = (lo + hi) // 2
+            tx_data = await self.client.get_tx(unconfirmed[mid])
+            if tx_data.get("confirmations", 0) > 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        lane["unconfirmed"] = unconfirmed[lo:]
+        if len(lane["unconfirmed"]) >= limit:
+            raise RuntimeError(f"{len(lane['unconfirmed'])} log txs unconfirmed; waiting for a block")
+
     async def _fetch_tx_hex(self, txid: str):
-        # WhatsOnChain often has /tx/{txid}/hex or parse from /tx/{txid}
-        resp = requests.get(f"{API_BASE}/tx/{txid}/hex")
-        if resp.status_code == 200:
-            return resp.text.strip()
-        # Fallback: get /tx/{txid}, extract 'hex' if present
-        resp = requests.get(f"{API_BASE}/tx/{txid}")
-        data = resp.json()
-        if "hex" in data:
-            return data["hex"]
-        raise ValueError(f"Could not fetch hex for {txid}")
-
-    async def get_history(self):
-        # Trace back from current UTXO, collect OP_RETURN JSONs
-        utxo = await self._query_current_utxo()
-        if not utxo:
-            return []
+        return await self.client.get_tx_hex(txid)
 
-        logs = []
-        current_txid = utxo["txid"]
-        while current_txid:
-            tx_data = requests.get(f"{API_BASE}/tx/{current_txid}").json()
-            op_return = None
-            for out in tx_data.get("vout", []):
-                if out["value"] == 0 and "scriptPubKey" in out:
-                    script_hex = out["scriptPubKey"]["hex"]
-                    if script_hex.startswith("6a"):  # OP_RETURN
-                        # Parse data (skip OP_RETURN + push)
-                        push_byte = int(script_hex[2:4], 16)
-                        data_start = 2 + (1 if push_byte < 76 else 2)  # simple
-                        data_hex = script_hex[data_start*2:]
-                        try:
-                            data = bytes.fromhex(data_hex).decode("utf-8")
-                            op_return = json.loads(data)
-                        except:
-                            op_return = {"raw": data_hex}
+    def _decode_payload(self, data: bytes):
+        """Decode the bytes pushed in a log OP_RETURN (or reassembled from shards)."""
+        try:
+            return self.pipeline.decode(bytes(data))
+        except Exception:
+            return {"raw": data.hex()}
+
+    @staticmethod
+    def _op_return_data(tx_data: dict) -> list:
+        """
+        Payload of each OP_RETURN output of a tx, in output order, as memoryview
+        slices of the decoded script. Log outputs carry one push; if an output has
+        several (e.g. a protocol prefix), the payload is the last one.
+        """
+        datas = []
+        for out in tx_data.get("vout", []):
+            if out["value"] == 0 and "scriptPubKey" in out:
+                try:
+                    pushes = op_return_data(bytes.fromhex(out["scriptPubKey"]["hex"]))
+                except ValueError:
+                    continue  # malformed pushes; not one of our log outputs
+                if pushes:
+                    datas.append(pushes[-1])
+        return datas
+
+    def _decode_op_return(self, tx_data: dict, assembler: ShardAssembler = None):
+        """Decode a tx's log payload; shards are fed to assembler until the payload is complete."""
+        for data in self._op_return_data(tx_data):
+            if ShardUtils.parse(data) is None:
+                return self._decode_payload(data)
+            if assembler is not None:
+                full = assembler.add(data)
+                if full is not None:
+                    return self._decode_payload(full)
+        return None
+
+    async def get_history(self, agent_id: str = None, refresh: bool = False):
+        """
+        Return decoded log payloads in chronological order (by seq across lanes).
+        Served from the local history index; the chain is only walked back from the
+        current heads to the txids already indexed. With refresh=False, our own last
+        tx indexed and every tx we wrote since indexed too, no network calls are made.
+        """
+        heads = await self._unindexed_heads(refresh)
+        walks, tasks = {}, []
+        limit = asyncio.Semaphore(self.config.get("history_concurrency", 4))
+
+        def spawn(head: str):
+            walk_id = uuid.uuid4().hex
+            walks[walk_id] = _WALKING
+            tasks.append(asyncio.ensure_future(self._walk_lane(head, walk_id, walks, limit, spawn=spawn)))
+        for head in heads:
+            spawn(head)
+        try:
+            # Walks reaching a split/merge tx spawn more walks while we wait
+            while not all(task.done() for task in tasks):
+                await asyncio.wait([task for task in tasks if not task.done()])
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._commit_walks(walks)
+        for task in tasks:
+            if task.exception() is not None:
+                raise task.exception()
+        return self.history.get_logs(self.address, agent_id)
+
+    async def iter_history(self, agent_id: str = None, session_start: str = None, action: str = None,
+                           since=None, until=None, newest_first: bool = True, refresh: bool = False):
+        """
+        Stream decoded log payloads matching every given filter.
+            agent_id / session_start  - payload fields
+            action                    - payload has a metric with this action
+            since / until             - payload timestamp range (ISO string or naive UTC datetime)
+        Newest-first (the default) starts yielding as soon as each lane's newest tx is
+        decoded: lanes not yet indexed are walked concurrently, at most history_read_ahead
+        txs ahead of the consumer, merged by seq with what the index already has. Breaking
+        out stops the walks; wrap in contextlib.aclosing() to stop them immediately. A
+        newest-first read also stops once it is past since. Oldest-first syncs the index
+        like get_history, then streams it. Memory stays flat however long the chain is.
+        Usage:
+            async for log in logger.iter_history(action="web_search", since="2025-01-01T00:00:00Z"):
+                ...
+        """
+        since_us, until_us = self._history_time(since), self._history_time(until)
+
+        def matches(payload) -> bool:
+            if not isinstance(payload, dict):
+                return not (agent_id or session_start or action or since_us or until_us)
+            if agent_id and payload.get("agent_id") != agent_id:
+                return False
+            if session_start and payload.get("session_start") != session_start:
+                return False
+            if action and not any(isinstance(m, dict) and m.get("action") == action
+                                  for m in payload.get("metrics", [])):
+                return False
+            return True
+
+        if newest_first:
+            source = self._stream_newest(agent_id, refresh)
+        else:
+            await self.get_history(refresh=refresh)
+            source = self._stream_index(agent_id)
+        try:
+            async for payload in source:
+                ts = self._history_time(payload.get("timestamp")) if isinstance(payload, dict) else None
+                if ts is not None:
+                    if newest_first and since_us is not None and ts < since_us:
+                        break  # everything further back is older still
+                    if not newest_first and until_us is not None and ts > until_us:
                         break
-            if op_return:
-                logs.append(op_return)
+                    if (since_us is not None and ts < since_us) or (until_us is not None and ts > until_us):
+                        continue
+                elif since_us is not None or until_us is not None:
+                    continue
+                if matches(payload):
+                    yield payload
+        finally:
+            await source.aclose()
+
+    @staticmethod
+    def _history_time(value):
+        if value is None:
+            return None
+        if isinstance(value, datetime):
+            value = value.isoformat() + "Z"
+        micros = MetricsCodec.parse_timestamp(value)
+        if micros is None:
+            raise ValueError(f"Unrecognized timestamp: {value}")
+        return micros
+
+    async def _stream_index(self, agent_id: str = None):
+        for payload in self.history.iter_logs(self.address, agent_id):
+            yield payload
 
-            # Find prev input (assume first input is chain)
-            if tx_data.get("vin"):
-                prev_txid = tx_data["vin"][0]["txid"]
-                current_txid = prev_txid if prev_txid != "0"*64 else None
+    async def _stream_newest(self, agent_id: str, refresh: bool):
+        """Merge the index (newest-first) with concurrent walks of the unindexed lane heads."""
+        heads = await self._unindexed_heads(refresh)
+        read_ahead = max(1, self.config.get("history_read_ahead", 8))
+        limit = asyncio.Semaphore(self.config.get("history_concurrency", 4))
+        walks, queues, tasks = {}, [], []
+
+        def spawn(head: str):
+            walk_id = uuid.uuid4().hex
+            walks[walk_id] = _WALKING
+            queue = asyncio.Queue(read_ahead)
+            queues.append(queue)
+            tasks.append(asyncio.ensure_future(self._walk_lane(head, walk_id, walks, limit, queue, spawn)))
+        for head in heads:
+            spawn(head)
+        indexed = self.history.iter_logs(self.address, agent_id, newest_first=True)
+        counter = 0
+        heap = []
+
+        async def pull(source: int):
+            # Next payload from a source (0 = index, n = lane n-1) onto the heap, if any
+            nonlocal counter
+            if source == 0:
+                payload = next(indexed, _WALKING)
             else:
-                break
+                payload = await queues[source - 1].get()
+                if isinstance(payload, BaseException):
+                    raise payload
+            if payload is _WALKING:
+                return
+            counter += 1
+            seq = payload.get("seq") if isinstance(payload, dict) else None
+            # Highest seq first; unsequenced (pre-lane) payloads last, walked before indexed
+            key = (0, -seq) if isinstance(seq, int) else (1, 0 if source else 1, counter)
+            heapq.heappush(heap, (key, counter, source, payload))
+
+        pulled = 0  # walk sources with their next payload on the heap
+
+        async def pull_spawned():
+            # A walk spawns its branches (at a split/merge tx) before queueing anything
+            # older than that tx, so their payloads join the heap before it is popped
+            nonlocal pulled
+            while pulled < len(queues):
+                pulled += 1
+                await pull(pulled)
+
+        try:
+            await pull(0)
+            await pull_spawned()
+            while heap:
+                _, _, source, payload = heapq.heappop(heap)
+                yield payload
+                await pull(source)
+                await pull_spawned()
+        finally:
+            indexed.close()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._commit_walks(walks)
+
+    async def _unindexed_heads(self, refresh: bool) -> list:
+        """Lane heads (UTXO txids) the index has not reached yet; none if our own last tx is indexed."""
+        head = self.last_txid
+        if not refresh and not self._history_gaps and head and self.history.contains(head):
+            return []
+        self._history_gaps = False  # this walk fills them; _commit_walks flags any it leaves
+        utxos = await self.client.get_unspent(self.address)
+        # Every lane has its own head; walks branch at split/merge txs and stop at indexed txs
+        return [txid for txid in dict.fromkeys(u["txid"] for u in utxos) if not self.history.contains(txid)]
+
+    async def _walk_lane(self, head_txid: str, walk_id: str, walks: dict, limit: asyncio.Semaphore,
+                         queue: asyncio.Queue = None, spawn=None):
+        """
+        Walk back from head until a tx that is indexed, or staged by another walk
+        in walks, staging every tx (newest-first) and queueing decoded payloads.
+        A split/merge tx spends several of our lanes: the walk follows the first and
+        spawn(txid) starts a walk down each other one. Sets walks[walk_id] to the tx
+        the walk stopped at (None where our funding came from another address).
+        """
+        try:
+            assembler = ShardAssembler()  # shards of one payload span consecutive txs
+            depth, current_txid = 0, head_txid
+            while current_txid and not self._walked(current_txid, walk_id, walks):
+                async with limit:
+                    tx_data = await self.client.get_tx(current_txid)
+                if self._walked(current_txid, walk_id, walks):
+                    break  # another lane's walk got here while we were fetching
+                parents = self._own_parents(tx_data)
+                prev_txid = parents[0] if parents else None
+                payload = self._decode_op_return(tx_data, assembler)
+                self.history.stage(walk_id, depth, self.address, current_txid, prev_txid, payload)
+                depth += 1
+                if spawn is not None:
+                    for parent in parents[1:]:
+                        spawn(parent)
+                if queue is not None and payload is not None:
+                    await queue.put(payload)
+                current_txid = prev_txid
+            walks[walk_id] = current_txid
+        except Exception as e:
+            if queue is None:
+                raise
+            await queue.put(e)
+            return
+        if queue is not None:
+            await queue.put(_WALKING)
+
+    def _own_parents(self, tx_data: dict) -> list:
+        """Txids of the outputs of ours a tx spends (one for a log tx, every merged lane for a split)."""
+        parents = []
+        for txin in tx_data.get("vin", []):
+            txid = txin.get("txid")
+            if not txid or txid == "0" * 64:
+                continue
+            script = (txin.get("scriptSig") or {}).get("hex")
+            if script is None:  # backend without unlocking scripts: assume the first input is the chain
+                return parents or [txid]
+            if input_pubkey_hash(bytes.fromhex(script)) == self._pubkey_hash and txid not in parents:
+                parents.append(txid)
+        return parents
+
+    def _walked(self, txid: str, walk_id: str, walks: dict) -> bool:
+        return self.history.contains(txid) or any(w in walks and w != walk_id for w in self.history.staged_by(txid))
 
-        logs.reverse()  # chrono order
-        return logs
+    def _commit_walks(self, walks: dict):
+        """Index finished walks, each once the tx it stopped at is indexed; drop unfinished ones."""
+        finished = {w: base for w, base in walks.items() if base is not _WALKING}
+        progress = True
+        while progress:
+            progress = False
+            for walk_id, base in list(finished.items()):
+                if base is None or self.history.contains(base):
+                    self.history.commit_walk(walk_id, base)
+                    del finished[walk_id]
+                    progress = True
+        for walk_id, base in walks.items():
+            if base is _WALKING or walk_id in finished:
+                self.history.drop_walk(walk_id)
+                self._history_gaps = True  # e.g. a newest-first read stopped early
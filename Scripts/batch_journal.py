@@ -0,0 +1,158 @@
+"""
+batch_journal.py - Append-only write-ahead journal for OpenSoul audit batches
+
+Each logged action is appended as one JSON line to the active segment file, so
+the cost of a log call stays constant no matter how many actions are pending.
+Segments rotate by size; a flush seals the active segment, replays the sealed
+ones and discards them once the batch is safely on chain. A journal holds an
+exclusive lock on its directory, so two loggers can never replay or discard
+each other's segments.
+"""
+
+import fcntl
+import json
+import os
+import time
+from typing import List
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class BatchJournal:
+    """
+    fsync policies:
+        "always"   - fsync after every append (no loss on crash)
+        "interval" - fsync at most every fsync_interval seconds
+        "never"    - leave write-back to the OS
+    Usage:
+        journal = BatchJournal("audit_journal", fsync="always")
+        journal.append({"action": "tool_call", ...})
+        segments = journal.rotate()
+        actions = journal.replay(segments)
+        journal.discard(segments)
+    """
+    SUFFIX = ".jsonl"
+    LOCK_FILE = ".lock"
+
+    def __init__(self, directory: str = "audit_journal", fsync: str = "always",
+                 segment_kb: int = 1024, fsync_interval: float = 1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.fsync = fsync
+        self.segment_bytes = segment_kb * 1024
+        self.fsync_interval = fsync_interval
+        self._last_sync = 0.0
+        self._fd = None
+        self._seq = None
+        self._size = 0
+        self._lock_fd = None
+        os.makedirs(directory, exist_ok=True)
+        self._lock()
+
+    def _lock(self):
+        fd = os.open(os.path.join(self.directory, self.LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise RuntimeError(f"Journal directory {self.directory} is in use by another logger; "
+                               f"give each logger its own journal_dir")
+        self._lock_fd = fd
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:08d}{self.SUFFIX}")
+
+    def segments(self) -> List[str]:
+        """All segment files, oldest first."""
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(self.SUFFIX))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def _open_segment(self, seq: int):
+        self._close_segment()
+        path = self._segment_path(seq)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._seq = seq
+        self._size = os.fstat(self._fd).st_size
+        if self._size:
+            # Terminate a torn trailing record so the next append starts on a fresh line
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._size += os.write(self._fd, b"\n")
+
+    def _close_segment(self):
+        if self._fd is not None:
+            if self.fsync != "never":
+                os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def _next_seq(self) -> int:
+        existing = self.segments()
+        return int(os.path.basename(existing[-1])[:-len(self.SUFFIX)]) + 1 if existing else 0
+
+    def append(self, record: dict):
+        """Append one record. Opens or rotates the active segment as needed."""
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        if self._lock_fd is None:
+            self._lock()  # reopened after close()
+        if self._fd is None:
+            existing = self.segments()
+            self._open_segment(self._next_seq() - 1 if existing else 0)
+        if self._size and self._size + len(line) > self.segment_bytes:
+            self._open_segment(self._seq + 1)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            os.write(self._fd, line)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._size += len(line)
+        if self.fsync == "always":
+            os.fsync(self._fd)
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_interval:
+                os.fsync(self._fd)
+                self._last_sync = now
+
+    def rotate(self) -> List[str]:
+        """Seal the active segment. Returns every sealed segment, oldest first."""
+        sealed = self.segments()
+        self._close_segment()
+        self._open_segment(self._next_seq())
+        return sealed
+
+    def replay(self, segments: List[str] = None) -> List[dict]:
+        """Read records back in append order. A torn trailing line (crash mid-write) is skipped."""
+        records = []
+        for path in (self.segments() if segments is None else segments):
+            try:
+                with open(path, "rb") as f:
+                    for line in f:
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            continue
+            except FileNotFoundError:
+                continue
+        return records
+
+    def discard(self, segments: List[str]):
+        """Remove segments whose records have been committed."""
+        for path in segments:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        self._close_segment()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # releases the directory lock
+            self._lock_fd = None
+
+# Example usage:
+# journal = BatchJournal("audit_journal", fsync="interval", segment_kb=256)
+# journal.append({"tokens_in": 10, "tokens_out": 5, "action": "test"})
+# sealed = journal.rotate(); batch = journal.replay(sealed); journal.discard(sealed)
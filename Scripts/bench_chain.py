@@ -0,0 +1,86 @@
+"""
+bench_chain.py - Offline load test for OpenSoul agents against a SimulatedChain
+
+Runs chained spends through the in-process chain instead of a public API, so
+throughput is bounded by the code under test, not by rate limits:
+    raw     - hand-built P2PKH spend chains (validation cost of the chain itself)
+    wallet  - Wallet.send_payment change chains (signing + sync backend path)
+    logger  - many AuditLoggers logging and flushing concurrently on one chain
+Run: python bench_chain.py [raw|wallet|logger] [agents] [txs per agent]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from chain_backend import SimulatedChain, hash160, pubkey_to_address, _varint
+
+PUBKEY = bytes.fromhex("02" + "11" * 32)
+
+
+def _raw_spend(txid: str, value: int) -> str:
+    script_sig = b"\x47" + b"\x30" * 71 + b"\x21" + PUBKEY
+    script = b"\x76\xa9\x14" + hash160(PUBKEY) + b"\x88\xac"
+    return (b"\x01\x00\x00\x00" + b"\x01" + bytes.fromhex(txid)[::-1] + b"\x00" * 4
+            + _varint(len(script_sig)) + script_sig + b"\xff\xff\xff\xff"
+            + b"\x01" + value.to_bytes(8, "little") + _varint(len(script)) + script + b"\x00" * 4).hex()
+
+
+def bench_raw(chain: SimulatedChain, agents: int, txs: int) -> int:
+    # Every agent spends its own coinbase with the same key; only the outpoints differ
+    heads = [[chain.fund(pubkey_to_address(PUBKEY), 10_000_000), 10_000_000] for _ in range(agents)]
+    for _ in range(txs):
+        for head in heads:
+            head[1] -= 200
+            head[0] = chain.broadcast_sync(_raw_spend(head[0], head[1]))
+    return agents * txs
+
+
+def bench_wallet(chain: SimulatedChain, agents: int, txs: int) -> int:
+    from bsv import PrivateKey
+    from wallet import Wallet
+    keys = [PrivateKey() for _ in range(agents)]
+    for key in keys:
+        chain.fund(key.address(compressed=True), 10_000_000)
+    sink = keys[0].address(compressed=True)
+    for _ in range(txs):
+        for key in keys:
+            Wallet.send_payment(key.wif(), sink, 1_000, backend=chain)
+    return agents * txs
+
+
+def bench_logger(chain: SimulatedChain, agents: int, txs: int) -> int:
+    from bsv import PrivateKey
+    from AuditLogger import AuditLogger
+    state_dir = tempfile.mkdtemp(prefix="opensoul-bench-")
+    loggers = []
+    for n in range(agents):
+        key = PrivateKey()
+        chain.fund(key.address(compressed=True), 10_000_000)
+        loggers.append(AuditLogger(key.wif(), {"agent_id": f"bench-{n}", "batch_mode": "memory",
+                                               "state_db": os.path.join(state_dir, "state.db")}, client=chain))
+
+    async def run():
+        for _ in range(txs):
+            for logger in loggers:
+                logger.log({"action": "tool_call", "tokens_in": 10, "tokens_out": 5})
+            await asyncio.gather(*(logger.flush() for logger in loggers))
+        await asyncio.gather(*(logger.close(flush=False) for logger in loggers))
+    asyncio.run(run())
+    return agents * txs
+
+
+MODES = {"raw": bench_raw, "wallet": bench_wallet, "logger": bench_logger}
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "raw"
+    agents = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    txs = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    chain = SimulatedChain(auto_mine=1000)
+    start = time.perf_counter()
+    count = MODES[mode](chain, agents, txs)
+    elapsed = time.perf_counter() - start
+    print(f"{mode}: {count} txs from {agents} agents in {elapsed:.2f}s = {count / elapsed:.0f} tx/s "
+          f"(accepted {chain.accepted}, rejected {chain.rejected}, height {chain.height})")
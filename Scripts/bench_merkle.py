@@ -0,0 +1,95 @@
+"""
+bench_merkle.py - Merkle proof generation benchmark for OpenSoul agents
+
+Compares proofs for every leaf of a batch built two ways:
+    per-index - MerkleUtils.build_merkle_proof, which rebuilds the tree for each proof
+    bulk      - MerkleTree, built once, then one lookup per level per proof
+The per-index path is O(n^2) overall, so at large n it is timed on a sample of
+indices and extrapolated to all n. Then, for k leaves of the same batch, it
+compares proof bytes and verification time of k separate proofs, the memoized
+batch verifier and one multiproof, and times the root on all cores
+(ParallelMerkleBuilder) against the serial MerkleUtils path.
+Run: python bench_merkle.py [leaves] [sampled per-index proofs] [k] [workers]
+"""
+
+import os
+import random
+import sys
+import time
+
+from merkle_parallel import ParallelMerkleBuilder
+from merkle_utils import MerkleBatchVerifier, MerkleTree, MerkleUtils, sha256d
+
+
+def bench(n: int, sample: int = 3) -> dict:
+    leaves = [sha256d(i.to_bytes(8, "little")) for i in range(n)]
+
+    start = time.perf_counter()
+    tree = MerkleTree(leaves)
+    built = time.perf_counter() - start
+    proofs = tree.proofs()
+    bulk = time.perf_counter() - start
+
+    indices = [i * (n - 1) // max(1, sample - 1) for i in range(sample)]
+    start = time.perf_counter()
+    for i in indices:
+        if MerkleUtils.build_merkle_proof(leaves, i) != proofs[i]:
+            raise RuntimeError(f"Proof mismatch at index {i}")
+    per_proof = (time.perf_counter() - start) / len(indices)
+    return {"leaves": n, "build_s": built, "bulk_s": bulk, "per_index_s": per_proof * n,
+            "levels": len(tree.width), "buffer_mb": len(tree.buffer) / 1e6, "tree": tree, "leaf_hashes": leaves}
+
+
+def bench_multi(tree: MerkleTree, leaves: list, k: int, seed: int = 1) -> dict:
+    indices = sorted(random.Random(seed).sample(range(len(leaves)), k))
+    root = tree.root()
+    proofs = tree.proofs(indices)
+    multi = tree.multiproof(indices)
+
+    start = time.perf_counter()
+    separate = all(MerkleUtils.verify_merkle_proof(leaves[i], p, root, i) for i, p in zip(indices, proofs))
+    separate_s = time.perf_counter() - start
+    start = time.perf_counter()
+    verifier = MerkleBatchVerifier(root)
+    batch = all(verifier.verify(leaves[i], p, i) for i, p in zip(indices, proofs))
+    batch_s = time.perf_counter() - start
+    start = time.perf_counter()
+    combined = MerkleUtils.verify_merkle_multiproof({i: leaves[i] for i in indices}, multi, root, len(leaves))
+    multi_s = time.perf_counter() - start
+    if not (separate and batch and combined):
+        raise RuntimeError("Proof verification failed")
+    return {"k": k, "separate_bytes": 32 * sum(map(len, proofs)), "multi_bytes": 32 * len(multi),
+            "separate_s": separate_s, "batch_s": batch_s, "multi_s": multi_s}
+
+
+def bench_parallel(leaves: list, workers: int) -> dict:
+    start = time.perf_counter()
+    serial = MerkleUtils.build_merkle_root(leaves)
+    serial_s = time.perf_counter() - start
+    with ParallelMerkleBuilder(workers, min_leaves=1) as builder:
+        builder.root(leaves[:workers * builder.chunks_per_worker * 2])  # start the pool outside the timing
+        start = time.perf_counter()
+        parallel = builder.root(leaves)
+        parallel_s = time.perf_counter() - start
+    if parallel != serial:
+        raise RuntimeError("Parallel root differs from the serial root")
+    return {"workers": workers, "serial_s": serial_s, "parallel_s": parallel_s}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sample = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else (os.cpu_count() or 1)
+    r = bench(n, sample)
+    print(f"{r['leaves']} leaves, {r['levels']} levels, {r['buffer_mb']:.1f} MB buffer")
+    print(f"bulk:      build {r['build_s']:.2f}s, all proofs {r['bulk_s']:.2f}s")
+    print(f"per-index: ~{r['per_index_s']:.0f}s for all proofs (extrapolated from {sample})")
+    print(f"speedup:   ~{r['per_index_s'] / r['bulk_s']:.0f}x")
+    m = bench_multi(r["tree"], r["leaf_hashes"], min(k, n))
+    print(f"{m['k']} random leaves: separate proofs {m['separate_bytes']} B, multiproof {m['multi_bytes']} B")
+    print(f"verify:    separate {m['separate_s'] * 1e3:.1f}ms, batch {m['batch_s'] * 1e3:.1f}ms, "
+          f"multiproof {m['multi_s'] * 1e3:.1f}ms")
+    p = bench_parallel(r["leaf_hashes"], workers)
+    print(f"root:      serial {p['serial_s']:.2f}s, {p['workers']} workers {p['parallel_s']:.2f}s "
+          f"({p['serial_s'] / p['parallel_s']:.1f}x)")
@@ -0,0 +1,59 @@
+"""
+bench_payload.py - Payload size and speed benchmark for OpenSoul audit logs
+
+Compares the JSON and columnar serializers (each with and without compression)
+on synthetic session metrics shaped like the ones AuditLogger.log records.
+Run: python bench_payload.py [rows ...]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from payload_pipeline import PayloadPipeline
+
+ACTIONS = ["tool_call", "web_search", "llm_call", "file_read", "file_write"]
+STATUSES = ["success", "success", "success", "failed"]
+
+
+def sample_payload(rows: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    ts = datetime(2025, 1, 1, 12, 0, 0, 1)
+    metrics = []
+    for _ in range(rows):
+        ts += timedelta(microseconds=rng.randint(50_000, 5_000_000))
+        metrics.append({
+            "tokens_in": rng.randint(0, 4000),
+            "tokens_out": rng.randint(0, 1500),
+            "action": rng.choice(ACTIONS),
+            "status": rng.choice(STATUSES),
+            "ts": ts.isoformat() + "Z",
+        })
+    return {"agent_id": "bench-agent", "session_start": "2025-01-01T12:00:00.000000Z",
+            "timestamp": ts.isoformat() + "Z", "seq": 42, "metrics": metrics}
+
+
+def bench(pipeline: PayloadPipeline, payload: dict, repeat: int = 50) -> tuple:
+    data = pipeline.encode(payload)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pipeline.encode(payload)
+    encode_us = (time.perf_counter() - start) / repeat * 1e6
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pipeline.decode(data)
+    decode_us = (time.perf_counter() - start) / repeat * 1e6
+    assert pipeline.decode(data) == payload
+    return len(data), encode_us, decode_us
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [10, 50, 200, 1000]
+    variants = [(s, c) for s in ("json", "columnar") for c in ("none", "zlib")]
+    print(f"{'rows':>6} {'serializer':>10} {'codec':>6} {'bytes':>8} {'encode us':>10} {'decode us':>10}")
+    for rows in sizes:
+        payload = sample_payload(rows)
+        for serializer, codec in variants:
+            size, enc, dec = bench(PayloadPipeline(codec=codec, serializer=serializer), payload)
+            print(f"{rows:>6} {serializer:>10} {codec:>6} {size:>8} {enc:>10.0f} {dec:>10.0f}")
@@ -0,0 +1,197 @@
+"""
+broadcast_batcher.py - Batched transaction broadcast for OpenSoul agents
+
+Gathers signed transactions submitted over a short window and sends them as
+one multi-tx broadcast instead of one POST per tx. Each caller gets back the
+result for its own tx. Within a batch, parents are sent before the children
+that spend them (found by parsing the raw tx inputs), so chained log txs stay
+valid. Transports are pluggable: ArcTransport uses ARC's multi-tx endpoint,
+ClientTransport falls back to one-by-one ChainClient broadcasts, and tests can
+pass any object with the same broadcast_many coroutine.
+"""
+
+import asyncio
+import json
+import threading
+from typing import List, Optional, Tuple
+
+from chain_backend import input_txids, tx_id
+from chain_client import ChainClient
+
+
+def dependency_order(tx_hexes: List[str]) -> List[int]:
+    """Indexes of tx_hexes with every parent before its children; otherwise submission order is kept."""
+    txids = [tx_id(h) for h in tx_hexes]
+    position = {txid: i for i, txid in enumerate(txids)}
+    parents = [{position[p] for p in input_txids(h) if p in position} for h in tx_hexes]
+    order, placed = [], set()
+
+    def place(i, path=()):
+        if i in placed:
+            return
+        if i in path:
+            raise ValueError("Dependency cycle in broadcast batch")
+        for parent in sorted(parents[i]):
+            place(parent, path + (i,))
+        placed.add(i)
+        order.append(i)
+
+    for i in range(len(tx_hexes)):
+        place(i)
+    return order
+
+
+class ClientTransport:
+    """One POST /tx/raw per tx through a ChainClient (for APIs without a multi-tx endpoint)."""
+
+    def __init__(self, client: ChainClient):
+        self.client = client
+
+    async def broadcast_many(self, tx_hexes: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+        results = []
+        for tx_hex in tx_hexes:
+            try:
+                results.append((await self.client.broadcast(tx_hex) or tx_id(tx_hex), None))
+            except RuntimeError as e:
+                results.append((None, str(e)))
+        return results
+
+
+class ArcTransport:
+    """ARC multi-tx endpoint: POST {url}/v1/txs with [{"rawTx": hex}, ...]; one result per tx, in order."""
+
+    def __init__(self, url: str = "https://arc.gorillapool.io", api_key: str = None):
+        self.client = ChainClient.shared(url.rstrip("/"))
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+
+    async def broadcast_many(self, tx_hexes: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+        status, text = await self.client.request(
+            "POST", "/v1/txs", json=[{"rawTx": h} for h in tx_hexes], headers=self.headers)
+        if status != 200:
+            raise RuntimeError(f"Batch broadcast failed ({status}): {text}")
+        results = []
+        for tx_hex, item in zip(tx_hexes, json.loads(text)):
+            if item.get("status", 200) == 200 and item.get("txStatus") != "REJECTED":
+                results.append((item.get("txid") or tx_id(tx_hex), None))
+            else:
+                results.append((None, item.get("detail") or item.get("title") or str(item)))
+        return results
+
+
+class BroadcastBatcher:
+    """
+    Usage:
+        batcher = BroadcastBatcher(ArcTransport(), window=0.05)
+        txid = await batcher.submit(tx_hex)           # async callers
+        txid = batcher.submit_threadsafe(tx_hex)      # sync callers (Wallet, PaymentChannel, ...)
+    submit raises RuntimeError("Broadcast failed: ...") for a rejected tx, like ChainClient.broadcast.
+    """
+
+    def __init__(self, transport, window: float = 0.05, max_batch: int = 100):
+        self.transport = transport
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = []        # [(tx_hex, future)]
+        self._wakeup = None
+        self._worker = None
+        self._loop = None
+        self._thread = None
+        self._closing = False
+
+    async def submit(self, tx_hex: str) -> str:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            if self._loop is not loop and self._worker is not None and not self._worker.done():
+                # One queue, one worker: a second loop would steal the first loop's futures
+                raise RuntimeError("BroadcastBatcher is running on another event loop; "
+                                   "use one batcher per loop, or submit_threadsafe()")
+            self._queue = [(h, f) for h, f in self._queue if not f.done()]  # callers gone with an old loop
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.append((tx_hex, future))
+        self._wakeup.set()
+        return await future
+
+    def submit_threadsafe(self, tx_hex: str, timeout: float = 60.0) -> str:
+        """Blocking submit for code without an event loop. Starts a background loop on first use."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and running is self._loop:
+            raise RuntimeError("submit_threadsafe called on the batcher's own loop; use await submit()")
+        if self._loop is None or not self._loop.is_running():
+            self.start()
+        return asyncio.run_coroutine_threadsafe(self.submit(tx_hex), self._loop).result(timeout)
+
+    def start(self):
+        """Run the batcher on its own event loop in a daemon thread."""
+        loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=loop.run_forever, name="broadcast-batcher", daemon=True)
+        self._thread.start()
+        self._loop = loop
+
+    async def _run(self):
+        while not (self._closing and not self._queue):
+            await self._wakeup.wait()
+            # Let more txs arrive, unless the batch is already full (or we are closing)
+            if len(self._queue) < self.max_batch and not self._closing:
+                await asyncio.sleep(self.window)
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            if not self._queue:
+                self._wakeup.clear()
+            if batch:
+                await self._send(batch)
+
+    async def _send(self, batch: list):
+        try:
+            order = dependency_order([tx_hex for tx_hex, _ in batch])
+            ordered = [batch[i] for i in order]
+            results = await self.transport.broadcast_many([tx_hex for tx_hex, _ in ordered])
+            if len(results) != len(ordered):
+                raise RuntimeError(f"Broadcaster returned {len(results)} results for {len(ordered)} txs")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Broadcast failed: {e}"))
+            return
+        for (_, future), (txid, error) in zip(ordered, results):
+            if future.done():
+                continue
+            if error:
+                future.set_exception(RuntimeError(f"Broadcast failed: {error}"))
+            else:
+                future.set_result(txid)
+
+    async def close(self):
+        """Send what is queued, let a batch already on the network finish, and stop the worker."""
+        loop = self._loop
+        if loop is not None and loop.is_running() and loop is not asyncio.get_running_loop():
+            # Started with start(): the worker and its futures live on the batcher's own loop
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._drain(), loop))
+        else:
+            await self._drain()
+
+    async def _drain(self):
+        worker, self._worker = self._worker, None
+        if worker is not None and not worker.done():
+            # Cancelling mid-_send would leave the callers' futures unresolved; let the
+            # worker send what is queued and return instead
+            self._closing = True
+            self._wakeup.set()
+            try:
+                await worker
+            finally:
+                self._closing = False
+        if self._queue:
+            batch, self._queue = self._queue, []
+            await self._send(batch)
+
+# Example usage:
+# batcher = BroadcastBatcher(ArcTransport("https://arc.gorillapool.io"), window=0.1)
+# txids = await asyncio.gather(*(batcher.submit(h) for h in signed_hexes))
+# Wallet.send_payment(wif, addr, 1000, batcher=batcher)
@@ -0,0 +1,464 @@
+"""
+chain_backend.py - Pluggable chain backends for OpenSoul agents
+
+ChainBackend is the interface every chain consumer talks to: UTXO lookup, tx
+fetch, broadcast, address history, and block headers and merkle proofs for SPV. The raw tx and script parsers used by
+the backends, the broadcast batcher and history reads live here too. Each call exists in a blocking form
+(*_sync, for Wallet, MultisigWallet, PaymentChannel, IndexerUtils) and an async
+form (for AuditLogger). A backend must implement the blocking core calls (they
+are abstract, so an incomplete backend fails when it is constructed); the async
+forms default to them and may be overridden with native async versions.
+
+Implementations:
+    ChainClient (chain_client.py) - WhatsOnChain over pooled HTTP
+    SimulatedChain                - in-process chain that validates spends and
+                                    mines blocks on demand, for tests and offline load tests
+"""
+
+import asyncio
+import hashlib
+import struct
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Iterator, List, Optional, Tuple
+
+from header_store import header_target
+from merkle_utils import MerkleTree, sha256d
+
+SAT_PER_BSV = 100_000_000
+OP_FALSE, OP_PUSHDATA1, OP_PUSHDATA4, OP_RETURN = 0x00, 0x4C, 0x4E, 0x6A
+_B58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+# -- raw tx helpers -------------------------------------------------------------
+
+def _read_varint(raw: bytes, pos: int) -> Tuple[int, int]:
+    prefix = raw[pos]
+    if prefix < 0xFD:
+        return prefix, pos + 1
+    size = {0xFD: 2, 0xFE: 4, 0xFF: 8}[prefix]
+    return int.from_bytes(raw[pos + 1:pos + 1 + size], "little"), pos + 1 + size
+
+
+def _varint(n: int) -> bytes:
+    if n < 0xFD:
+        return bytes([n])
+    if n <= 0xFFFF:
+        return b"\xfd" + n.to_bytes(2, "little")
+    if n <= 0xFFFFFFFF:
+        return b"\xfe" + n.to_bytes(4, "little")
+    return b"\xff" + n.to_bytes(8, "little")
+
+
+def tx_id(tx_hex: str) -> str:
+    return hashlib.sha256(hashlib.sha256(bytes.fromhex(tx_hex)).digest()).digest()[::-1].hex()
+
+
+def parse_tx(tx_hex: str) -> dict:
+    """Decode a raw tx into {"version", "vin": [{"txid", "vout", "script"}], "vout": [{"value", "script"}], "locktime"}."""
+    raw = bytes.fromhex(tx_hex)
+    version = int.from_bytes(raw[:4], "little")
+    count, pos = _read_varint(raw, 4)
+    vin = []
+    for _ in range(count):
+        prev, index = raw[pos:pos + 32][::-1].hex(), int.from_bytes(raw[pos + 32:pos + 36], "little")
+        script_len, pos = _read_varint(raw, pos + 36)
+        vin.append({"txid": prev, "vout": index, "script": raw[pos:pos + script_len]})
+        pos += script_len + 4
+    count, pos = _read_varint(raw, pos)
+    vout = []
+    for _ in range(count):
+        value = int.from_bytes(raw[pos:pos + 8], "little")
+        script_len, pos = _read_varint(raw, pos + 8)
+        vout.append({"value": value, "script": raw[pos:pos + script_len]})
+        pos += script_len
+    if pos + 4 != len(raw):
+        raise ValueError("Trailing or missing bytes in raw tx")
+    return {"version": version, "vin": vin, "vout": vout, "locktime": int.from_bytes(raw[pos:pos + 4], "little")}
+
+
+def input_txids(tx_hex: str) -> List[str]:
+    """Txids of the outputs a raw tx spends."""
+    return [i["txid"] for i in parse_tx(tx_hex)["vin"]]
+
+
+def hash160(data: bytes) -> bytes:
+    return hashlib.new("ripemd160", hashlib.sha256(data).digest()).digest()
+
+
+def pubkey_to_address(pubkey: bytes) -> str:
+    """Mainnet P2PKH address for a serialized public key."""
+    payload = b"\x00" + hash160(pubkey)
+    payload += hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    n, address = int.from_bytes(payload, "big"), ""
+    while n:
+        n, r = divmod(n, 58)
+        address = _B58[r] + address
+    return "1" + address
+
+
+def address_to_script(address: str) -> bytes:
+    """P2PKH locking script for a base58check address."""
+    n = 0
+    for c in address:
+        n = n * 58 + _B58.index(c)
+    raw = n.to_bytes(25, "big")
+    if hashlib.sha256(hashlib.sha256(raw[:21]).digest()).digest()[:4] != raw[21:]:
+        raise ValueError(f"Bad address checksum: {address}")
+    return b"\x76\xa9\x14" + raw[1:21] + b"\x88\xac"
+
+
+# -- script parsing -------------------------------------------------------------
+
+def iter_script(script) -> Iterator[Tuple[int, Optional[memoryview]]]:
+    """
+    (opcode, data) for each op in script. For pushes (OP_0, direct pushes and
+    OP_PUSHDATA1/2/4) data is a memoryview slice of script, so nothing is copied;
+    for any other opcode it is None. Raises ValueError if a push runs past the end.
+    """
+    view = script if isinstance(script, memoryview) else memoryview(script)
+    pos, end = 0, len(view)
+    while pos < end:
+        op = view[pos]
+        pos += 1
+        if op > OP_PUSHDATA4:
+            yield op, None
+            continue
+        if op < OP_PUSHDATA1:
+            size = op
+        else:
+            width = 1 << (op - OP_PUSHDATA1)  # PUSHDATA1/2/4 -> 1/2/4 length bytes
+            if pos + width > end:
+                raise ValueError("Script ends inside a pushdata length")
+            size = int.from_bytes(view[pos:pos + width], "little")
+            pos += width
+        if pos + size > end:
+            raise ValueError(f"Push of {size} bytes runs past the end of the script")
+        yield op, view[pos:pos + size]
+        pos += size
+
+
+def iter_pushes(script) -> Iterator[memoryview]:
+    """Data of every push in script, in order (memoryview slices)."""
+    for _, data in iter_script(script):
+        if data is not None:
+            yield data
+
+
+def op_return_data(script) -> Optional[List[memoryview]]:
+    """Pushes after OP_RETURN / OP_FALSE OP_RETURN, or None if script is not a data output."""
+    view = script if isinstance(script, memoryview) else memoryview(script)
+    if view[:1] == bytes([OP_RETURN]):
+        return list(iter_pushes(view[1:]))
+    if view[:2] == bytes([OP_FALSE, OP_RETURN]):
+        return list(iter_pushes(view[2:]))
+    return None
+
+
+def _last_push(script: bytes) -> Optional[memoryview]:
+    """Data of the final push in an unlocking script (the pubkey for P2PKH)."""
+    last = None
+    for _, data in iter_script(script):
+        last = data
+    return last
+
+
+def input_pubkey_hash(script) -> Optional[bytes]:
+    """hash160 of the pubkey a P2PKH unlocking script ends with (None if it has none or is malformed)."""
+    try:
+        pubkey = _last_push(script)
+    except ValueError:
+        return None
+    return hash160(bytes(pubkey)) if pubkey is not None else None
+
+
+# -- interface ------------------------------------------------------------------
+
+class ChainBackend(ABC):
+    """
+    Subclasses implement the abstract *_sync methods and may override the async
+    ones. Async defaults run the blocking call in a worker thread (BLOCKING = True)
+    or inline for backends whose sync calls never block (BLOCKING = False).
+    The SPV calls (merkle proofs, headers, chain height) are optional; only
+    verify_logs needs them. Errors: RuntimeError for failed lookups and rejected broadcasts.
+    """
+    BLOCKING = True
+
+    @abstractmethod
+    def get_unspent_sync(self, address: str) -> list:
+        """[{"txid", "vout", "value", "height"}] (height 0 = unconfirmed)."""
+
+    @abstractmethod
+    def get_tx_sync(self, txid: str) -> dict:
+        """WhatsOnChain-shaped tx: {"txid", "hex", "confirmations", "vin": [...], "vout": [...]}."""
+
+    def get_tx_hex_sync(self, txid: str) -> str:
+        return self.get_tx_sync(txid)["hex"]
+
+    @abstractmethod
+    def broadcast_sync(self, tx_hex: str) -> Optional[str]:
+        """Send a raw tx; returns its txid (or None if the backend does not say)."""
+
+    @abstractmethod
+    def get_history_sync(self, address: str) -> list:
+        """Txs (get_tx shape) paying to or spending from address, oldest first."""
+
+    def get_balance_sync(self, address: str) -> int:
+        return sum(u["value"] for u in self.get_unspent_sync(address))
+
+    def get_merkle_proof_sync(self, txid: str) -> dict:
+        """TSC merkle proof {"index", "txOrId", "target" (block hash), "nodes"}; RuntimeError if unconfirmed."""
+        raise NotImplementedError
+
+    def get_header_sync(self, height: int) -> bytes:
+        """Raw 80-byte block header at height."""
+        raise NotImplementedError
+
+    def get_chain_height_sync(self) -> int:
+        raise NotImplementedError
+
+    async def _call(self, fn, *args):
+        if self.BLOCKING:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get_unspent(self, address: str) -> list:
+        return await self._call(self.get_unspent_sync, address)
+
+    async def get_tx(self, txid: str) -> dict:
+        return await self._call(self.get_tx_sync, txid)
+
+    async def get_tx_hex(self, txid: str) -> str:
+        return await self._call(self.get_tx_hex_sync, txid)
+
+    async def broadcast(self, tx_hex: str) -> Optional[str]:
+        return await self._call(self.broadcast_sync, tx_hex)
+
+    async def get_history(self, address: str) -> list:
+        return await self._call(self.get_history_sync, address)
+
+    async def get_balance(self, address: str) -> int:
+        return await self._call(self.get_balance_sync, address)
+
+    async def get_merkle_proof(self, txid: str) -> dict:
+        return await self._call(self.get_merkle_proof_sync, txid)
+
+    async def get_header(self, height: int) -> bytes:
+        return await self._call(self.get_header_sync, height)
+
+    async def get_chain_height(self) -> int:
+        return await self._call(self.get_chain_height_sync)
+
+    async def close(self):
+        pass
+
+
+# -- simulated chain ------------------------------------------------------------
+
+class SimulatedChain(ChainBackend):
+    """
+    In-memory chain. Broadcasts are checked like a node would: every input must
+    reference an existing unspent output (no double spends), outputs may not
+    exceed inputs, and P2PKH inputs must carry the pubkey matching the spent
+    output (signatures are not verified). Accepted txs sit in the mempool until
+    mine() (or auto_mine) puts them in a block. Blocks have real headers (easy
+    proof-of-work) and merkle roots, so SPV checks run against them as on mainnet.
+    Usage:
+        chain = SimulatedChain()
+        chain.fund(address, 100_000)
+        logger = AuditLogger(wif, config, client=chain)
+        ...
+        chain.mine()
+    """
+    BLOCKING = False
+    BITS = 0x207FFFFF  # regtest difficulty: about every other nonce meets the target
+
+    def __init__(self, auto_mine: int = 0, check_pubkeys: bool = True, min_fee_rate: float = 0.0):
+        self.auto_mine = auto_mine          # mine a block every N accepted txs (0 = only on mine())
+        self.check_pubkeys = check_pubkeys
+        self.min_fee_rate = min_fee_rate    # sat/byte a tx must pay to be accepted
+        self.height = 0
+        self.txs = {}                       # txid -> {"hex", "parsed", "height"}
+        self.utxos = {}                     # (txid, vout) -> value
+        self.spent = {}                     # (txid, vout) -> spending txid
+        self.scripts = {}                   # (txid, vout) -> locking script
+        self.by_script = defaultdict(set)   # locking script -> unspent outpoints
+        self.history = defaultdict(list)    # locking script -> txids touching it, oldest first
+        self.mempool = []
+        self.accepted = 0
+        self.rejected = 0
+        self._coinbase = 0
+        self.blocks = []                    # height -> {"header", "hash", "txids", "tree"}
+        self._add_block([])                 # genesis
+
+    # -- chain control ----------------------------------------------------------
+
+    def fund(self, address: str, value: int, confirmed: bool = True) -> str:
+        """Pay value sat to address from a fresh coinbase-style tx. Returns its txid."""
+        self._coinbase += 1
+        tag = self._coinbase.to_bytes(8, "little")
+        script = address_to_script(address)
+        raw = (b"\x01\x00\x00\x00" + b"\x01" + b"\x00" * 32 + b"\xff\xff\xff\xff"
+               + _varint(len(tag)) + tag + b"\xff\xff\xff\xff"
+               + b"\x01" + value.to_bytes(8, "little") + _varint(len(script)) + script + b"\x00" * 4)
+        txid = self._accept(raw.hex(), parse_tx(raw.hex()), spends=[])
+        if confirmed:
+            self.mine()
+        return txid
+
+    def mine(self, blocks: int = 1) -> int:
+        """Confirm every mempool tx in the next block (plus blocks - 1 empty ones). Returns the tip height."""
+        self.height += 1
+        for txid in self.mempool:
+            self.txs[txid]["height"] = self.height
+        self._add_block(self.mempool)
+        self.mempool = []
+        for _ in range(blocks - 1):
+            self.height += 1
+            self._add_block([])
+        return self.height
+
+    def _add_block(self, txids: list):
+        # A synthetic coinbase leaf comes first, as in a real block, so no tx sits at index 0 alone
+        txids = [sha256d(struct.pack("<Q", len(self.blocks)))[::-1].hex()] + list(txids)
+        prev = sha256d(self.blocks[-1]["header"]) if self.blocks else bytes(32)
+        tree = MerkleTree([bytes.fromhex(t)[::-1] for t in txids])  # kept to serve merkle proofs
+        prefix = struct.pack("<I", 1) + prev + tree.root() + struct.pack("<II", 1_700_000_000 + 600 * len(self.blocks),
+                                                                          self.BITS)
+        target, nonce = header_target(self.BITS), 0
+        while int.from_bytes(sha256d(prefix + struct.pack("<I", nonce)), "little") > target:
+            nonce += 1
+        header = prefix + struct.pack("<I", nonce)
+        block_hash = sha256d(header)[::-1].hex()
+        self.blocks.append({"header": header, "hash": block_hash, "txids": txids, "tree": tree})
+
+    # -- validation -------------------------------------------------------------
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        raise RuntimeError(f"Broadcast failed: {reason}")
+
+    def _accept(self, tx_hex: str, parsed: dict, spends: list) -> str:
+        txid = tx_id(tx_hex)
+        for outpoint in spends:
+            script = self.scripts[outpoint]
+            self.spent[outpoint] = txid
+            del self.utxos[outpoint]
+            self.by_script[script].discard(outpoint)
+            if not self.history[script] or self.history[script][-1] != txid:
+                self.history[script].append(txid)
+        for n, out in enumerate(parsed["vout"]):
+            script = out["script"]
+            outpoint = (txid, n)
+            self.scripts[outpoint] = script
+            if script[:1] == b"\x6a" or script[:2] == b"\x00\x6a":
+                continue  # OP_RETURN outputs are unspendable
+            self.utxos[outpoint] = out["value"]
+            self.by_script[script].add(outpoint)
+            if not self.history[script] or self.history[script][-1] != txid:
+                self.history[script].append(txid)
+        self.txs[txid] = {"hex": tx_hex, "parsed": parsed, "height": None}
+        self.mempool.append(txid)
+        self.accepted += 1
+        if self.auto_mine and len(self.mempool) >= self.auto_mine:
+            self.mine()
+        return txid
+
+    def broadcast_sync(self, tx_hex: str) -> str:
+        txid = tx_id(tx_hex)
+        if txid in self.txs:
+            return txid  # already known, like a node answering "txn-already-known"
+        try:
+            parsed = parse_tx(tx_hex)
+        except (ValueError, IndexError, KeyError):
+            self._reject("TX decode failed")
+        if not parsed["vin"] or not parsed["vout"]:
+            self._reject("bad-txns-vin-or-vout-empty")
+        spends, value_in = [], 0
+        for txin in parsed["vin"]:
+            outpoint = (txin["txid"], txin["vout"])
+            if outpoint in self.spent or outpoint in spends:
+                self._reject(f"txn-mempool-conflict: {outpoint[0]}:{outpoint[1]} already spent")
+            if outpoint not in self.utxos:
+                self._reject(f"Missing inputs: {outpoint[0]}:{outpoint[1]}")
+            script = self.scripts[outpoint]
+            if self.check_pubkeys and len(script) == 25 and script[:3] == b"\x76\xa9\x14":
+                if input_pubkey_hash(txin["script"]) != script[3:23]:
+                    self._reject("mandatory-script-verify-flag-failed (pubkey does not match output)")
+            spends.append(outpoint)
+            value_in += self.utxos[outpoint]
+        value_out = sum(out["value"] for out in parsed["vout"])
+        if value_out > value_in:
+            self._reject("bad-txns-in-belowout")
+        if value_in - value_out < self.min_fee_rate * (len(tx_hex) // 2):
+            self._reject("mempool min fee not met")
+        return self._accept(tx_hex, parsed, spends)
+
+    # -- queries ----------------------------------------------------------------
+
+    def _not_found(self, txid: str):
+        raise RuntimeError(f"GET /tx/{txid} failed (404): unknown transaction")
+
+    def get_unspent_sync(self, address: str) -> list:
+        return [
+            {"txid": txid, "vout": n, "value": self.utxos[(txid, n)], "height": self.txs[txid]["height"] or 0}
+            for txid, n in sorted(self.by_script.get(address_to_script(address), ()))
+        ]
+
+    def get_tx_sync(self, txid: str) -> dict:
+        entry = self.txs.get(txid)
+        if entry is None:
+            self._not_found(txid)
+        parsed, height = entry["parsed"], entry["height"]
+        data = {
+            "txid": txid,
+            "hex": entry["hex"],
+            "size": len(entry["hex"]) // 2,
+            "confirmations": self.height - height + 1 if height else 0,
+            "vin": [{"txid": i["txid"], "vout": i["vout"], "scriptSig": {"hex": i["script"].hex()}}
+                    for i in parsed["vin"]],
+            "vout": [{"n": n, "value": o["value"] / SAT_PER_BSV, "scriptPubKey": {"hex": o["script"].hex()}}
+                     for n, o in enumerate(parsed["vout"])],
+        }
+        if height:
+            data["blockheight"] = height
+            data["blockhash"] = self.blocks[height]["hash"]
+        return data
+
+    def get_tx_hex_sync(self, txid: str) -> str:
+        entry = self.txs.get(txid)
+        if entry is None:
+            self._not_found(txid)
+        return entry["hex"]
+
+    def get_history_sync(self, address: str) -> list:
+        return [self.get_tx_sync(txid) for txid in self.history.get(address_to_script(address), [])]
+
+    def get_merkle_proof_sync(self, txid: str) -> dict:
+        entry = self.txs.get(txid)
+        if entry is None:
+            self._not_found(txid)
+        if not entry["height"]:
+            raise RuntimeError(f"GET /tx/{txid}/proof/tsc failed (404): transaction is unconfirmed")
+        block = self.blocks[entry["height"]]
+        index = block["txids"].index(txid)
+        node, nodes, position = bytes.fromhex(txid)[::-1], [], index
+        for sibling in block["tree"].proof(index):
+            nodes.append("*" if sibling == node else sibling[::-1].hex())
+            node = sha256d(sibling + node) if position & 1 else sha256d(node + sibling)
+            position >>= 1
+        return {"index": index, "txOrId": txid, "target": block["hash"], "nodes": nodes}
+
+    def get_header_sync(self, height: int) -> bytes:
+        if not 0 <= height <= self.height:
+            raise RuntimeError(f"GET /block/height/{height} failed (404): unknown block")
+        return self.blocks[height]["header"]
+
+    def get_chain_height_sync(self) -> int:
+        return self.height
+
+# Example usage:
+# chain = SimulatedChain(auto_mine=100)
+# chain.fund(agent_address, 1_000_000)
+# logger = AuditLogger(agent_wif, {"agent_id": "load-test"}, client=chain)
+# txid = await logger.flush(); chain.mine()
@@ -0,0 +1,238 @@
+"""
+chain_client.py - WhatsOnChain chain backend for OpenSoul agents
+
+Provides a non-blocking HTTP transport for WhatsOnChain-style APIs with
+keep-alive connection pooling, per-host connection limits and timeouts.
+One client is shared by every AuditLogger talking to the same API base, so
+many agents on one event loop reuse the same pooled connections, and the
+same LRU cache of raw transactions (a tx's hex never changes once it has a txid).
+Blocking *_sync variants (plain requests) serve the synchronous wallet helpers;
+see chain_backend.py for the interface.
+"""
+
+import asyncio
+import json
+from collections import OrderedDict
+
+import aiohttp
+import requests
+
+from chain_backend import ChainBackend
+from header_store import header_from_json
+
+
+class ChainClient(ChainBackend):
+    """
+    Usage:
+        client = ChainClient.shared("https://api.whatsonchain.com/v1/bsv/main")
+        utxos = await client.get_unspent(address)
+        txid = await client.broadcast(tx_hex)
+    """
+    _shared = {}
+
+    def __init__(self, api_base: str, max_connections: int = 100, max_per_host: int = 20,
+                 timeout: float = 30.0, connect_timeout: float = 10.0, keepalive: float = 30.0,
+                 tx_cache_size: int = 4096):
+        self.api_base = api_base.rstrip("/")
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.keepalive = keepalive
+        self.tx_cache_size = tx_cache_size
+        self._tx_cache = OrderedDict()  # txid -> raw hex, least recently used first
+        self._session = None
+        self._loop = None
+
+    @classmethod
+    def shared(cls, api_base: str, **kwargs) -> "ChainClient":
+        """Return the process-wide client for api_base, creating it on first use."""
+        client = cls._shared.get(api_base)
+        if client is None:
+            client = cls._shared[api_base] = cls(api_base, **kwargs)
+        return client
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # aiohttp sessions are bound to the loop they were created on; rebuild
+        # the pool if we are now running on a different loop (e.g. a second asyncio.run()).
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            await self._discard_session()
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_per_host,
+                keepalive_timeout=self.keepalive,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+        return self._session
+
+    async def _discard_session(self):
+        # A session left over from another loop cannot be closed on that loop any more (it has
+        # usually finished); detach and close its connector here, which drops its pooled sockets.
+        session, self._session = self._session, None
+        if session is None or session.closed:
+            return
+        connector = session.connector
+        session.detach()
+        await connector.close()
+
+    async def request(self, method: str, path: str, **kwargs):
+        """
+        Perform a request against api_base + path. Returns (status, body_text).
+        Transport failures (connection errors, timeouts) raise RuntimeError, like a failed lookup.
+        """
+        session = await self._get_session()
+        try:
+            async with session.request(method, f"{self.api_base}{path}", **kwargs) as resp:
+                return resp.status, await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RuntimeError(f"{method} {path} failed: {e!r}") from e
+
+    def request_sync(self, method: str, path: str, **kwargs):
+        """Blocking request() for callers without an event loop. Returns (status, body_text)."""
+        try:
+            resp = requests.request(method, f"{self.api_base}{path}", timeout=self.timeout.total, **kwargs)
+        except requests.RequestException as e:
+            raise RuntimeError(f"{method} {path} failed: {e!r}") from e
+        return resp.status_code, resp.text
+
+    async def get_json(self, path: str):
+        status, text = await self.request("GET", path)
+        return self._json(path, status, text)
+
+    def get_json_sync(self, path: str):
+        return self._json(path, *self.request_sync("GET", path))
+
+    @staticmethod
+    def _json(path: str, status: int, text: str):
+        if status != 200:
+            raise RuntimeError(f"GET {path} failed ({status}): {text}")
+        return json.loads(text)
+
+    async def get_unspent(self, address: str) -> list:
+        return await self.get_json(f"/address/{address}/unspent")
+
+    async def get_tx(self, txid: str) -> dict:
+        return await self.get_json(f"/tx/{txid}")
+
+    async def get_history(self, address: str) -> list:
+        return await self.get_json(f"/address/{address}/txs")
+
+    async def get_balance(self, address: str) -> int:
+        data = await self.get_json(f"/address/{address}/balance")
+        return data.get("confirmed", 0) + data.get("unconfirmed", 0)
+
+    def get_unspent_sync(self, address: str) -> list:
+        return self.get_json_sync(f"/address/{address}/unspent")
+
+    def get_tx_sync(self, txid: str) -> dict:
+        return self.get_json_sync(f"/tx/{txid}")
+
+    def get_history_sync(self, address: str) -> list:
+        return self.get_json_sync(f"/address/{address}/txs")
+
+    def get_balance_sync(self, address: str) -> int:
+        data = self.get_json_sync(f"/address/{address}/balance")
+        return data.get("confirmed", 0) + data.get("unconfirmed", 0)
+
+    async def get_merkle_proof(self, txid: str) -> dict:
+        return self._tsc_proof(await self.get_json(f"/tx/{txid}/proof/tsc"))
+
+    async def get_header(self, height: int) -> bytes:
+        return header_from_json(await self.get_json(f"/block/height/{height}"))
+
+    async def get_chain_height(self) -> int:
+        return (await self.get_json("/chain/info"))["blocks"]
+
+    def get_merkle_proof_sync(self, txid: str) -> dict:
+        return self._tsc_proof(self.get_json_sync(f"/tx/{txid}/proof/tsc"))
+
+    def get_header_sync(self, height: int) -> bytes:
+        return header_from_json(self.get_json_sync(f"/block/height/{height}"))
+
+    def get_chain_height_sync(self) -> int:
+        return self.get_json_sync("/chain/info")["blocks"]
+
+    @staticmethod
+    def _tsc_proof(data) -> dict:
+        # WhatsOnChain answers with a list of proofs (one per block the tx was mined in)
+        if isinstance(data, list):
+            data = data[0] if data else None
+        if not data:
+            raise RuntimeError("No merkle proof available: transaction is unconfirmed")
+        return data
+
+    def cache_tx(self, txid: str, tx_hex: str):
+        """Remember a raw tx (e.g. one we just built and broadcast) for later source lookups."""
+        if not self.tx_cache_size:
+            return
+        self._tx_cache[txid] = tx_hex
+        self._tx_cache.move_to_end(txid)
+        while len(self._tx_cache) > self.tx_cache_size:
+            self._tx_cache.popitem(last=False)
+
+    def _cached_tx(self, txid: str):
+        """Raw hex from the LRU cache (marked most recently used), or None."""
+        cached = self._tx_cache.get(txid)
+        if cached is not None:
+            self._tx_cache.move_to_end(txid)
+        return cached
+
+    async def get_tx_hex(self, txid: str) -> str:
+        cached = self._cached_tx(txid)
+        if cached is not None:
+            return cached
+        # WhatsOnChain often has /tx/{txid}/hex or parse from /tx/{txid}
+        status, text = await self.request("GET", f"/tx/{txid}/hex")
+        if status == 200:
+            tx_hex = text.strip()
+        else:
+            # Fallback: get /tx/{txid}, extract 'hex' if present
+            data = await self.get_tx(txid)
+            if "hex" not in data:
+                raise ValueError(f"Could not fetch hex for {txid}")
+            tx_hex = data["hex"]
+        self.cache_tx(txid, tx_hex)
+        return tx_hex
+
+    def get_tx_hex_sync(self, txid: str) -> str:
+        cached = self._cached_tx(txid)
+        if cached is not None:
+            return cached
+        status, text = self.request_sync("GET", f"/tx/{txid}/hex")
+        tx_hex = text.strip() if status == 200 else self.get_tx_sync(txid).get("hex")
+        if not tx_hex:
+            raise ValueError(f"Could not fetch hex for {txid}")
+        self.cache_tx(txid, tx_hex)
+        return tx_hex
+
+    async def broadcast(self, tx_hex: str):
+        """Broadcast a raw tx. Returns the txid reported by the API (may be None)."""
+        return self._broadcast_result(*await self.request("POST", "/tx/raw", json={"txhex": tx_hex}))
+
+    def broadcast_sync(self, tx_hex: str):
+        return self._broadcast_result(*self.request_sync("POST", "/tx/raw", json={"txhex": tx_hex}))
+
+    @staticmethod
+    def _broadcast_result(status: int, text: str):
+        if status != 200:
+            raise RuntimeError(f"Broadcast failed: {text}")
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return text.strip().strip('"') or None
+        if isinstance(data, dict):
+            return data.get("txid")
+        return data or None
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+# Example usage:
+# client = ChainClient.shared(API_BASE, max_per_host=10, timeout=15)
+# utxos = await client.get_unspent(address)
+# tx = await client.get_tx(utxos[0]["txid"])
+# await client.close()
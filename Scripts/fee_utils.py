@@ -0,0 +1,140 @@
+"""
+fee_utils.py - Size-based transaction fees for OpenSoul agents
+
+Computes fees as serialized tx size x a sat/byte rate instead of a flat amount,
+so large OP_RETURN payloads are not underpaid and small payments are not
+overpaid. The rate is either configured or discovered from a miner (ARC)
+policy endpoint and cached with a TTL. One engine is shared by every tx builder.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from typing import List
+
+import requests
+
+DEFAULT_RATE = 0.1      # sat/byte (100 sat/kB) when no rate is configured or discovered
+DEFAULT_TTL = 300       # seconds a discovered rate is reused
+P2PKH_INPUT_SIZE = 148  # outpoint (36) + script length (1) + signature/pubkey (<=107) + sequence (4)
+P2PKH_SCRIPT_SIZE = 25  # OP_DUP OP_HASH160 <20 bytes> OP_EQUALVERIFY OP_CHECKSIG
+
+
+def varint_size(n: int) -> int:
+    if n < 0xFD:
+        return 1
+    if n <= 0xFFFF:
+        return 3
+    if n <= 0xFFFFFFFF:
+        return 5
+    return 9
+
+
+class FeeEngine:
+    """
+    Usage:
+        fees = FeeEngine.shared()                        # process-wide default engine
+        fee = fees.fee_for(1, [FeeEngine.op_return_size(len(data)), P2PKH_SCRIPT_SIZE])
+        FeeEngine.configure(policy_url="https://arc.gorillapool.io/v1/policy")
+    """
+    _default = None
+
+    def __init__(self, rate: float = None, policy_url: str = None, ttl: float = DEFAULT_TTL,
+                 fallback_rate: float = DEFAULT_RATE, min_fee: int = 1, timeout: float = 5.0):
+        self.fixed_rate = rate
+        self.policy_url = policy_url
+        self.ttl = ttl
+        self.fallback_rate = fallback_rate
+        self.min_fee = min_fee
+        self.timeout = timeout
+        self._rate = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "FeeEngine":
+        """Return the process-wide engine used by Wallet, MultisigWallet, PaymentChannel and AuditLogger."""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @classmethod
+    def configure(cls, rate: float = None, policy_url: str = None, **kwargs) -> "FeeEngine":
+        """Replace the process-wide engine (e.g. set a fixed rate or a policy endpoint)."""
+        cls._default = cls(rate=rate, policy_url=policy_url, **kwargs)
+        return cls._default
+
+    # -- rate -----------------------------------------------------------------
+
+    def _fresh(self) -> bool:
+        return self._rate is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    def rate(self) -> float:
+        """Current sat/byte rate: the configured one, else the cached/discovered one, else the fallback."""
+        if self.fixed_rate is not None:
+            return self.fixed_rate
+        if not self.policy_url:
+            return self.fallback_rate
+        with self._lock:
+            if not self._fresh():
+                try:
+                    self._rate = self.fetch_rate()
+                except (requests.RequestException, ValueError, KeyError) as e:
+                    print(f"Fee policy unavailable ({e}); using {self._rate or self.fallback_rate} sat/byte")
+                    self._rate = self._rate or self.fallback_rate
+                self._fetched_at = time.monotonic()  # failures are cached too, so we do not hammer the endpoint
+            return self._rate
+
+    async def rate_async(self) -> float:
+        """rate() for async callers; only a policy fetch runs off the event loop."""
+        if self.fixed_rate is not None or not self.policy_url or self._fresh():
+            return self.rate()
+        return await asyncio.to_thread(self.rate)
+
+    def fetch_rate(self) -> float:
+        """Read the mining fee from an ARC-style policy: {"policy": {"miningFee": {"satoshis", "bytes"}}}."""
+        resp = requests.get(self.policy_url, timeout=self.timeout)
+        if resp.status_code != 200:
+            raise ValueError(f"policy request returned {resp.status_code}")
+        mining_fee = resp.json()["policy"]["miningFee"]
+        return mining_fee["satoshis"] / mining_fee["bytes"]
+
+    # -- size and fee ---------------------------------------------------------
+
+    @staticmethod
+    def op_return_size(data_len: int) -> int:
+        """Length of an OP_RETURN <data> locking script."""
+        if data_len < 0x4C:
+            push = 1
+        elif data_len <= 0xFF:
+            push = 2
+        elif data_len <= 0xFFFF:
+            push = 3
+        else:
+            push = 5
+        return 1 + push + data_len
+
+    @staticmethod
+    def tx_size(inputs: int, output_scripts: List[int]) -> int:
+        """Signed size of a tx with P2PKH inputs and outputs with the given locking script lengths."""
+        size = 4 + varint_size(inputs) + inputs * P2PKH_INPUT_SIZE + varint_size(len(output_scripts)) + 4
+        for script_len in output_scripts:
+            size += 8 + varint_size(script_len) + script_len
+        return size
+
+    def fee(self, size: int, rate: float = None) -> int:
+        """Fee in satoshis for size bytes (rounded up)."""
+        return max(self.min_fee, math.ceil(size * (self.rate() if rate is None else rate)))
+
+    def fee_for(self, inputs: int, output_scripts: List[int], rate: float = None) -> int:
+        return self.fee(self.tx_size(inputs, output_scripts), rate)
+
+    def payment_fee(self, inputs: int = 1, outputs: int = 2) -> int:
+        """Fee for a plain P2PKH payment (outputs includes change)."""
+        return self.fee_for(inputs, [P2PKH_SCRIPT_SIZE] * outputs)
+
+# Example usage:
+# fees = FeeEngine.shared()
+# fees.payment_fee()                                  # 1-in / 2-out P2PKH payment
+# fees.fee_for(1, [FeeEngine.op_return_size(4096), P2PKH_SCRIPT_SIZE])
@@ -0,0 +1,281 @@
+"""
+header_store.py - Local block headers and SPV checks for OpenSoul agents
+
+get_history trusts whatever the chain API says a tx contains. With SPV, the
+API only has to supply a merkle path per log tx, and the check runs locally
+against block headers the auditor holds. HeaderStore keeps those headers as
+raw 80-byte records in one memory-mapped file, addressed by height, with a
+hash -> height index built on first use. Headers are only accepted if they
+link to the previous one and meet their proof-of-work target, and that target
+may be no easier than a minimum-work floor (by default TARGET_SLACK times the
+checkpoint's target). Stored headers are only replaced by a branch with more
+work. This is not full difficulty validation: a chain API willing to mine at
+the floor can still feed a short branch, it just cannot do so for free.
+
+Merkle paths use the TSC format that WhatsOnChain serves
+({"index", "txOrId", "target", "nodes"}, "*" for a node that is its own
+sibling) and are folded with sha256d.
+
+A store starts at a checkpoint: the hash of a block the auditor trusts, at
+base_height (0 for genesis). The header stored at base_height must match it.
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional
+
+from merkle_utils import sha256d
+
+HEADER_SIZE = 80
+
+
+def block_hash(header: bytes) -> str:
+    """Block hash of a raw header, in the usual (reversed hex) display order."""
+    return sha256d(header)[::-1].hex()
+
+
+def header_target(bits: int) -> int:
+    """Proof-of-work target encoded by a header's compact bits field."""
+    exponent, mantissa = bits >> 24, bits & 0x007fffff
+    return mantissa << (8 * (exponent - 3)) if exponent >= 3 else mantissa >> (8 * (3 - exponent))
+
+
+def header_work(bits: int) -> int:
+    """Expected number of hashes to mine a header with these bits."""
+    return (1 << 256) // (header_target(bits) + 1)
+
+
+def header_bits(header: bytes) -> int:
+    return struct.unpack_from("<I", header, 72)[0]
+
+
+def header_from_json(data: dict) -> bytes:
+    """Raw 80-byte header from a WhatsOnChain block header JSON object."""
+    prev = data.get("previousblockhash") or "00" * 32
+    return (struct.pack("<I", data["version"]) + bytes.fromhex(prev)[::-1] + bytes.fromhex(data["merkleroot"])[::-1]
+            + struct.pack("<III", data["time"], int(data["bits"], 16), data["nonce"]))
+
+
+def merkle_root_from_path(txid: str, index: int, nodes: List[str]) -> bytes:
+    """Merkle root (internal byte order) from a txid, its index in the block and TSC path nodes."""
+    node = bytes.fromhex(txid)[::-1]
+    for sibling in nodes:
+        other = node if sibling == "*" else bytes.fromhex(sibling)[::-1]
+        node = sha256d(other + node) if index & 1 else sha256d(node + other)
+        index >>= 1
+    return node
+
+
+class HeaderStore:
+    """
+    Usage:
+        headers = HeaderStore("headers.bin", base_height=800_000, checkpoint=trusted_hash)   # or 0 for genesis
+        await headers.sync(client)                                  # fetch, link-check and store new headers
+        height = headers.verify_tsc(await client.get_merkle_proof(txid), txid)   # None if the path is wrong
+    """
+    MAGIC = b"OSHS"
+    VERSION = 2
+    _META = struct.Struct("<4sBQ32s")  # magic, version, base height, checkpoint hash; padded to 80 bytes
+    TARGET_SLACK = 16  # default floor: difficulty may fall to 1/16 of the checkpoint's
+
+    def __init__(self, path: str = "headers.bin", base_height: int = 0, checkpoint=None,
+                 max_target: int = None, check_pow: bool = True):
+        """
+        checkpoint is the trusted block at base_height: its hash (display hex) or raw header.
+        It is required to create a store and must match the stored one when reopening.
+        max_target is the easiest proof-of-work target accepted (default: TARGET_SLACK times
+        the checkpoint header's target).
+        """
+        self.path = path
+        self.check_pow = check_pow
+        self.max_target = max_target
+        checkpoint_header = checkpoint if isinstance(checkpoint, (bytes, bytearray)) else None
+        trusted = None
+        if checkpoint_header is not None:
+            trusted = sha256d(bytes(checkpoint_header))
+        elif checkpoint is not None:
+            trusted = bytes.fromhex(checkpoint)[::-1]
+        if not os.path.exists(path):
+            if trusted is None:
+                raise ValueError(f"Creating {path} needs a trusted checkpoint (block hash at height {base_height})")
+            with open(path, "wb") as f:
+                f.write(self._META.pack(self.MAGIC, self.VERSION, base_height, trusted).ljust(HEADER_SIZE, b"\x00"))
+        with open(path, "rb") as f:
+            meta = f.read(HEADER_SIZE)
+        if len(meta) != HEADER_SIZE:
+            raise ValueError(f"{path} is not a header store")
+        magic, version, self.base_height, self.checkpoint = self._META.unpack_from(meta)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a header store")
+        if trusted is not None and (trusted != self.checkpoint or base_height != self.base_height):
+            raise ValueError(f"{path} was created from a different checkpoint (height {self.base_height}, "
+                             f"{self.checkpoint[::-1].hex()})")
+        self._file = open(path, "r+b")
+        self._mm = None
+        self._index = None  # block hash (internal order) -> height, built on first lookup
+        self._map()
+        if checkpoint_header is not None and not self.count:
+            self.add([bytes(checkpoint_header)], self.base_height)
+
+    def _map(self):
+        if self._mm is not None:
+            self._mm.close()
+        size = os.fstat(self._file.fileno()).st_size
+        self.count = size // HEADER_SIZE - 1
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+
+    @property
+    def tip(self) -> Optional[int]:
+        """Height of the last stored header (None if empty)."""
+        return self.base_height + self.count - 1 if self.count else None
+
+    def header(self, height: int) -> bytes:
+        if not self.count or not (self.base_height <= height <= self.tip):
+            raise IndexError(f"No header for height {height} in {self.path}")
+        start = HEADER_SIZE * (1 + height - self.base_height)
+        return self._mm[start:start + HEADER_SIZE]
+
+    def merkle_root(self, height: int) -> bytes:
+        return self.header(height)[36:68]
+
+    def height_of(self, block_hash_hex: str) -> Optional[int]:
+        if self._index is None:
+            self._index = {sha256d(self._mm[HEADER_SIZE * (1 + i):HEADER_SIZE * (2 + i)]): self.base_height + i
+                           for i in range(self.count)}
+        return self._index.get(bytes.fromhex(block_hash_hex)[::-1])
+
+    # -- adding headers -------------------------------------------------------
+
+    def add(self, headers: List[bytes], start_height: int) -> int:
+        """
+        Store consecutive raw headers starting at start_height. The header at base_height
+        must be the checkpoint; each later one must link to the one before it and meet its
+        proof-of-work target, no easier than the floor. Headers already stored at or above
+        start_height are replaced (a reorg) only if the new ones carry more work.
+        Returns the new tip height.
+        """
+        tip = self.tip if self.count else self.base_height - 1
+        if not (self.base_height <= start_height <= tip + 1):
+            raise ValueError(f"Headers from {start_height} do not connect to {self.path} (tip {tip})")
+        expected = sha256d(self.header(start_height - 1)) if start_height > self.base_height else None
+        floor = self._floor() if start_height > self.base_height else None  # else from the checkpoint below
+        hashes = []
+        work = 0
+        for n, header in enumerate(headers):
+            height = start_height + n
+            if len(header) != HEADER_SIZE:
+                raise ValueError(f"Header for height {height} is {len(header)} bytes, not {HEADER_SIZE}")
+            if height == self.base_height:
+                if sha256d(header) != self.checkpoint:
+                    raise ValueError(f"Header for height {height} is not the checkpoint {self.checkpoint[::-1].hex()}")
+                floor = self._floor(header)
+            elif header[4:36] != expected:
+                raise ValueError(f"Header for height {height} does not link to the previous header")
+            expected = sha256d(header)
+            target = header_target(header_bits(header))
+            if self.check_pow:
+                if int.from_bytes(expected, "little") > target:
+                    raise ValueError(f"Header for height {height} does not meet its proof-of-work target")
+                if target > floor:
+                    raise ValueError(f"Header for height {height} has less work than the floor (target {floor:x})")
+            work += header_work(header_bits(header))
+            hashes.append(expected)
+        if start_height <= tip:
+            replaced = sum(header_work(header_bits(self.header(h))) for h in range(start_height, tip + 1))
+            if work <= replaced:
+                raise ValueError(f"Headers from {start_height} carry less work than the stored ones they would replace")
+            self._index = None  # replaced headers leave the index
+        self._file.seek(HEADER_SIZE * (1 + start_height - self.base_height))
+        self._file.truncate()
+        self._file.write(b"".join(headers))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._map()
+        if self._index is not None:
+            self._index.update((h, start_height + i) for i, h in enumerate(hashes))
+        return self.tip
+
+    def _floor(self, checkpoint_header: bytes = None) -> int:
+        if self.max_target is not None:
+            return self.max_target
+        header = checkpoint_header if checkpoint_header is not None else self.header(self.base_height)
+        return header_target(header_bits(header)) * self.TARGET_SLACK
+
+    async def sync(self, backend, to_height: int = None, concurrency: int = 8, max_reorg: int = 100) -> int:
+        """
+        Fetch headers from backend up to to_height (default: its tip), stepping back over reorgs
+        (never past the checkpoint; add() keeps the stored branch unless the new one has more work).
+        Returns the tip.
+        """
+        target = to_height if to_height is not None else await backend.get_chain_height()
+        start = self.tip + 1 if self.count else self.base_height
+        # A reorg shows up as our tip no longer matching the backend's header at that height
+        while self.count and start > self.base_height and start - 1 > (self.tip or 0) - max_reorg:
+            if await backend.get_header(start - 1) == self.header(start - 1):
+                break
+            start -= 1
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(height: int) -> bytes:
+            async with semaphore:
+                return await backend.get_header(height)
+        step = concurrency * 16
+        for first in range(start, target + 1, step):
+            last = min(target, first + step - 1)
+            self.add(await asyncio.gather(*(fetch(h) for h in range(first, last + 1))), first)
+        return self.tip
+
+    # -- SPV ------------------------------------------------------------------
+
+    def verify_tsc(self, proof: dict, txid: str = None) -> Optional[int]:
+        """
+        Check a TSC merkle proof against the stored headers. Returns the block height
+        if the path leads to that block's merkle root, None if it does not.
+        Raises ValueError if the block is not in the store (sync first) or the
+        proof's target type cannot be located.
+        """
+        tx = proof["txOrId"]
+        proof_txid = tx if len(tx) == 64 else sha256d(bytes.fromhex(tx))[::-1].hex()  # full tx given
+        if txid is not None and txid != proof_txid:
+            return None
+        target_type = proof.get("targetType", "hash")
+        if target_type == "hash":
+            target = proof["target"]
+        elif target_type == "header":
+            target = block_hash(bytes.fromhex(proof["target"]))
+        else:
+            raise ValueError(f"Cannot locate a block from a {target_type} target; ask for targetType 'hash'")
+        height = self.height_of(target)
+        if height is None:
+            raise ValueError(f"Block {target} is not in {self.path} (tip {self.tip})")
+        root = merkle_root_from_path(proof_txid, proof["index"], proof["nodes"])
+        return height if root == self.merkle_root(height) else None
+
+    def verify_many(self, proofs: Dict[str, dict]) -> Dict[str, Optional[int]]:
+        """verify_tsc for {txid: proof}; blocks missing from the store map to None as well."""
+        results = {}
+        for txid, proof in proofs.items():
+            try:
+                results[txid] = self.verify_tsc(proof, txid)
+            except ValueError:
+                results[txid] = None
+        return results
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Example usage:
+# headers = HeaderStore("headers.bin", base_height=850_000, checkpoint=trusted_block_hash)
+# await headers.sync(ChainClient.shared(API_BASE))
+# headers.verify_tsc(await client.get_merkle_proof(txid), txid)   # -> block height
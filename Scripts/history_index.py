@@ -0,0 +1,188 @@
+"""
+history_index.py - Local incremental history index for OpenSoul agents
+
+Stores decoded audit log payloads in SQLite, keyed by txid and by agent, so
+AuditLogger.get_history only has to walk the chain back to the last txid it
+already knows instead of all the way to genesis on every call. Payloads carry a
+per-agent seq number that orders logs written on parallel UTXO lanes.
+
+Chain walks in progress are staged in their own table (depth from the head, as
+positions are only known once the walk reaches an indexed tx), so a long walk
+never has to be held in memory and an abandoned one is simply dropped.
+"""
+
+import json
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Set
+
+
+class HistoryIndex:
+    """
+    Every tx seen while walking an address's log chain is stored with its chain
+    position (0 = oldest known ancestor). Txs without a log payload are kept too,
+    so later syncs can stop on them.
+    Usage:
+        index = HistoryIndex("audit_history.db")
+        index.stage(walk_id, depth, address, txid, prev_txid, payload)   # per walked tx, newest first
+        index.commit_walk(walk_id, base_txid)
+        logs = index.get_logs(address)
+    """
+    INSERT = ("INSERT OR REPLACE INTO logs (txid, address, agent_id, prev_txid, pos, payload, seq) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, path: str = "audit_history.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # a rebuildable cache; no fsync per staged tx
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS logs (
+                txid TEXT PRIMARY KEY,
+                address TEXT NOT NULL,
+                agent_id TEXT,
+                prev_txid TEXT,
+                pos INTEGER NOT NULL,
+                payload TEXT,
+                seq INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS logs_address_pos ON logs(address, pos);
+            CREATE INDEX IF NOT EXISTS logs_agent_pos ON logs(agent_id, pos);
+            CREATE TABLE IF NOT EXISTS walk (
+                walk_id TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                txid TEXT NOT NULL,
+                address TEXT NOT NULL,
+                agent_id TEXT,
+                prev_txid TEXT,
+                payload TEXT,
+                seq INTEGER,
+                PRIMARY KEY (walk_id, depth)
+            );
+            CREATE INDEX IF NOT EXISTS walk_txid ON walk(txid);
+            CREATE TABLE IF NOT EXISTS spv (
+                txid TEXT PRIMARY KEY,
+                block_hash TEXT NOT NULL,
+                height INTEGER NOT NULL
+            );
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(logs)")]
+        if "seq" not in columns:  # index created before lanes existed
+            self.conn.execute("ALTER TABLE logs ADD COLUMN seq INTEGER")
+        self.conn.commit()
+
+    def position(self, txid: str) -> Optional[int]:
+        row = self.conn.execute("SELECT pos FROM logs WHERE txid = ?", (txid,)).fetchone()
+        return row[0] if row else None
+
+    def contains(self, txid: str) -> bool:
+        return self.position(txid) is not None
+
+    def append(self, address: str, txid: str, prev_txid: str, payload, seq: int = None) -> bool:
+        """Record a tx we just broadcast. Only possible if its parent is already indexed."""
+        prev_pos = self.position(prev_txid)
+        if prev_pos is None:
+            return False
+        with self.conn:
+            self.conn.execute(self.INSERT, self._row(address, txid, prev_txid, prev_pos + 1, payload, seq))
+        return True
+
+    def get_logs(self, address: str = None, agent_id: str = None) -> List[dict]:
+        """
+        Return decoded payloads in chronological order, filtered by address and/or agent.
+        Payloads without a seq (written before lanes) come first, in chain order.
+        """
+        return list(self.iter_logs(address, agent_id))
+
+    def iter_logs(self, address: str = None, agent_id: str = None, newest_first: bool = False) -> Iterator[dict]:
+        """get_logs as a generator over the cursor, optionally newest-first; rows are decoded one at a time."""
+        query = "SELECT payload FROM logs WHERE payload IS NOT NULL"
+        params = []
+        if address:
+            query += " AND address = ?"
+            params.append(address)
+        if agent_id:
+            query += " AND agent_id = ?"
+            params.append(agent_id)
+        if newest_first:
+            query += " ORDER BY seq IS NOT NULL DESC, seq DESC, pos DESC"
+        else:
+            query += " ORDER BY seq IS NOT NULL, seq, pos"
+        for row in self.conn.execute(query, params):
+            yield json.loads(row[0])
+
+    # -- staged chain walks -----------------------------------------------------
+
+    def stage(self, walk_id: str, depth: int, address: str, txid: str, prev_txid: str, payload):
+        """Record one walked tx; depth 0 is the head the walk started from."""
+        _, _, agent_id, _, _, data, seq = self._row(address, txid, prev_txid, 0, payload)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO walk (walk_id, depth, txid, address, agent_id, prev_txid, payload, seq) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (walk_id, depth, txid, address, agent_id, prev_txid, data, seq))
+
+    def staged_by(self, txid: str) -> Set[str]:
+        """Walks that have staged txid."""
+        return {row[0] for row in self.conn.execute("SELECT walk_id FROM walk WHERE txid = ?", (txid,))}
+
+    def commit_walk(self, walk_id: str, base_txid: str = None):
+        """
+        Move a finished walk into the index. base_txid is the indexed tx it stopped
+        at (None if it reached genesis); positions continue from there.
+        """
+        base = self.position(base_txid) if base_txid else None
+        start = base + 1 if base is not None else 0
+        top = self.conn.execute("SELECT MAX(depth) FROM walk WHERE walk_id = ?", (walk_id,)).fetchone()[0]
+        with self.conn:
+            if top is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO logs (txid, address, agent_id, prev_txid, pos, payload, seq) "
+                    "SELECT txid, address, agent_id, prev_txid, ? - depth, payload, seq FROM walk WHERE walk_id = ?",
+                    (start + top, walk_id))
+            self.conn.execute("DELETE FROM walk WHERE walk_id = ?", (walk_id,))
+
+    def drop_walk(self, walk_id: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM walk WHERE walk_id = ?", (walk_id,))
+
+    def log_txids(self, address: str) -> List[str]:
+        """Txids of the logs indexed for address, in chain order."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT txid FROM logs WHERE address = ? AND payload IS NOT NULL ORDER BY pos", (address,))]
+
+    # -- SPV results --------------------------------------------------------------
+
+    def mark_verified(self, rows: List[tuple]):
+        """Remember txs whose merkle proofs checked out: [(txid, block_hash, height)]."""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO spv (txid, block_hash, height) VALUES (?, ?, ?)", rows)
+
+    def verified(self, txids: List[str]) -> Dict[str, tuple]:
+        """{txid: (block_hash, height)} for the txids verified before."""
+        found = {}
+        txids = list(txids)
+        for start in range(0, len(txids), 500):  # stay under SQLite's bound-parameter limit
+            chunk = txids[start:start + 500]
+            found.update((row[0], (row[1], row[2])) for row in self.conn.execute(
+                f"SELECT txid, block_hash, height FROM spv WHERE txid IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def get_log(self, txid: str) -> Optional[dict]:
+        row = self.conn.execute("SELECT payload FROM logs WHERE txid = ?", (txid,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _row(address, txid, prev_txid, pos, payload, seq=None):
+        agent_id = payload.get("agent_id") if isinstance(payload, dict) else None
+        if seq is None and isinstance(payload, dict):
+            seq = payload.get("seq")
+        data = json.dumps(payload) if payload is not None else None
+        return (txid, address, agent_id, prev_txid, pos, data, seq)
+
+# Example usage:
+# index = HistoryIndex("audit_history.db")
+# index.stage("walk-1", 0, addr, "tx2", "tx1", {...}); index.stage("walk-1", 1, addr, "tx1", None, {...})
+# index.commit_walk("walk-1")
+# index.get_logs(addr, agent_id="my-agent")
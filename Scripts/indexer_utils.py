@@ -4,29 +4,41 @@ indexer_utils.py - On-chain data indexing/search utilities for OpenSoul agents
 Provides functions to search and filter logs/data using indexer APIs (e.g., WhatsOnChain, MatterCloud).
 """
 
-import requests
+from chain_backend import op_return_data
+from chain_client import ChainClient
 
 WOC_API = "https://api.whatsonchain.com/v1/bsv/main"
 
 class IndexerUtils:
     @staticmethod
-    def search_opreturn(address: str, query: str = None) -> list:
-        url = f"{WOC_API}/address/{address}/txs"
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            raise RuntimeError(f"Indexer search failed: {resp.text}")
-        txs = resp.json()
+    def search_opreturn(address: str, query: str = None, backend=None) -> list:
+        """
+        OP_RETURN outputs in an address's history: [{"txid", "op_return": script hex, "data": [push bytes]}].
+        query matches text inside the pushed data (or, as before, a substring of the script hex).
+        """
+        needle = query.encode("utf-8") if query else None
+        try:
+            txs = (backend or ChainClient.shared(WOC_API)).get_history_sync(address)
+        except RuntimeError as e:
+            raise RuntimeError(f"Indexer search failed: {e}")
         results = []
         for tx in txs:
             for vout in tx.get('vout', []):
                 if vout.get('value', 0) == 0 and 'scriptPubKey' in vout:
-                    script = vout['scriptPubKey'].get('hex', '')
-                    if script.startswith('6a'):  # OP_RETURN
-                        if not query or query in script:
-                            results.append({
-                                'txid': tx['txid'],
-                                'op_return': script
-                            })
+                    script_hex = vout['scriptPubKey'].get('hex', '')
+                    script = bytes.fromhex(script_hex)
+                    try:
+                        pushes = op_return_data(script)
+                    except ValueError:
+                        continue
+                    if pushes is None:
+                        continue
+                    if not query or needle in script or query in script_hex:
+                        results.append({
+                            'txid': tx['txid'],
+                            'op_return': script_hex,
+                            'data': [bytes(p) for p in pushes]
+                        })
         return results
 
 # Example usage:
@@ -9,7 +9,8 @@ import sys
 
 REQUIRED_PACKAGES = [
     "bsv-sdk",
-    "requests"
+    "requests",
+    "aiohttp"
 ]
 
 def install(package):
@@ -0,0 +1,258 @@
+"""
+logger_service.py - Long-lived multi-agent audit logging service for OpenSoul
+
+Hosts many agent identities in one process instead of building a fresh
+AuditLogger per session. Every hosted logger shares one chain backend (by
+default a pooled ChainClient: connections plus raw-tx cache), one FeeEngine (rate cache), one history
+index, one UTXO state store (and optionally one BroadcastBatcher), while keeping its own lanes, locks
+and journal, so one agent's flush never waits on another's.
+
+Agents use it in-process (AuditLoggerService) or over a local unix socket
+speaking JSON lines (ServiceClient):
+    request:  {"id": 1, "op": "log", "agent_id": "a", "entry": {...}}
+    response: {"id": 1, "ok": true, "result": ...} / {"id": 1, "ok": false, "error": "..."}
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import re
+
+from bsv import PrivateKey
+from AuditLogger import AuditLogger, API_BASE
+from chain_backend import ChainBackend
+from chain_client import ChainClient
+from fee_utils import FeeEngine
+from history_index import HistoryIndex
+from utxo_store import UtxoStore
+
+
+class AuditLoggerService:
+    """
+    Usage:
+        service = AuditLoggerService(state_dir="audit_state", config={"flush_max_age": 300})
+        service.register("agent-1", wif1)
+        service.log("agent-1", {"action": "tool_call", "tokens_in": 10, "tokens_out": 5})
+        await service.flush_all()
+        await service.serve("opensoul.sock")   # optional local socket API
+    """
+    AGENT_PATHS = ("cache_file", "journal_dir", "leaf_dir", "session_index")  # one per agent, never shared
+    OPS = ("register", "unregister", "log", "flush", "flush_all", "history", "pending", "new_session")
+    HISTORY_FILTERS = ("session_start", "action", "since", "until", "newest_first")
+
+    def __init__(self, api_base: str = API_BASE, config: dict = None, state_dir: str = "audit_state",
+                 client: ChainBackend = None, fees: FeeEngine = None, broadcaster=None):
+        self.config = config or {}  # defaults applied to every registered agent
+        shared = [key for key in self.AGENT_PATHS if self.config.get(key)]
+        if shared:
+            raise ValueError(f"{', '.join(shared)} must differ per agent; pass them to register() instead")
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self.client = client or ChainClient.shared(api_base)
+        self.fees = fees or FeeEngine.shared()
+        self.broadcaster = broadcaster  # e.g. BroadcastBatcher(ArcTransport()); batches end-of-session flushes
+        self.history = HistoryIndex(os.path.join(state_dir, "history.db"))
+        self.store = UtxoStore(os.path.join(state_dir, "utxo.db"))  # lanes of every agent, keyed by address
+        self.loggers = {}    # agent_id -> AuditLogger
+        self._agents = {}    # address -> agent_id
+        self._server = None
+        self._socket_path = None
+
+    # -- in-process API -------------------------------------------------------
+
+    def register(self, agent_id: str, priv_wif: str, config: dict = None) -> AuditLogger:
+        """Host an agent identity (idempotent). Returns its long-lived logger."""
+        address = PrivateKey(priv_wif).address(compressed=True)
+        existing = self.loggers.get(agent_id)
+        if existing is not None:
+            if existing.address != address:
+                raise ValueError(f"Agent {agent_id} is already registered with a different key")
+            return existing
+        if address in self._agents:
+            # One key is one agent identity here: its seq counter and lanes are shared
+            raise ValueError(f"Key for {agent_id} is already registered to agent {self._agents[address]}")
+        agent_dir = os.path.join(self.state_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", agent_id))
+        os.makedirs(agent_dir, exist_ok=True)
+        agent_config = {
+            **self.config,
+            "cache_file": os.path.join(agent_dir, "cache.json"),
+            "journal_dir": os.path.join(agent_dir, "journal"),
+            "leaf_dir": os.path.join(agent_dir, "leaves"),
+            **(config or {}),
+            "agent_id": agent_id,
+        }
+        logger = AuditLogger(priv_wif, agent_config, client=self.client, fees=self.fees,
+                             history=self.history, broadcaster=self.broadcaster, store=self.store)
+        self.loggers[agent_id] = logger
+        self._agents[address] = agent_id
+        return logger
+
+    def get(self, agent_id: str) -> AuditLogger:
+        logger = self.loggers.get(agent_id)
+        if logger is None:
+            raise ValueError(f"Unknown agent: {agent_id}")
+        return logger
+
+    async def unregister(self, agent_id: str, flush: bool = True):
+        """Stop hosting an agent, flushing what it still has pending. Returns the txid, if any."""
+        logger = self.get(agent_id)
+        try:
+            return await logger.close(flush=flush)
+        finally:
+            del self.loggers[agent_id]
+            self._agents.pop(logger.address, None)
+
+    def new_session(self, agent_id: str):
+        self.get(agent_id).new_session()
+
+    def log(self, agent_id: str, entry: dict):
+        self.get(agent_id).log(entry)
+
+    def pending(self, agent_id: str) -> int:
+        return len(self.get(agent_id).pending_logs)
+
+    async def flush(self, agent_id: str):
+        return await self.get(agent_id).flush()
+
+    async def flush_all(self) -> dict:
+        """Flush every agent concurrently. Returns {agent_id: txid or None}; failures are reported, not raised."""
+        agent_ids = list(self.loggers)
+        results = await asyncio.gather(*(self.flush(a) for a in agent_ids), return_exceptions=True)
+        for agent_id, result in zip(agent_ids, results):
+            if isinstance(result, Exception):
+                print(f"Flush failed for {agent_id}: {result}")
+        return {a: (None if isinstance(r, Exception) else r) for a, r in zip(agent_ids, results)}
+
+    async def get_history(self, agent_id: str, refresh: bool = False, limit: int = None, **filters) -> list:
+        """All of an agent's logs oldest-first, or with limit/filters the newest matching ones (see iter_history)."""
+        logger = self.get(agent_id)
+        if limit is None and not filters:
+            return await logger.get_history(agent_id=agent_id, refresh=refresh)
+        logs = []
+        async with contextlib.aclosing(logger.iter_history(agent_id=agent_id, refresh=refresh, **filters)) as it:
+            async for log in it:
+                logs.append(log)
+                if limit is not None and len(logs) >= limit:
+                    break
+        return logs
+
+    async def close(self, flush: bool = True):
+        """Stop the socket server and every hosted logger (optionally flushing them)."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+        await asyncio.gather(*(self.unregister(a, flush=flush) for a in list(self.loggers)),
+                             return_exceptions=True)
+        if self.broadcaster is not None:
+            await self.broadcaster.close()
+        self.history.close()
+        self.store.close()
+
+    # -- local socket API -----------------------------------------------------
+
+    async def serve(self, path: str = "opensoul.sock"):
+        """Listen for JSON-lines requests on a unix socket (owner-only; requests may carry WIFs)."""
+        if os.path.exists(path):
+            os.remove(path)  # stale socket from a previous run
+        self._server = await asyncio.start_unix_server(self._handle, path=path)
+        os.chmod(path, 0o600)
+        self._socket_path = path
+        print(f"OpenSoul logger service listening on {path}")
+        return self._server
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._dispatch(line)
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, line: bytes) -> dict:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            op = request.get("op")
+            if op not in self.OPS:
+                raise ValueError(f"Unknown op: {op}")
+            agent_id = request.get("agent_id")
+            if op == "register":
+                self.register(agent_id, request["priv_wif"], request.get("config"))
+                result = True
+            elif op == "unregister":
+                result = await self.unregister(agent_id, request.get("flush", True))
+            elif op == "log":
+                self.log(agent_id, request["entry"])
+                result = True
+            elif op == "flush":
+                result = await self.flush(agent_id)
+            elif op == "flush_all":
+                result = await self.flush_all()
+            elif op == "history":
+                filters = {k: request[k] for k in self.HISTORY_FILTERS if request.get(k) is not None}
+                result = await self.get_history(agent_id, request.get("refresh", False), request.get("limit"), **filters)
+            elif op == "pending":
+                result = self.pending(agent_id)
+            else:  # new_session
+                self.new_session(agent_id)
+                result = True
+            return {"id": request_id, "ok": True, "result": result}
+        except Exception as e:
+            return {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+class ServiceClient:
+    """
+    Client for AuditLoggerService.serve. Calls on one connection are serialized.
+    Usage:
+        client = ServiceClient("opensoul.sock")
+        await client.call("register", agent_id="agent-1", priv_wif=wif)
+        await client.call("log", agent_id="agent-1", entry={...})
+        txid = await client.call("flush", agent_id="agent-1")
+    """
+
+    def __init__(self, path: str = "opensoul.sock"):
+        self.path = path
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        self._next_id = 0
+
+    async def call(self, op: str, **params):
+        async with self._lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+            self._next_id += 1
+            request = {"id": self._next_id, "op": op, **params}
+            self._writer.write((json.dumps(request) + "\n").encode("utf-8"))
+            await self._writer.drain()
+            line = await self._reader.readline()
+        if not line:
+            raise RuntimeError("Logger service closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise RuntimeError(f"Logger service {op} failed: {response.get('error')}")
+        return response.get("result")
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+
+# Example usage:
+# service = AuditLoggerService(state_dir="audit_state", config={"flush_max_age": 300, "batch_mode": "file"})
+# for agent_id, wif in agents.items(): service.register(agent_id, wif)
+# await service.serve("opensoul.sock")
+# client = ServiceClient("opensoul.sock"); await client.call("log", agent_id="agent-1", entry={...})
@@ -0,0 +1,246 @@
+"""
+merkle_anchor.py - Merkle-anchored audit logging for OpenSoul agents
+
+Instead of writing every action to an OP_RETURN, a flush hashes the batch's
+actions into a Merkle tree (MerkleUtils) and puts only the root, the action
+count and a locator for the leaves on chain, so on-chain bytes per flush stay
+constant however large the batch is. The actions themselves go to a leaf
+store (a local directory or P2WDB), encoded with the logger's payload
+pipeline, so they are compressed and, with PGP enabled, encrypted before they
+leave the machine. Any single action can later be proven against the on-chain
+root with a standard Merkle inclusion proof, and many actions of one flush
+with a single multiproof that carries each shared sibling hash once.
+
+Alongside the per-flush roots, a MerkleAccumulator keeps a running root over
+every anchored action in broadcast order. Only its frontier is kept (and saved
+to leaf_dir/frontier.bin), so the live root costs O(log n) per update instead
+of a rebuild over the whole log. The leaf hashes are appended to
+leaf_dir/running.leaves, from which running_store() builds a memory-mapped
+tree (merkle_store.py) to prove any action against the running root. With
+workers set, roots of large batches are hashed on several cores
+(merkle_parallel.py).
+"""
+
+import asyncio
+import json
+import os
+from typing import List
+
+from merkle_parallel import ParallelMerkleBuilder
+from merkle_store import MerkleStore
+from merkle_utils import MerkleAccumulator, MerkleBatchVerifier, MerkleTree, MerkleUtils, sha256d
+from p2wdb_utils import P2WDB
+
+
+def leaf_hash(action: dict) -> bytes:
+    """Leaf for one logged action: sha256d of its canonical JSON."""
+    return sha256d(json.dumps(action, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+class LocalLeafStore:
+    """Leaf batches as files named by their root in a local directory."""
+    name = "local"
+
+    def __init__(self, directory: str = "audit_leaves"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, root_hex: str, data: bytes) -> str:
+        path = os.path.join(self.directory, f"{root_hex}.bin")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)  # a batch file is either complete or absent
+        return root_hex
+
+    def get(self, locator: str) -> bytes:
+        path = os.path.join(self.directory, f"{locator}.bin")
+        if not os.path.exists(path):
+            raise ValueError(f"Leaf batch {locator} not found in {self.directory}")
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class P2WDBLeafStore:
+    """Leaf batches in P2WDB (public, so keep PGP enabled for private actions). Stored as hex text."""
+    name = "p2wdb"
+
+    def put(self, root_hex: str, data: bytes) -> str:
+        return P2WDB.write_file(data.hex().encode("ascii"), {"merkle_root": root_hex})
+
+    def get(self, locator: str) -> bytes:
+        return bytes.fromhex(P2WDB.read_file(locator).decode("ascii").strip())
+
+
+LEAF_STORES = {"local": LocalLeafStore, "p2wdb": P2WDBLeafStore}
+
+
+class MerkleAnchor:
+    """
+    Usage:
+        anchor = MerkleAnchor(pipeline, store="local", leaf_dir="audit_leaves")
+        payload = await anchor.commit(payload)          # metrics -> {"merkle": {...}}
+        anchor.advance(payload["merkle"])              # after the anchor tx is broadcast
+        anchor.discard(payload["merkle"])              # or if it was not
+        proof = await anchor.prove(payload["merkle"], 3)
+        MerkleAnchor.verify(proof)
+        proofs = await anchor.prove_many(payload["merkle"])   # every action, one tree build
+        multi = await anchor.prove_multi(payload["merkle"], [2, 3, 9])
+        MerkleAnchor.verify_multi(multi)
+        anchor.running_root()                          # {"root", "count"} over all anchored actions
+        anchor.running_store().proof(n)                # n-th anchored action vs the running root
+    """
+
+    def __init__(self, pipeline, store: str = "local", leaf_dir: str = "audit_leaves", workers: int = None):
+        if store not in LEAF_STORES:
+            raise ValueError(f"Unknown leaf store: {store} (expected one of {', '.join(LEAF_STORES)})")
+        self.pipeline = pipeline
+        self.store_name = store
+        self.leaf_dir = leaf_dir
+        self._stores = {}
+        os.makedirs(leaf_dir, exist_ok=True)
+        self.running = MerkleAccumulator(os.path.join(leaf_dir, "frontier.bin"))
+        self.running_leaves = os.path.join(leaf_dir, "running.leaves")
+        size = os.path.getsize(self.running_leaves) if os.path.exists(self.running_leaves) else 0
+        if size < self.running.count * MerkleStore.LEAF_SIZE:
+            raise ValueError(f"{self.running_leaves} holds {size // MerkleStore.LEAF_SIZE} leaves but the running "
+                             f"root counts {self.running.count}; the leaf file is damaged")
+        if size:
+            with open(self.running_leaves, "r+b") as f:
+                f.truncate(self.running.count * MerkleStore.LEAF_SIZE)  # drop leaves a crash left unaccounted
+        self._pending = {}  # root -> leaves of batches committed but not yet broadcast
+        self.builder = ParallelMerkleBuilder(workers) if workers and workers > 1 else None
+
+    def _store(self, name: str):
+        store = self._stores.get(name)
+        if store is None:
+            if name not in LEAF_STORES:
+                raise ValueError(f"Unknown leaf store: {name}")
+            store = self._stores[name] = LocalLeafStore(self.leaf_dir) if name == "local" else LEAF_STORES[name]()
+        return store
+
+    async def commit(self, payload: dict) -> dict:
+        """Store payload["metrics"] as leaves; return the payload with a fixed-size "merkle" anchor instead."""
+        actions = payload["metrics"]
+        leaves = [leaf_hash(a) for a in actions]
+        if self.builder is not None and len(leaves) >= self.builder.min_leaves:
+            root = (await asyncio.to_thread(self.builder.root, leaves)).hex()
+        else:
+            root = MerkleUtils.build_merkle_root(leaves).hex()
+        self._pending[root] = leaves
+        data = self.pipeline.encode({"root": root, "actions": actions})
+        locator = await asyncio.to_thread(self._store(self.store_name).put, root, data)
+        anchored = {k: v for k, v in payload.items() if k != "metrics"}
+        anchored["merkle"] = {"root": root, "count": len(actions), "store": self.store_name, "locator": locator}
+        return anchored
+
+    def advance(self, anchor: dict) -> dict:
+        """Fold a broadcast batch into the running root and persist the frontier."""
+        leaves = self._pending.pop(anchor["root"], None)
+        if leaves is None:
+            raise ValueError(f"Batch {anchor['root']} was not committed by this anchor")
+        # Durable before the frontier counts them, so the leaf file never falls behind it
+        MerkleStore.write_leaves(self.running_leaves, leaves, append=True, sync=True)
+        self.running.extend(leaves)
+        self.running.save()
+        return self.running_root()
+
+    def discard(self, anchor: dict):
+        """Forget a committed batch whose anchor tx was not broadcast (its leaf file stays, unreferenced)."""
+        self._pending.pop(anchor["root"], None)
+
+    def running_store(self) -> MerkleStore:
+        """Memory-mapped tree over every advanced action, (re)built from the leaf file when behind."""
+        if not self.running.count:
+            raise ValueError("No anchored actions yet")
+        path = os.path.join(self.leaf_dir, "running.tree")
+        if os.path.exists(path):
+            store = MerkleStore(path)
+            if len(store) == self.running.count:
+                return store
+            store.close()
+        return MerkleStore.build(self.running_leaves, path)
+
+    def running_root(self) -> dict:
+        """{"root": hex or None, "count"} over every action advanced so far."""
+        return {"root": self.running.root().hex() if self.running.count else None, "count": self.running.count}
+
+    def close(self):
+        """Shut down the parallel builder's process pool, if one was started."""
+        if self.builder is not None:
+            self.builder.close()
+
+    async def load(self, anchor: dict) -> List[dict]:
+        """The anchored actions, checked against the root."""
+        return (await self._load_tree(anchor))[0]
+
+    async def _load_tree(self, anchor: dict) -> tuple:
+        data = await asyncio.to_thread(self._store(anchor["store"]).get, anchor["locator"])
+        actions = self.pipeline.decode(data)["actions"]
+        tree = MerkleTree([leaf_hash(a) for a in actions])
+        if tree.root().hex() != anchor["root"]:
+            raise ValueError(f"Leaf batch {anchor['locator']} does not match root {anchor['root']}")
+        return actions, tree
+
+    async def prove(self, anchor: dict, index: int) -> dict:
+        """Inclusion proof for action number index: {"action", "index", "proof": [hex], "root"}."""
+        return (await self.prove_many(anchor, [index]))[0]
+
+    async def prove_many(self, anchor: dict, indices: List[int] = None) -> List[dict]:
+        """Proofs (as from prove()) for several actions, default all, from a single tree build."""
+        actions, tree = await self._load_tree(anchor)
+        indices = range(len(actions)) if indices is None else indices
+        for index in indices:
+            if not 0 <= index < len(actions):
+                raise IndexError(f"Action {index} out of range for a batch of {len(actions)}")
+        return [{"action": actions[i], "index": i, "proof": [p.hex() for p in tree.proof(i)], "root": anchor["root"]}
+                for i in indices]
+
+    async def prove_multi(self, anchor: dict, indices: List[int] = None) -> dict:
+        """
+        One compact proof for several actions (default all):
+        {"actions", "indices", "count", "proof": [hex], "root"}, with indices ascending.
+        """
+        actions, tree = await self._load_tree(anchor)
+        indices = sorted(set(range(len(actions)) if indices is None else indices))
+        if indices and not (0 <= indices[0] and indices[-1] < len(actions)):
+            raise IndexError(f"Actions {indices} out of range for a batch of {len(actions)}")
+        return {"actions": [actions[i] for i in indices], "indices": indices, "count": len(actions),
+                "proof": [p.hex() for p in tree.multiproof(indices)], "root": anchor["root"]}
+
+    @staticmethod
+    def verify(proof: dict) -> bool:
+        """Check a proof from prove() (compare its root with the one on chain)."""
+        return MerkleUtils.verify_merkle_proof(leaf_hash(proof["action"]), [bytes.fromhex(p) for p in proof["proof"]],
+                                               bytes.fromhex(proof["root"]), proof["index"])
+
+    @staticmethod
+    def verify_many(proofs: List[dict]) -> List[bool]:
+        """Check proofs from prove()/prove_many(), hashing nodes shared within a batch once."""
+        verifiers = {}
+        results = []
+        for proof in proofs:
+            verifier = verifiers.get(proof["root"])
+            if verifier is None:
+                verifier = verifiers[proof["root"]] = MerkleBatchVerifier(bytes.fromhex(proof["root"]))
+            results.append(verifier.verify(leaf_hash(proof["action"]), [bytes.fromhex(p) for p in proof["proof"]],
+                                           proof["index"]))
+        return results
+
+    @staticmethod
+    def verify_multi(proof: dict) -> bool:
+        """Check a proof from prove_multi() (compare its root with the one on chain)."""
+        if len(proof["actions"]) != len(proof["indices"]):
+            return False
+        leaves = {i: leaf_hash(a) for i, a in zip(proof["indices"], proof["actions"])}
+        return MerkleUtils.verify_merkle_multiproof(leaves, [bytes.fromhex(p) for p in proof["proof"]],
+                                                    bytes.fromhex(proof["root"]), proof["count"])
+
+# Example usage:
+# anchor = MerkleAnchor(PayloadPipeline(), store="local")
+# anchored = await anchor.commit({"agent_id": "a", "seq": 1, "metrics": actions})
+# anchor.advance(anchored["merkle"]); anchor.running_root()
+# proof = await anchor.prove(anchored["merkle"], 0); MerkleAnchor.verify(proof)
+# multi = await anchor.prove_multi(anchored["merkle"]); MerkleAnchor.verify_multi(multi)
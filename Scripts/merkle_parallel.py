@@ -0,0 +1,100 @@
+"""
+merkle_parallel.py - Multi-core Merkle root construction for OpenSoul agents
+
+MerkleUtils hashes one pair at a time on one core. ParallelMerkleBuilder puts
+the leaves in shared memory once and splits them into aligned subtrees of
+2**k leaves. A process pool hashes each subtree straight from the shared
+buffer and returns only its 32-byte root, and the roots are combined
+serially at the end.
+
+The result is bit-identical to MerkleUtils.build_merkle_root: complete
+subtree roots are exactly the nodes at level k of the full tree. A partial
+last subtree would have been paired with itself at every level above its own
+height in the full tree, so its root is lifted to level k the same way.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import List
+
+from merkle_utils import MerkleUtils, hash_pairs, sha256d
+
+
+def _subtree_root(shm_name: str, start: int, end: int, size: int, height: int) -> bytes:
+    """Root of the leaves in shared memory [start, end), lifted to the given height (runs in a worker)."""
+    shm = SharedMemory(name=shm_name)  # pool workers share the parent's resource tracker; the parent unlinks
+    try:
+        view = shm.buf[start:end]
+        level, level_height = (bytes(view) if end - start == size else hash_pairs(view, size)), 0
+        view.release()
+        if end - start > size:
+            level_height = 1
+            while len(level) > 32:
+                level = hash_pairs(level)
+                level_height += 1
+    finally:
+        shm.close()
+    while level_height < height:  # a partial last subtree: its root is the odd last node up to level height
+        level = sha256d(level + level)
+        level_height += 1
+    return level
+
+
+class ParallelMerkleBuilder:
+    """
+    Usage:
+        with ParallelMerkleBuilder(workers=8) as builder:
+            root = builder.root(leaf_hashes)      # same bytes as MerkleUtils.build_merkle_root
+    """
+
+    def __init__(self, workers: int = None, min_leaves: int = 1 << 16, chunks_per_worker: int = 4):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_leaves = min_leaves  # below this, pool round trips cost more than they save
+        self.chunks_per_worker = chunks_per_worker  # several subtrees per worker even out stragglers
+        self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def root(self, leaves: List[bytes]) -> bytes:
+        if not leaves:
+            raise ValueError("No leaves provided")
+        n = len(leaves)
+        chunk = 1 << max(0, (-(-n // (self.workers * self.chunks_per_worker)) - 1).bit_length())
+        if self.workers < 2 or n < self.min_leaves or chunk >= n:
+            return MerkleUtils.build_merkle_root(leaves)
+        size = len(leaves[0])
+        data = b"".join(leaves)
+        if len(data) != size * n:
+            raise ValueError("All leaves must be the same length")
+        height = chunk.bit_length() - 1
+        shm = SharedMemory(create=True, size=len(data))
+        try:
+            shm.buf[:len(data)] = data
+            del data
+            futures = [self._executor().submit(_subtree_root, shm.name, start * size, min(n, start + chunk) * size,
+                                               size, height)
+                       for start in range(0, n, chunk)]
+            roots = [future.result() for future in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+        return MerkleUtils.build_merkle_root(roots)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Example usage:
+# with ParallelMerkleBuilder() as builder:
+#     root = builder.root([sha256d(a) for a in actions])
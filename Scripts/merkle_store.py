@@ -0,0 +1,112 @@
+"""
+merkle_store.py - Memory-mapped Merkle trees for OpenSoul agents
+
+MerkleTree keeps every level in RAM, which stops fitting once a log reaches
+millions of actions. MerkleStore lays out the same tree on disk: one file with
+a small header, then each level as fixed-width 32-byte records, leaves first.
+The file is mapped read-only, so a root, proof or multiproof only faults in
+the pages on its paths and memory follows the pages touched, not the leaf
+count. build() makes the file from a leaf file in a streaming pass per level,
+holding one chunk at a time.
+"""
+
+import mmap
+import os
+import struct
+from typing import Iterable
+
+from merkle_utils import MerkleTree, hash_pairs
+
+
+class MerkleStore(MerkleTree):
+    """
+    Usage:
+        MerkleStore.write_leaves("leaves.bin", leaf_hashes)   # or any file of 32-byte leaves
+        tree = MerkleStore.build("leaves.bin", "tree.bin")
+        tree.root(); tree.proof(123456); tree.multiproof([1, 2, 3])
+        tree.close()
+    """
+    MAGIC = b"OSMT"
+    VERSION = 1
+    LEAF_SIZE = 32
+    CHUNK = 1 << 20  # bytes of a level hashed per step while building
+    _HEADER = struct.Struct("<4sBQ")  # magic, version, leaf count
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        header = self._file.read(self._HEADER.size)
+        if len(header) != self._HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path} is not a Merkle tree file")
+        magic, version, count = self._HEADER.unpack(header)
+        if magic != self.MAGIC or version != self.VERSION or not count:
+            self._file.close()
+            raise ValueError(f"{path} is not a Merkle tree file")
+        end = self._layout(count, self.LEAF_SIZE, self._HEADER.size)
+        if os.fstat(self._file.fileno()).st_size != end:
+            self._file.close()
+            raise ValueError(f"Merkle tree file {path} is truncated or corrupt")
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def write_leaves(path: str, leaves: Iterable[bytes], append: bool = False, sync: bool = False) -> int:
+        """Write 32-byte leaves to a leaf file (fsynced if sync); returns how many were written."""
+        written = 0
+        with open(path, "ab" if append else "wb") as f:
+            for leaf in leaves:
+                if len(leaf) != MerkleStore.LEAF_SIZE:
+                    raise ValueError(f"Leaves must be {MerkleStore.LEAF_SIZE} bytes, got {len(leaf)}")
+                f.write(leaf)
+                written += 1
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        return written
+
+    @classmethod
+    def build(cls, leaf_path: str, path: str, chunk: int = None) -> "MerkleStore":
+        """Build the tree file for a leaf file (written to path.tmp, then renamed) and open it."""
+        size = os.path.getsize(leaf_path)
+        if not size or size % cls.LEAF_SIZE:
+            raise ValueError(f"{leaf_path} must hold one or more whole {cls.LEAF_SIZE}-byte leaves")
+        chunk = max(64, (chunk or cls.CHUNK) // 64 * 64)  # whole pairs, so no pair straddles two chunks
+        layout = MerkleTree.__new__(MerkleTree)
+        layout._layout(size // cls.LEAF_SIZE, cls.LEAF_SIZE, cls._HEADER.size)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w+b") as out:
+            out.write(cls._HEADER.pack(cls.MAGIC, cls.VERSION, layout.width[0]))
+            with open(leaf_path, "rb") as leaves:
+                while True:
+                    data = leaves.read(chunk)
+                    if not data:
+                        break
+                    out.write(data)
+            for h in range(len(layout.width) - 1):
+                src, dst, remaining = layout.offset[h], layout.offset[h + 1], layout.width[h] * cls.LEAF_SIZE
+                while remaining:
+                    out.seek(src)
+                    data = out.read(min(chunk, remaining))
+                    parents = hash_pairs(data)
+                    out.seek(dst)
+                    out.write(parents)
+                    src, dst, remaining = src + len(data), dst + len(parents), remaining - len(data)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, path)
+        return cls(path)
+
+    def close(self):
+        self.buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Example usage:
+# MerkleStore.write_leaves("leaves.bin", (sha256d(a) for a in actions))
+# with MerkleStore.build("leaves.bin", "tree.bin") as tree:
+#     proof = tree.proof(42); MerkleUtils.verify_merkle_proof(leaf, proof, tree.root(), 42)
@@ -2,15 +2,35 @@
 merkle_utils.py - Merkle proof utilities for OpenSoul agents
 
 Provides functions to build and verify Merkle proofs for data/log inclusion.
+Trees follow the Bitcoin convention: an odd last node on a level is paired
+with itself. MerkleTree builds a tree once and serves any number of proofs
+from it, including multiproofs (one deduplicated sibling set for many leaves);
+MerkleBatchVerifier checks many proofs against one root without rehashing
+shared nodes; MerkleAccumulator builds the same roots incrementally.
 """
 
 import hashlib
-from typing import List
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
 
 def sha256d(data: bytes) -> bytes:
     return hashlib.sha256(hashlib.sha256(data).digest()).digest()
 
 
+def hash_pairs(nodes, size: int = 32) -> bytes:
+    """Parents of a run of fixed-size nodes (any bytes-like); an odd last node is paired with itself."""
+    sha256 = hashlib.sha256
+    view = memoryview(nodes)
+    pair = 2 * size
+    full = len(view) // pair * pair
+    parents = [sha256(sha256(view[i:i + pair]).digest()).digest() for i in range(0, full, pair)]
+    if full < len(view):
+        last = bytes(view[full:full + size])
+        parents.append(sha256d(last + last))
+    return b"".join(parents)
+
+
 class MerkleUtils:
     @staticmethod
     def build_merkle_root(leaves: List[bytes]) -> bytes:
@@ -19,12 +39,7 @@ class MerkleUtils:
         """
         if not leaves:
             raise ValueError("No leaves provided")
-        nodes = leaves[:]
-        while len(nodes) > 1:
-            if len(nodes) % 2 == 1:
-                nodes.append(nodes[-1])
-            nodes = [sha256d(nodes[i] + nodes[i+1]) for i in range(0, len(nodes), 2)]
-        return nodes[0]
+        return MerkleAccumulator().extend(leaves).root()
 
     @staticmethod
     def build_merkle_proof(leaves: List[bytes], index: int) -> List[bytes]:
@@ -84,6 +99,22 @@ class MerkleUtils:
         proof = MerkleUtils.build_merkle_proof(leaves, index)
         return [p.hex() for p in proof]
 
+    @staticmethod
+    def build_merkle_proofs(leaves: List[bytes], indices: Optional[Iterable[int]] = None) -> List[List[bytes]]:
+        """
+        Proofs for every leaf (or just indices) from a single tree build: O(n + k log n)
+        instead of one full rebuild per proof. Leaves must all be the same length.
+        """
+        return MerkleTree(leaves).proofs(indices)
+
+    @staticmethod
+    def build_merkle_proofs_hex(leaves_hex: List[str], indices: Optional[Iterable[int]] = None) -> List[List[str]]:
+        """
+        Bulk proofs for hex-encoded leaves. Returns one list of hex strings per index.
+        """
+        proofs = MerkleTree([bytes.fromhex(h) for h in leaves_hex]).proofs(indices)
+        return [[p.hex() for p in proof] for proof in proofs]
+
     @staticmethod
     def verify_merkle_proof_hex(leaf_hex: str, proof_hex: List[str], root_hex: str, index: int) -> bool:
         """
@@ -94,7 +125,315 @@ class MerkleUtils:
         root = bytes.fromhex(root_hex)
         return MerkleUtils.verify_merkle_proof(leaf, proof, root, index)
 
+    @staticmethod
+    def verify_merkle_proofs(items: Iterable[Tuple[bytes, List[bytes], int]], root: bytes) -> List[bool]:
+        """
+        Verify many (leaf, proof, index) proofs against one root, hashing each shared
+        interior node once (see MerkleBatchVerifier). Returns one bool per item.
+        """
+        verifier = MerkleBatchVerifier(root)
+        return [verifier.verify(leaf, proof, index) for leaf, proof, index in items]
+
+    @staticmethod
+    def build_merkle_multiproof(leaves: List[bytes], indices: Iterable[int]) -> List[bytes]:
+        """
+        One proof for several leaves: the sibling hashes none of them can derive,
+        each sent once. Verify with verify_merkle_multiproof and the leaf count.
+        """
+        return MerkleTree(leaves).multiproof(indices)
+
+    @staticmethod
+    def verify_merkle_multiproof(leaves: Dict[int, bytes], proof: List[bytes], root: bytes, count: int) -> bool:
+        """
+        Verify a multiproof for {index: leaf} in a tree of count leaves.
+        Returns True if valid, False otherwise.
+        """
+        if not leaves or any(not (0 <= i < count) for i in leaves):
+            return False
+        nodes, siblings, width = dict(leaves), iter(proof), count
+        while width > 1:
+            parents = {}
+            for pos in sorted(nodes):
+                if pos >> 1 in parents:
+                    continue  # hashed together with its left sibling
+                sibling = pos ^ 1
+                if sibling >= width:
+                    other = nodes[pos]
+                elif sibling in nodes:
+                    other = nodes[sibling]
+                else:
+                    other = next(siblings, None)
+                    if other is None:
+                        return False
+                pair = nodes[pos] + other if pos % 2 == 0 else other + nodes[pos]
+                parents[pos >> 1] = sha256d(pair)
+            nodes, width = parents, (width + 1) // 2
+        return next(siblings, None) is None and nodes[0] == root
+
+    @staticmethod
+    def build_merkle_multiproof_hex(leaves_hex: List[str], indices: Iterable[int]) -> List[str]:
+        """
+        Multiproof for hex-encoded leaves. Returns list of hex strings.
+        """
+        return [p.hex() for p in MerkleTree([bytes.fromhex(h) for h in leaves_hex]).multiproof(indices)]
+
+    @staticmethod
+    def verify_merkle_multiproof_hex(leaves_hex: Dict[int, str], proof_hex: List[str], root_hex: str,
+                                     count: int) -> bool:
+        """
+        Verify a multiproof for {index: hex leaf} with hex proof/root. Returns True if valid.
+        """
+        leaves = {i: bytes.fromhex(h) for i, h in leaves_hex.items()}
+        return MerkleUtils.verify_merkle_multiproof(leaves, [bytes.fromhex(h) for h in proof_hex],
+                                                    bytes.fromhex(root_hex), count)
+
+
+class MerkleTree:
+    """
+    A Merkle tree built once, with every level kept in one contiguous buffer:
+    level h is width[h] nodes of equal size starting at offset[h]. Pairs are
+    hashed straight from the buffer (two adjacent nodes are one slice), and a
+    proof is one lookup per level, so k proofs cost O(log n) each after the
+    O(n) build. Odd last nodes are paired with themselves, as in MerkleUtils.
+    Usage:
+        tree = MerkleTree(leaf_hashes)
+        tree.root()
+        tree.proof(5)
+        tree.proofs()            # every leaf; or tree.proofs([1, 7, 42])
+        tree.multiproof([1, 7, 42])
+    """
+
+    def __init__(self, leaves: List[bytes]):
+        if not leaves:
+            raise ValueError("No leaves provided")
+        leaf_size = len(leaves[0])
+        level = b"".join(leaves)
+        if len(level) != leaf_size * len(leaves):
+            raise ValueError("All leaves must be the same length")
+        self.buffer = bytearray(self._layout(len(leaves), leaf_size))
+        self.buffer[:len(level)] = level
+        view = memoryview(self.buffer)
+        for h in range(len(self.width) - 1):
+            src, dst = self.offset[h], self.offset[h + 1]
+            self.buffer[dst:dst + 32 * self.width[h + 1]] = hash_pairs(view[src:dst], self.size[h])
+        view.release()
+
+    def _layout(self, count: int, leaf_size: int, start: int = 0) -> int:
+        """Set width/size/offset for count leaves with levels packed from start; returns the end offset."""
+        self.width, self.size, self.offset = [count], [leaf_size], []
+        while self.width[-1] > 1:
+            self.width.append((self.width[-1] + 1) // 2)
+            self.size.append(32)
+        end = start
+        for width, size in zip(self.width, self.size):
+            self.offset.append(end)
+            end += width * size
+        return end
+
+    def __len__(self) -> int:
+        return self.width[0]
+
+    def node(self, level: int, index: int) -> bytes:
+        start = self.offset[level] + index * self.size[level]
+        return bytes(self.buffer[start:start + self.size[level]])
+
+    def root(self) -> bytes:
+        return self.node(len(self.width) - 1, 0)
+
+    def proof(self, index: int) -> List[bytes]:
+        """Sibling hashes from leaf index up to the root (same as MerkleUtils.build_merkle_proof)."""
+        return self.proofs([index])[0]
+
+    def proofs(self, indices: Optional[Iterable[int]] = None) -> List[List[bytes]]:
+        """Proofs for indices (default: every leaf), in the order given."""
+        buffer, n = self.buffer, self.width[0]
+        if indices is None:
+            return [list(path) for path in self._all_paths()]
+        levels = list(zip(self.offset, self.size, self.width))[:-1]
+        proofs = []
+        for index in indices:
+            if not (0 <= index < n):
+                raise IndexError("Index out of range for leaves")
+            proof = []
+            for offset, size, width in levels:
+                sibling = index ^ 1
+                if sibling >= width:
+                    sibling = index
+                start = offset + sibling * size
+                proof.append(bytes(buffer[start:start + size]))
+                index >>= 1
+            proofs.append(proof)
+        return proofs
+
+    def _all_paths(self) -> List[tuple]:
+        # Top-down: a node's path is its sibling followed by its parent's path, so
+        # siblings 2i and 2i+1 share everything above them and each level is one pass
+        paths = [()]
+        for h in range(len(self.width) - 2, -1, -1):
+            offset, size, width = self.offset[h], self.size[h], self.width[h]
+            nodes = [bytes(self.buffer[offset + i * size:offset + (i + 1) * size]) for i in range(width)]
+            if width % 2:
+                nodes.append(nodes[-1])  # the odd last node is its own sibling
+            paths = [(nodes[i ^ 1],) + paths[i >> 1] for i in range(width)]
+        return paths
+
+    def multiproof(self, indices: Iterable[int]) -> List[bytes]:
+        """
+        Siblings needed to prove every leaf in indices together, level by level in
+        ascending position, leaving out any node the verifier can compute itself.
+        """
+        known = sorted(set(indices))
+        if not known:
+            raise ValueError("No indices provided")
+        if known[0] < 0 or known[-1] >= self.width[0]:
+            raise IndexError("Index out of range for leaves")
+        proof = []
+        for h in range(len(self.width) - 1):
+            offset, size, width = self.offset[h], self.size[h], self.width[h]
+            members = set(known)
+            for pos in known:
+                sibling = pos ^ 1
+                if sibling < width and sibling not in members:
+                    start = offset + sibling * size
+                    proof.append(bytes(self.buffer[start:start + size]))
+            known = sorted({pos >> 1 for pos in known})
+        return proof
+
+
+class MerkleBatchVerifier:
+    """
+    Verifies many single-leaf proofs against one root. Every node a valid proof
+    establishes (its path and their siblings) is remembered by (level, position),
+    so a later proof stops hashing as soon as it reaches a node already proven:
+    k proofs from one batch cost about as many hashes as the distinct nodes
+    they cover, not k * log n.
+    Usage:
+        verifier = MerkleBatchVerifier(root)
+        ok = [verifier.verify(leaf, proof, index) for leaf, proof, index in items]
+    """
+
+    def __init__(self, root: bytes):
+        self.root = root
+        self.proven = {}  # (level, position) -> node hash known to lie on a path to root
+
+    def verify(self, leaf: bytes, proof: List[bytes], index: int) -> bool:
+        computed, pos = leaf, index
+        seen = []
+        for level, sibling in enumerate(proof):
+            known = self.proven.get((level, pos))
+            if known is not None:
+                valid = known == computed
+                break
+            seen.append(((level, pos), computed))
+            seen.append(((level, pos ^ 1), sibling))
+            computed = sha256d(computed + sibling) if pos % 2 == 0 else sha256d(sibling + computed)
+            pos >>= 1
+        else:
+            valid = computed == self.root
+        if valid:
+            self.proven.update(seen)
+        return valid
+
+
+class MerkleAccumulator:
+    """
+    Append-only Merkle tree that keeps only its frontier: the root of each
+    complete subtree still waiting for a right sibling, one per set bit of the
+    leaf count. append() costs amortized O(1) hashes (O(log n) worst case) and
+    root() O(log n), with the same roots as MerkleUtils.build_merkle_root.
+    The frontier can be saved to disk (atomically) and reopened.
+    Usage:
+        acc = MerkleAccumulator("frontier.bin")   # loads the saved frontier if present
+        acc.append(leaf_hash)
+        root = acc.root()
+        acc.save()
+    """
+    MAGIC = b"OSMA"
+    VERSION = 1
+    _HEADER = struct.Struct("<4sBQ")  # magic, version, leaf count
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.count = 0
+        self.frontier = []  # frontier[h]: root of the pending complete subtree of 2**h leaves, or None
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def append(self, leaf: bytes) -> int:
+        """Add a leaf; returns its index."""
+        node, n, h = leaf, self.count, 0
+        while n & 1:  # merge with each complete subtree of the same size, like a binary carry
+            node = sha256d(self.frontier[h] + node)
+            self.frontier[h] = None
+            n >>= 1
+            h += 1
+        if h == len(self.frontier):
+            self.frontier.append(node)
+        else:
+            self.frontier[h] = node
+        self.count += 1
+        return self.count - 1
+
+    def extend(self, leaves: Iterable[bytes]) -> "MerkleAccumulator":
+        for leaf in leaves:
+            self.append(leaf)
+        return self
+
+    def root(self) -> bytes:
+        """Root over every leaf appended so far (odd nodes duplicated, as in build_merkle_root)."""
+        if not self.count:
+            raise ValueError("No leaves provided")
+        carry = None  # rightmost node of the current level, built from the partial subtrees below it
+        for h, node in enumerate(self.frontier):
+            if node is not None:
+                if carry is not None:
+                    carry = sha256d(node + carry)
+                elif self.count >> h == 1:
+                    return node  # a single complete subtree: it is the tree
+                else:
+                    carry = sha256d(node + node)
+            elif carry is not None:
+                carry = sha256d(carry + carry)  # odd level: the trailing node pairs with itself
+        return carry
+
+    def save(self, path: str = None):
+        """Write count + frontier to path (default self.path) via write-then-rename."""
+        path = path or self.path
+        if not path:
+            raise ValueError("No path to save the accumulator to")
+        nodes = [node for node in self.frontier if node is not None]
+        if any(len(node) != 32 for node in nodes):
+            raise ValueError("Only 32-byte leaves (hashes) can be persisted")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._HEADER.pack(self.MAGIC, self.VERSION, self.count) + b"".join(nodes))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _load(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, count = self._HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a Merkle accumulator frontier")
+        pos = self._HEADER.size
+        frontier = []
+        for h in range(count.bit_length()):
+            if count >> h & 1:
+                frontier.append(data[pos:pos + 32])
+                pos += 32
+            else:
+                frontier.append(None)
+        if pos != len(data):
+            raise ValueError(f"Frontier file {path} is truncated or corrupt")
+        self.count, self.frontier = count, frontier
+
 # Example usage:
 # root = MerkleUtils.build_merkle_root([b'a', b'b', b'c'])
 # proof = MerkleUtils.build_merkle_proof([b'a', b'b', b'c'], 1)
 # MerkleUtils.verify_merkle_proof(b'b', proof, root, 1)
+# proofs = MerkleTree([sha256d(x) for x in (b'a', b'b', b'c')]).proofs()
+# multi = MerkleUtils.build_merkle_multiproof([b'a', b'b', b'c'], [0, 2])
+# MerkleUtils.verify_merkle_multiproof({0: b'a', 2: b'c'}, multi, root, 3)
+# acc = MerkleAccumulator("frontier.bin"); acc.append(sha256d(b'd')); acc.root(); acc.save()
@@ -0,0 +1,134 @@
+"""
+metrics_codec.py - Columnar encoding of audit metrics for OpenSoul agents
+
+Turns the metrics array (a list of dicts repeating the same keys in every row)
+into one column per key, so keys are stored once, repeated strings such as
+action/status are interned into a small table, and ISO timestamps become
+delta-encoded integer microseconds. The result is plain lists/ints/strings,
+meant to be packed with a binary format (msgpack) by payload_pipeline.py.
+
+Layout: {"n": rows, "c": [[key, kind, data(, missing_rows)], ...]}
+    kind "r" - raw values
+    kind "s" - interned strings, data = [symbols, indices]
+    kind "t" - timestamps, data = [suffix, first_us, delta_us, ...]
+"""
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class MetricsCodec:
+    """
+    Usage:
+        columns = MetricsCodec.encode(metrics)
+        metrics = MetricsCodec.decode(columns)
+    Decoding returns rows equal to the input; key order within a row follows first appearance.
+    """
+
+    @staticmethod
+    def encode(metrics: List[dict]) -> dict:
+        keys = []
+        for row in metrics:
+            for key in row:
+                if key not in keys:
+                    keys.append(key)
+        columns = []
+        for key in keys:
+            missing = [i for i, row in enumerate(metrics) if key not in row]
+            values = [row[key] for row in metrics if key in row]
+            column = [key] + MetricsCodec._encode_column(values)
+            if missing:
+                column.append(missing)
+            columns.append(column)
+        return {"n": len(metrics), "c": columns}
+
+    @staticmethod
+    def decode(columns: dict) -> List[dict]:
+        rows = [{} for _ in range(columns["n"])]
+        for column in columns["c"]:
+            key, kind, data = column[0], column[1], column[2]
+            values = MetricsCodec._decode_column(kind, data)
+            if len(column) > 3:
+                missing = set(column[3])
+                present = [row for i, row in enumerate(rows) if i not in missing]
+            else:
+                present = rows
+            for row, value in zip(present, values):
+                row[key] = value
+        return rows
+
+    @staticmethod
+    def _encode_column(values: list) -> list:
+        if values and all(isinstance(v, str) for v in values):
+            stamps = MetricsCodec._encode_timestamps(values)
+            if stamps is not None:
+                return ["t", stamps]
+            symbols = list(dict.fromkeys(values))
+            if len(symbols) < len(values):
+                index = {s: i for i, s in enumerate(symbols)}
+                return ["s", [symbols, [index[v] for v in values]]]
+        return ["r", values]
+
+    @staticmethod
+    def _decode_column(kind: str, data: list) -> list:
+        if kind == "r":
+            return data
+        if kind == "s":
+            symbols, indices = data
+            return [symbols[i] for i in indices]
+        if kind == "t":
+            suffix, values, last = data[0], [], 0
+            for delta in data[1:]:
+                last += delta
+                values.append(MetricsCodec.format_timestamp(last, suffix))
+            return values
+        raise ValueError(f"Unknown metrics column kind: {kind}")
+
+    @staticmethod
+    def _encode_timestamps(values: List[str]) -> Optional[list]:
+        """Delta-encode ISO timestamps, or None if any would not round-trip exactly."""
+        suffix = "Z" if values[0].endswith("Z") else ""
+        data, last = [suffix], 0
+        for value in values:
+            micros = MetricsCodec.parse_timestamp(value, suffix)
+            if micros is None or MetricsCodec.format_timestamp(micros, suffix) != value:
+                return None
+            data.append(micros - last)
+            last = micros
+        return data
+
+    @staticmethod
+    def parse_timestamp(value: str, suffix: str = "Z") -> Optional[int]:
+        """Microseconds since the epoch for a naive ISO timestamp (as written by AuditLogger.log)."""
+        if suffix and not value.endswith(suffix):
+            return None
+        try:
+            dt = datetime.fromisoformat(value[:len(value) - len(suffix)])
+        except ValueError:
+            return None
+        if dt.tzinfo is not None:
+            return None
+        return (dt - EPOCH) // _MICROSECOND
+
+    @staticmethod
+    def format_timestamp(micros: int, suffix: str = "Z") -> str:
+        """Inverse of parse_timestamp; same text as datetime.isoformat() (no fraction when it is zero)."""
+        minutes, micros = divmod(micros, 60_000_000)
+        seconds, micros = divmod(micros, 1_000_000)
+        if micros:
+            return f"{_minute_prefix(minutes)}{seconds:02d}.{micros:06d}{suffix}"
+        return f"{_minute_prefix(minutes)}{seconds:02d}{suffix}"
+
+
+@lru_cache(maxsize=256)
+def _minute_prefix(minutes: int) -> str:
+    # Rows in a batch share a handful of minutes, so the datetime math runs once per minute
+    return (EPOCH + timedelta(minutes=minutes)).isoformat()[:17]
+
+# Example usage:
+# columns = MetricsCodec.encode([{"action": "tool_call", "tokens_in": 10, "ts": "2025-01-01T00:00:00.000001Z"}])
+# MetricsCodec.decode(columns)
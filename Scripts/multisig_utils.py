@@ -6,29 +6,29 @@ Provides functions for m-of-n address creation and multi-sig transaction signing
 
 
 from bsv import PrivateKey, Script, Opcode, Transaction, TransactionInput, TransactionOutput, P2PKH
-import requests
 from typing import List, Optional
+from chain_client import ChainClient
+from fee_utils import FeeEngine
 
 class MultisigWallet:
     @staticmethod
-    def get_utxos(address: str, api_base: str = "https://api.whatsonchain.com/v1/bsv/main") -> list:
+    def get_utxos(address: str, api_base: str = "https://api.whatsonchain.com/v1/bsv/main", backend=None) -> list:
         """Query UTXOs for a given address (P2SH, P2PKH, or script)."""
-        resp = requests.get(f"{api_base}/address/{address}/unspent")
-        if resp.status_code != 200:
-            raise RuntimeError(f"UTXO query failed: {resp.text}")
-        return resp.json()
+        return (backend or ChainClient.shared(api_base)).get_unspent_sync(address)
 
     @staticmethod
-    def fund_script_address(from_priv_wif: str, script_address: str, amount: int, api_base: str = "https://api.whatsonchain.com/v1/bsv/main") -> str:
+    def fund_script_address(from_priv_wif: str, script_address: str, amount: int, api_base: str = "https://api.whatsonchain.com/v1/bsv/main",
+                            batcher=None, backend=None) -> str:
         """Send BSV to a script/multisig address to fund it."""
         priv = PrivateKey(from_priv_wif)
         from_address = priv.address(compressed=True)
-        utxos = MultisigWallet.get_utxos(from_address, api_base)
+        chain = backend or ChainClient.shared(api_base)
+        utxos = MultisigWallet.get_utxos(from_address, api_base, chain)
         utxo = max(utxos, key=lambda u: u.get("height", 0) or u["value"]) if utxos else None
-        if not utxo or utxo["value"] < amount + 300:
+        fee_sat = FeeEngine.shared().payment_fee(1, 2)
+        if not utxo or utxo["value"] < amount + fee_sat:
             raise ValueError("Insufficient funds")
-        source_tx_hex = requests.get(f"{api_base}/tx/{utxo['txid']}/hex").text.strip()
-        source_tx = Transaction.from_hex(source_tx_hex)
+        source_tx = Transaction.from_hex(chain.get_tx_hex_sync(utxo["txid"]))
         tx_input = TransactionInput(
             source_transaction=source_tx,
             source_txid=utxo["txid"],
@@ -36,17 +36,16 @@ class MultisigWallet:
             unlocking_script_template=P2PKH().unlock(priv),
         )
         out = TransactionOutput(locking_script=P2PKH().lock(script_address), satoshis=amount)
-        change = utxo["value"] - amount - 300
+        change = utxo["value"] - amount - fee_sat
         outputs = [out]
         if change > 546:
             outputs.append(TransactionOutput(locking_script=P2PKH().lock(from_address), satoshis=change))
         tx = Transaction(inputs=[tx_input], outputs=outputs, version=1)
         tx.sign()
         tx_hex = tx.hex()
-        resp = requests.post(f"{api_base}/tx/raw", json={"txhex": tx_hex})
-        if resp.status_code != 200:
-            raise RuntimeError(f"Broadcast failed: {resp.text}")
-        return resp.json().get("txid") or tx.txid()
+        if batcher is not None:
+            return batcher.submit_threadsafe(tx_hex)
+        return chain.broadcast_sync(tx_hex) or tx.txid()
 
     @staticmethod
     def create_multisig_address(pubkeys: List[str], m: int) -> str:
@@ -0,0 +1,194 @@
+"""
+payload_pipeline.py - Staged payload encoding for OpenSoul audit logs
+
+Encodes a log payload as serialize -> compress -> encrypt, in that order
+(ciphertext does not compress, so compressing first is what shrinks encrypted
+payloads), behind a small self-describing header so readers can reverse it.
+
+Header: MAGIC "OSP" (3) | version (1) | serializer (1) | codec (1) | flags (1) [| dict_id (4)]
+Serializers: "json" (compact JSON) or "columnar" (metrics as columns, see
+metrics_codec.py, packed with msgpack).
+Payloads without the header (plain JSON, gzip, ASCII-armored PGP) are still decoded.
+"""
+
+import gzip
+import hashlib
+import json
+import lzma
+import struct
+import zlib
+
+from metrics_codec import MetricsCodec
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for codec="zstd"
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for serializer="columnar"
+    msgpack = None
+
+MAGIC = b"OSP"
+VERSION = 1
+_HEADER = struct.Struct(">3sBBBB")
+
+SERIALIZERS = {"json": 0, "columnar": 1}
+CODECS = {"none": 0, "zlib": 1, "lzma": 2, "zstd": 3}
+FLAG_ENCRYPTED = 0x01
+FLAG_DICTIONARY = 0x02
+
+# Preset dictionary primed with the keys and values every metrics payload repeats.
+# Works with zlib and zstd; pass a trained one via PayloadPipeline.train_dictionary for better ratios.
+DEFAULT_DICTIONARY = (
+    b'"status":"completed"},{"action":"session_end","status":"started","status":"failed"'
+    b'"details":{"query":"","results_count":"session_id":"duration_seconds":"task":'
+    b'"status":"success","ts":"2025-01-01T00:00:00.000000Z"},{"action":"web_search",'
+    b'"tokens_in":0,"tokens_out":0,"action":"tool_call","details":{},'
+    b'{"agent_id":"","session_start":"","timestamp":"","seq":0,"metrics":[{'
+)
+
+
+def dictionary_id(dictionary: bytes) -> bytes:
+    return hashlib.sha256(dictionary).digest()[:4]
+
+
+class PayloadPipeline:
+    """
+    Usage:
+        pipeline = PayloadPipeline(codec="zlib", pgp=pgp_manager)
+        data = pipeline.encode(payload)      # bytes for OP_RETURN
+        payload = pipeline.decode(data)
+    """
+
+    def __init__(self, codec: str = "zlib", level: int = None, dictionary: bytes = None,
+                 pgp=None, serializer: str = "json"):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown serializer: {serializer}")
+        if codec == "zstd" and zstandard is None:
+            raise RuntimeError("codec 'zstd' requires the 'zstandard' package")
+        if serializer == "columnar" and msgpack is None:
+            raise RuntimeError("serializer 'columnar' requires the 'msgpack' package")
+        self.codec = codec
+        self.level = level
+        self.serializer = serializer
+        self.pgp = pgp
+        self.dictionary = DEFAULT_DICTIONARY if dictionary is None else dictionary
+        # Dictionaries known to the decoder, by id; the default is always readable
+        self.dictionaries = {dictionary_id(DEFAULT_DICTIONARY): DEFAULT_DICTIONARY}
+        if self.dictionary:
+            self.dictionaries[dictionary_id(self.dictionary)] = self.dictionary
+
+    # -- stages ---------------------------------------------------------------
+
+    def serialize(self, payload: dict) -> bytes:
+        if self.serializer == "columnar":
+            metrics = payload.get("metrics")
+            if isinstance(metrics, list) and all(isinstance(row, dict) for row in metrics):
+                payload = {**payload, "metrics": MetricsCodec.encode(metrics)}
+            return msgpack.packb(payload, use_bin_type=True)
+        return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+    def deserialize(self, data: bytes, serializer: int) -> dict:
+        if serializer == SERIALIZERS["json"]:
+            return json.loads(data.decode("utf-8"))
+        if serializer == SERIALIZERS["columnar"]:
+            if msgpack is None:
+                raise RuntimeError("columnar payload requires the 'msgpack' package")
+            payload = msgpack.unpackb(data, raw=False, strict_map_key=False)
+            if isinstance(payload.get("metrics"), dict):  # columnar; plain lists pass through
+                payload["metrics"] = MetricsCodec.decode(payload["metrics"])
+            return payload
+        raise ValueError(f"Unknown serializer id: {serializer}")
+
+    @staticmethod
+    def compress(data: bytes, codec: str, level: int = None, dictionary: bytes = b"") -> bytes:
+        if codec == "zlib":
+            if dictionary:
+                c = zlib.compressobj(9 if level is None else level, zdict=dictionary[-32768:])
+                return c.compress(data) + c.flush()
+            return zlib.compress(data, 9 if level is None else level)
+        if codec == "lzma":
+            return lzma.compress(data, preset=6 if level is None else level)
+        if codec == "zstd":
+            zdict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            return zstandard.ZstdCompressor(level=19 if level is None else level, dict_data=zdict).compress(data)
+        return data
+
+    @staticmethod
+    def decompress(data: bytes, codec: int, dictionary: bytes = b"") -> bytes:
+        if codec == CODECS["zlib"]:
+            d = zlib.decompressobj(zdict=dictionary[-32768:]) if dictionary else zlib.decompressobj()
+            return d.decompress(data) + d.flush()
+        if codec == CODECS["lzma"]:
+            return lzma.decompress(data)
+        if codec == CODECS["zstd"]:
+            if zstandard is None:
+                raise RuntimeError("zstd payload requires the 'zstandard' package")
+            zdict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            return zstandard.ZstdDecompressor(dict_data=zdict).decompress(data)
+        if codec == CODECS["none"]:
+            return data
+        raise ValueError(f"Unknown codec id: {codec}")
+
+    # -- pipeline -------------------------------------------------------------
+
+    def encode(self, payload: dict) -> bytes:
+        flags, dict_id, dictionary = 0, b"", b""
+        if self.dictionary and self.codec in ("zlib", "zstd"):
+            flags |= FLAG_DICTIONARY
+            dict_id, dictionary = dictionary_id(self.dictionary), self.dictionary
+        data = self.compress(self.serialize(payload), self.codec, self.level, dictionary)
+        if self.pgp:
+            data = self.pgp.encrypt_bytes(data)
+            flags |= FLAG_ENCRYPTED
+        return _HEADER.pack(MAGIC, VERSION, SERIALIZERS[self.serializer], CODECS[self.codec], flags) + dict_id + data
+
+    def decode(self, data: bytes) -> dict:
+        if data[:3] != MAGIC or len(data) < _HEADER.size:
+            return self._decode_legacy(data)
+        _, version, serializer, codec, flags = _HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"Unsupported payload version: {version}")
+        body = data[_HEADER.size:]
+        dictionary = b""
+        if flags & FLAG_DICTIONARY:
+            dict_id, body = body[:4], body[4:]
+            if dict_id not in self.dictionaries:
+                raise ValueError(f"Unknown compression dictionary {dict_id.hex()}")
+            dictionary = self.dictionaries[dict_id]
+        if flags & FLAG_ENCRYPTED:
+            if not self.pgp:
+                raise ValueError("Encrypted payload and no PGP key configured")
+            body = self.pgp.decrypt_bytes(body)
+        return self.deserialize(self.decompress(body, codec, dictionary), serializer)
+
+    def _decode_legacy(self, data: bytes) -> dict:
+        # Pre-pipeline payloads: JSON, optionally PGP-armored, gzip'ed afterwards if too large
+        if data[:2] == b"\x1f\x8b":
+            data = gzip.decompress(data)
+        if data.startswith(b"-----BEGIN PGP MESSAGE"):
+            if not self.pgp:
+                raise ValueError("Encrypted payload and no PGP key configured")
+            data = self.pgp.decrypt(data.decode("utf-8"))
+            data = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        return json.loads(data.decode("utf-8"))
+
+    @staticmethod
+    def train_dictionary(samples: list, size: int = 16384) -> bytes:
+        """
+        Build a compression dictionary from sample payloads (bytes). Uses zstd training when
+        available; otherwise concatenates the most recent samples (zlib uses the last 32KB).
+        """
+        if zstandard is not None and len(samples) >= 8:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        return b"".join(samples)[-size:]
+
+# Example usage:
+# pipeline = PayloadPipeline(codec="zlib", pgp=pgp)
+# data = pipeline.encode({"agent_id": "my-agent", "metrics": [...]})
+# pipeline.decode(data)
+# compact = PayloadPipeline(codec="zlib", serializer="columnar")  # needs msgpack
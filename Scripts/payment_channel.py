@@ -5,11 +5,12 @@ Implements basic open, update, and close channel logic using BSV transactions.
 """
 
 from bsv import PrivateKey, Transaction, TransactionInput, TransactionOutput, P2PKH, Script, Opcode
-import requests
 import time
+from chain_client import ChainClient
+from fee_utils import FeeEngine
 
 class PaymentChannel:
-    def __init__(self, sender_priv_wif, receiver_address, api_base, channel_amount):
+    def __init__(self, sender_priv_wif, receiver_address, api_base, channel_amount, batcher=None, backend=None):
         self.sender_priv = PrivateKey(sender_priv_wif)
         self.sender_address = self.sender_priv.address(compressed=True)
         self.receiver_address = receiver_address
@@ -17,16 +18,18 @@ class PaymentChannel:
         self.channel_amount = channel_amount
         self.channel_utxo = None
         self.channel_txid = None
+        self.batcher = batcher  # optional BroadcastBatcher for open/close txs
+        self.backend = backend or ChainClient.shared(api_base)  # or e.g. a SimulatedChain
 
     def open_channel(self):
         # Lock funds in a 2-of-2 multisig (sender+receiver)
         # For demo: use P2PKH to receiver, but in production use multisig or script
-        utxos = requests.get(f"{self.api_base}/address/{self.sender_address}/unspent").json()
+        utxos = self.backend.get_unspent_sync(self.sender_address)
         utxo = max(utxos, key=lambda u: u.get("height", 0) or u["value"]) if utxos else None
-        if not utxo or utxo["value"] < self.channel_amount + 300:
+        fee_sat = FeeEngine.shared().payment_fee(1, 2)
+        if not utxo or utxo["value"] < self.channel_amount + fee_sat:
             raise ValueError("Insufficient funds for channel")
-        source_tx_hex = requests.get(f"{self.api_base}/tx/{utxo['txid']}/hex").text.strip()
-        source_tx = Transaction.from_hex(source_tx_hex)
+        source_tx = Transaction.from_hex(self.backend.get_tx_hex_sync(utxo["txid"]))
         tx_input = TransactionInput(
             source_transaction=source_tx,
             source_txid=utxo["txid"],
@@ -34,17 +37,14 @@ class PaymentChannel:
             unlocking_script_template=P2PKH().unlock(self.sender_priv),
         )
         out = TransactionOutput(locking_script=P2PKH().lock(self.receiver_address), satoshis=self.channel_amount)
-        change = utxo["value"] - self.channel_amount - 300
+        change = utxo["value"] - self.channel_amount - fee_sat
         outputs = [out]
         if change > 546:
             outputs.append(TransactionOutput(locking_script=P2PKH().lock(self.sender_address), satoshis=change))
         tx = Transaction(inputs=[tx_input], outputs=outputs, version=1)
         tx.sign()
         tx_hex = tx.hex()
-        resp = requests.post(f"{self.api_base}/tx/raw", json={"txhex": tx_hex})
-        if resp.status_code != 200:
-            raise RuntimeError(f"Broadcast failed: {resp.text}")
-        self.channel_txid = resp.json().get("txid") or tx.txid()
+        self.channel_txid = self._broadcast(tx_hex) or tx.txid()
         self.channel_utxo = {"txid": self.channel_txid, "vout": 0, "value": self.channel_amount}
         return self.channel_txid
 
@@ -58,7 +58,7 @@ class PaymentChannel:
             unlocking_script_template=P2PKH().unlock(self.sender_priv),
         )
         out = TransactionOutput(locking_script=P2PKH().lock(self.receiver_address), satoshis=amount)
-        change = self.channel_utxo["value"] - amount
+        change = self.channel_utxo["value"] - amount - FeeEngine.shared().payment_fee(1, 2)
         outputs = [out]
         if change > 546:
             outputs.append(TransactionOutput(locking_script=P2PKH().lock(self.sender_address), satoshis=change))
@@ -68,10 +68,12 @@ class PaymentChannel:
 
     def close_channel(self, payment_tx_hex):
         # Broadcast the final payment transaction to settle the channel
-        resp = requests.post(f"{self.api_base}/tx/raw", json={"txhex": payment_tx_hex})
-        if resp.status_code != 200:
-            raise RuntimeError(f"Broadcast failed: {resp.text}")
-        return resp.json().get("txid")
+        return self._broadcast(payment_tx_hex)
+
+    def _broadcast(self, tx_hex):
+        if self.batcher is not None:
+            return self.batcher.submit_threadsafe(tx_hex)
+        return self.backend.broadcast_sync(tx_hex)
 
 # Example usage:
 # channel = PaymentChannel(sender_priv_wif, receiver_address, api_base, 10000)
@@ -3,26 +3,89 @@ pgp_utils.py - PGP encryption/decryption utilities for OpenSoul agents
 
 This module provides functions to encrypt data with a PGP public key and decrypt with a private key.
 Uses the 'pgpy' library for OpenPGP operations.
+
+A message for several recipients is encrypted once, under one random session
+key, and that key is wrapped for each recipient (one small public-key packet
+each). Any one recipient's private key opens it. Parsed public keys are kept
+in a process-wide keyring keyed by fingerprint, so armored key strings are
+only parsed the first time they are seen.
 """
 
 import pgpy
+from pgpy.constants import CompressionAlgorithm, SymmetricKeyAlgorithm
 from typing import Union
 
 
 class PGPManager:
+    """
+    Usage:
+        pgp = PGPManager(public_key_str=my_pub, private_key_str=my_priv, multi_public_keys=[pub1, pub2])
+        encrypted = pgp.encrypt("secret")     # one ciphertext, readable by every listed key
+        pgp.decrypt(encrypted)
+    """
+    _keyring = {}  # fingerprint -> parsed public key, shared by every manager in the process
+    _armored = {}  # armored key string -> fingerprint
+
     def __init__(self, public_key_str: str = None, private_key_str: str = None, passphrase: str = None, multi_public_keys: list = None):
         self.public_key = None
         self.private_key = None
         self.passphrase = passphrase
         self.multi_public_keys = []
         if public_key_str:
-            self.public_key, _ = pgpy.PGPKey.from_blob(public_key_str)
+            self.public_key = self.load_key(public_key_str)
         if private_key_str:
             self.private_key, _ = pgpy.PGPKey.from_blob(private_key_str)
         if multi_public_keys:
-            for key_str in multi_public_keys:
-                key, _ = pgpy.PGPKey.from_blob(key_str)
-                self.multi_public_keys.append(key)
+            self.multi_public_keys = self._unique([self.load_key(k) for k in multi_public_keys])
+
+    @classmethod
+    def load_key(cls, key) -> pgpy.PGPKey:
+        """Parsed public key for an armored string (or a PGPKey), from the keyring after the first call."""
+        if not isinstance(key, str):
+            return cls._keyring.setdefault(key.fingerprint, key)
+        fingerprint = cls._armored.get(key)
+        if fingerprint is None:
+            parsed, _ = pgpy.PGPKey.from_blob(key)
+            fingerprint = cls._armored[key] = parsed.fingerprint
+            cls._keyring.setdefault(fingerprint, parsed)
+        return cls._keyring[fingerprint]
+
+    @staticmethod
+    def _unique(keys: list) -> list:
+        """Drop repeated recipients (same fingerprint), keeping their order."""
+        return list({key.fingerprint: key for key in keys}.values())
+
+    def _recipient_keys(self, recipients: list = None) -> list:
+        if recipients:
+            return self._unique([self.load_key(k) for k in recipients])
+        if self.multi_public_keys:
+            return self.multi_public_keys
+        if self.public_key:
+            return [self.public_key]
+        raise ValueError("No public key(s) loaded for encryption")
+
+    @staticmethod
+    def _cipher(keys: list) -> SymmetricKeyAlgorithm:
+        """First cipher in the first recipient's preferences that every recipient accepts (else AES-256)."""
+        prefs = []
+        for key in keys:
+            uid = next(iter(key.userids), None)
+            prefs.append(list(uid.selfsig.cipherprefs) if uid is not None else [])
+        for cipher in prefs[0]:
+            if cipher.is_supported and all(cipher in p for p in prefs[1:]):
+                return cipher
+        return SymmetricKeyAlgorithm.AES256
+
+    def _encrypt_message(self, msg, recipients: list = None):
+        keys = self._recipient_keys(recipients)
+        cipher = self._cipher(keys)
+        session_key = cipher.gen_key()
+        # The first key encrypts the data; the others only add their wrapped copy of the session key
+        encrypted = msg
+        for key in keys:
+            encrypted = key.encrypt(encrypted, cipher=cipher, sessionkey=session_key)
+        del session_key
+        return encrypted
 
     def encrypt(self, data: Union[str, bytes], recipients: list = None) -> str:
         """
@@ -30,24 +93,15 @@ class PGPManager:
         If not provided, uses self.public_key or self.multi_public_keys.
         """
         msg = pgpy.PGPMessage.new(data if isinstance(data, str) else data.decode('utf-8'))
-        keys = []
-        if recipients:
-            for k in recipients:
-                if isinstance(k, str):
-                    key, _ = pgpy.PGPKey.from_blob(k)
-                    keys.append(key)
-                else:
-                    keys.append(k)
-        elif self.multi_public_keys:
-            keys = self.multi_public_keys
-        elif self.public_key:
-            keys = [self.public_key]
-        else:
-            raise ValueError("No public key(s) loaded for encryption")
-        encrypted = msg
-        for key in keys:
-            encrypted = key.encrypt(encrypted)
-        return str(encrypted)
+        return str(self._encrypt_message(msg, recipients))
+
+    def encrypt_bytes(self, data: bytes, recipients: list = None) -> bytes:
+        """
+        Encrypt binary data (e.g. an already-compressed payload). Returns unarmored OpenPGP packets,
+        about 25% smaller than the ASCII-armored output of encrypt().
+        """
+        msg = pgpy.PGPMessage.new(bytes(data), compression=CompressionAlgorithm.Uncompressed)
+        return bytes(self._encrypt_message(msg, recipients))
 
     def decrypt(self, encrypted_data: str) -> str:
         if not self.private_key:
@@ -60,6 +114,11 @@ class PGPManager:
             msg = pgpy.PGPMessage.from_blob(encrypted_data)
             return self.private_key.decrypt(msg).message
 
+    def decrypt_bytes(self, encrypted_data: bytes) -> bytes:
+        """Decrypt the output of encrypt_bytes()."""
+        message = self.decrypt(encrypted_data)
+        return message.encode('utf-8') if isinstance(message, str) else bytes(message)
+
 # Example usage:
 # pgp = PGPManager(public_key_str=..., private_key_str=..., passphrase=...)
 # encrypted = pgp.encrypt('my secret data')
@@ -0,0 +1,85 @@
+"""
+shard_utils.py - Payload sharding for OpenSoul audit logs
+
+Splits a payload that exceeds max_payload_kb into shards, each prefixed with a
+small binary header, so one session can be spread over several OP_RETURN
+outputs (and several chained transactions). Readers reassemble shards by id.
+
+Shard layout: MAGIC (4) | version (1) | shard_id (8) | index (2, BE) | count (2, BE) | body
+"""
+
+import hashlib
+import struct
+from typing import List, Optional
+
+MAGIC = b"OSSH"
+VERSION = 1
+_HEADER = struct.Struct(">4sB8sHH")
+
+
+class ShardUtils:
+    HEADER_SIZE = _HEADER.size
+
+    @staticmethod
+    def split(data: bytes, shard_size: int) -> List[bytes]:
+        """Split data into shards whose total size (header included) is at most shard_size."""
+        body_size = shard_size - _HEADER.size
+        if body_size <= 0:
+            raise ValueError("Shard size too small for shard header")
+        count = max(1, -(-len(data) // body_size))
+        if count > 0xFFFF:
+            raise ValueError("Payload needs too many shards; increase shard size")
+        shard_id = hashlib.sha256(data).digest()[:8]
+        return [
+            _HEADER.pack(MAGIC, VERSION, shard_id, i, count) + data[i * body_size:(i + 1) * body_size]
+            for i in range(count)
+        ]
+
+    @staticmethod
+    def parse(chunk: bytes) -> Optional[tuple]:
+        """Return (shard_id_hex, index, count, body) if chunk is a shard, else None."""
+        if len(chunk) < _HEADER.size or chunk[:4] != MAGIC:
+            return None
+        magic, version, shard_id, index, count = _HEADER.unpack_from(chunk)
+        if version != VERSION or index >= count:
+            return None
+        return shard_id.hex(), index, count, chunk[_HEADER.size:]
+
+
+class ShardAssembler:
+    """
+    Collects shards in any order and returns the full payload once every shard is present.
+    A set that fails its integrity check (corrupt, or forged by whoever paid the tx) is
+    dropped with a warning and its id recorded in dropped; a good copy can still assemble.
+    Usage:
+        assembler = ShardAssembler()
+        for chunk in chunks:
+            data = assembler.add(chunk)
+            if data is not None: ...
+    """
+
+    def __init__(self):
+        self.pending = {}  # shard_id -> {index: body}
+        self.dropped = []  # ids of shard sets that failed their integrity check
+
+    def add(self, chunk: bytes) -> Optional[bytes]:
+        parsed = ShardUtils.parse(chunk)
+        if parsed is None:
+            return None
+        shard_id, index, count, body = parsed
+        parts = self.pending.setdefault(shard_id, {})
+        parts[index] = body
+        if len(parts) < count or any(i not in parts for i in range(count)):
+            return None  # incomplete (a shard with a corrupted count can make len() overshoot)
+        del self.pending[shard_id]
+        data = b"".join(parts[i] for i in range(count))
+        if hashlib.sha256(data).digest()[:8].hex() != shard_id:
+            print(f"Dropping shard set {shard_id}: failed integrity check")
+            self.dropped.append(shard_id)
+            return None
+        return data
+
+# Example usage:
+# shards = ShardUtils.split(big_payload, 4096)
+# assembler = ShardAssembler()
+# payload = [assembler.add(s) for s in shards][-1]
@@ -0,0 +1,238 @@
+"""
+sparse_merkle.py - Sparse Merkle trees for OpenSoul agents
+
+MerkleUtils trees are positional: they prove that an action is at index i,
+but not that a key (an insight uuid, a session) was never logged, short of
+revealing every leaf. SparseMerkleTree places each key at the path
+sha256(key) in a 256-bit keyspace, so a proof walks one path and shows either
+the key's leaf (inclusion) or what occupies its place instead: an empty
+subtree or another key's leaf (non-inclusion).
+
+The tree is kept compact. Every empty subtree has one cached default hash
+(EMPTY), and a subtree that holds a single key is just that key's leaf.
+Depth, hashing per update and proof size are therefore about log2(n), not
+256. Leaves are sha256(0x00 || path || sha256(value)) and branches are
+sha256(0x01 || left || right), so neither can pass for the other. The shape
+depends only on the key set, so two trees with the same keys and values
+have the same root.
+"""
+
+import hashlib
+import os
+import struct
+from typing import Dict, Optional, Union
+
+EMPTY = bytes(32)  # the default hash of an empty subtree, at every height
+Key = Union[str, bytes]
+
+
+def _bit(path: bytes, depth: int) -> int:
+    return path[depth >> 3] >> (7 - (depth & 7)) & 1
+
+
+def _split(entries: list, depth: int) -> int:
+    """Index of the first (path, ...) entry whose bit at depth is 1 (entries sorted by path)."""
+    lo, hi = 0, len(entries)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _bit(entries[mid][0], depth):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class SparseMerkleTree:
+    """
+    Usage:
+        smt = SparseMerkleTree("sessions.smt")          # loads if present
+        smt.update({"session-1": b"txid...", "session-2": b"txid..."})   # batched; None deletes
+        proof = smt.prove("session-3")
+        SparseMerkleTree.verify(proof, smt.root(), "session-3")          # True: never logged
+        smt.save()
+    """
+    MAGIC = b"OSMS"
+    VERSION = 1
+    _HEADER = struct.Struct("<4sB32sQQ")  # magic, version, root, leaf count, branch count
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.leaves = {}    # leaf hash -> (key path, value hash)
+        self.branches = {}  # branch hash -> (left, right)
+        self._root = EMPTY
+        if path and os.path.exists(path):
+            self._load(path)
+
+    @staticmethod
+    def key_path(key: Key) -> bytes:
+        return hashlib.sha256(key.encode("utf-8") if isinstance(key, str) else key).digest()
+
+    @staticmethod
+    def leaf_hash(path: bytes, value_hash: bytes) -> bytes:
+        return hashlib.sha256(b"\x00" + path + value_hash).digest()
+
+    @staticmethod
+    def branch_hash(left: bytes, right: bytes) -> bytes:
+        return hashlib.sha256(b"\x01" + left + right).digest()
+
+    def root(self) -> bytes:
+        return self._root
+
+    def __len__(self) -> int:
+        return len(self.leaves)
+
+    def __contains__(self, key: Key) -> bool:
+        return self.get(key) is not None
+
+    # -- updates --------------------------------------------------------------
+
+    def set(self, key: Key, value: bytes):
+        self.update({key: value})
+
+    def delete(self, key: Key):
+        self.update({key: None})
+
+    def update(self, items: Dict[Key, Optional[bytes]]) -> bytes:
+        """Set (or, with None, delete) many keys at once; each touched node is rehashed once. Returns the root."""
+        changes = {self.key_path(key): None if value is None else hashlib.sha256(value).digest()
+                   for key, value in items.items()}
+        if changes:
+            self._root = self._update(self._root, 0, sorted(changes.items()))
+        return self._root
+
+    def _update(self, node: bytes, depth: int, changes: list) -> bytes:
+        if not changes:
+            return node
+        if node == EMPTY:
+            return self._build(depth, [(p, v) for p, v in changes if v is not None])
+        leaf = self.leaves.pop(node, None)
+        if leaf is not None:
+            merged = dict([leaf])
+            merged.update(changes)
+            return self._build(depth, sorted((p, v) for p, v in merged.items() if v is not None))
+        left, right = self.branches.pop(node)
+        i = _split(changes, depth)
+        return self._join(self._update(left, depth + 1, changes[:i]), self._update(right, depth + 1, changes[i:]))
+
+    def _build(self, depth: int, entries: list) -> bytes:
+        if not entries:
+            return EMPTY
+        if len(entries) == 1:
+            node = self.leaf_hash(*entries[0])
+            self.leaves[node] = entries[0]
+            return node
+        i = _split(entries, depth)
+        return self._join(self._build(depth + 1, entries[:i]), self._build(depth + 1, entries[i:]))
+
+    def _join(self, left: bytes, right: bytes) -> bytes:
+        if right == EMPTY and (left == EMPTY or left in self.leaves):
+            return left  # a lone leaf (or nothing) moves up in place of the branch
+        if left == EMPTY and right in self.leaves:
+            return right
+        node = self.branch_hash(left, right)
+        self.branches[node] = (left, right)
+        return node
+
+    # -- lookups and proofs ---------------------------------------------------
+
+    def _walk(self, path: bytes) -> tuple:
+        node, depth, siblings = self._root, 0, []
+        while node in self.branches:
+            left, right = self.branches[node]
+            if _bit(path, depth):
+                siblings.append(left)
+                node = right
+            else:
+                siblings.append(right)
+                node = left
+            depth += 1
+        return siblings, node
+
+    def get(self, key: Key) -> Optional[bytes]:
+        """sha256 of the value stored under key, or None."""
+        path = self.key_path(key)
+        leaf = self.leaves.get(self._walk(path)[1])
+        return leaf[1] if leaf is not None and leaf[0] == path else None
+
+    def prove(self, key: Key) -> dict:
+        """
+        Proof for key, of inclusion or non-inclusion alike:
+        {"key": path hex, "siblings": [hex, root first], "leaf": None or [path hex, value hash hex]}.
+        """
+        path = self.key_path(key)
+        siblings, node = self._walk(path)
+        leaf = self.leaves.get(node)
+        return {"key": path.hex(), "siblings": [s.hex() for s in siblings],
+                "leaf": None if leaf is None else [leaf[0].hex(), leaf[1].hex()]}
+
+    @staticmethod
+    def verify(proof: dict, root: bytes, key: Key, value: bytes = None) -> bool:
+        """
+        With value, check that key maps to value under root; with value=None,
+        check that key is absent. Returns True if valid, False otherwise.
+        """
+        path = SparseMerkleTree.key_path(key)
+        siblings = [bytes.fromhex(s) for s in proof["siblings"]]
+        if len(siblings) > 256:
+            return False
+        if proof["leaf"] is None:
+            if value is not None:
+                return False
+            node = EMPTY
+        else:
+            leaf_path, value_hash = bytes.fromhex(proof["leaf"][0]), bytes.fromhex(proof["leaf"][1])
+            if len(leaf_path) != 32 or any(_bit(leaf_path, d) != _bit(path, d) for d in range(len(siblings))):
+                return False  # the leaf must sit on the key's own path
+            if value is None and leaf_path == path:
+                return False
+            if value is not None and (leaf_path != path or value_hash != hashlib.sha256(value).digest()):
+                return False
+            node = SparseMerkleTree.leaf_hash(leaf_path, value_hash)
+        for depth in range(len(siblings) - 1, -1, -1):
+            sibling = siblings[depth]
+            node = SparseMerkleTree.branch_hash(sibling, node) if _bit(path, depth) else \
+                SparseMerkleTree.branch_hash(node, sibling)
+        return node == root
+
+    # -- persistence ----------------------------------------------------------
+
+    def save(self, path: str = None):
+        """Write every node to path (default self.path) via write-then-rename."""
+        path = path or self.path
+        if not path:
+            raise ValueError("No path to save the tree to")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._HEADER.pack(self.MAGIC, self.VERSION, self._root, len(self.leaves), len(self.branches)))
+            f.write(b"".join(p + v for p, v in self.leaves.values()))
+            f.write(b"".join(l + r for l, r in self.branches.values()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _load(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < self._HEADER.size:
+            raise ValueError(f"{path} is not a sparse Merkle tree file")
+        magic, version, root, leaf_count, branch_count = self._HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a sparse Merkle tree file")
+        if len(data) != self._HEADER.size + 64 * (leaf_count + branch_count):
+            raise ValueError(f"Sparse Merkle tree file {path} is truncated or corrupt")
+        view = memoryview(data)[self._HEADER.size:]
+        for i in range(leaf_count):
+            entry = (bytes(view[64 * i:64 * i + 32]), bytes(view[64 * i + 32:64 * i + 64]))
+            self.leaves[self.leaf_hash(*entry)] = entry
+        view = view[64 * leaf_count:]
+        for i in range(branch_count):
+            children = (bytes(view[64 * i:64 * i + 32]), bytes(view[64 * i + 32:64 * i + 64]))
+            self.branches[self.branch_hash(*children)] = children
+        if root != EMPTY and root not in self.branches and root not in self.leaves:
+            raise ValueError(f"Sparse Merkle tree file {path} does not contain its root")
+        self._root = root
+
+# Example usage:
+# smt = SparseMerkleTree()
+# smt.update({insight["uuid"]: json.dumps(insight, sort_keys=True).encode() for insight in insights})
+# proof = smt.prove("some-uuid"); SparseMerkleTree.verify(proof, smt.root(), "some-uuid")  # absent?
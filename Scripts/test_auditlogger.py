@@ -1,5 +1,24 @@
+import asyncio
+import os
+import tempfile
 import unittest
 from AuditLogger import AuditLogger
+from chain_backend import SimulatedChain, address_to_script, parse_tx
+from shard_utils import ShardUtils
+
+WIF = 'KwDiBf89QgGbjEhKnhXJuH7LrciVrZi3qYjgd9M7rFU73sVHnoWn'  # private key 1; a valid base58check WIF
+
+def make_logger(config=None, chain=None, fund=50_000):
+    """A logger on a SimulatedChain with all of its files in a temp dir."""
+    tmp = tempfile.mkdtemp()
+    chain = chain or SimulatedChain()
+    paths = {"state_db": "state.db", "history_db": "history.db", "cache_file": "cache.json",
+             "leaf_dir": "leaves", "journal_dir": "journal", "header_store": "headers.bin"}
+    logger = AuditLogger(WIF, config={**{k: os.path.join(tmp, v) for k, v in paths.items()}, **(config or {})},
+                         client=chain)
+    if fund:
+        chain.fund(logger.address, fund)
+    return logger, chain
 
 class TestAuditLogger(unittest.TestCase):
     def test_log_and_batch(self):
@@ -9,5 +28,310 @@ class TestAuditLogger(unittest.TestCase):
 
     # More tests can be added for flush, file batching, etc. with mocks
 
+class TestAutoFlush(unittest.IsolatedAsyncioTestCase):
+    def counting(self, logger, fail=0):
+        """Record the batches _write_to_chain is given; the first `fail` calls raise."""
+        batches, write = [], logger._write_to_chain
+
+        async def wrapped(actions):
+            batches.append(list(actions))
+            if len(batches) <= fail:
+                raise RuntimeError("broadcast failed")
+            return await write(actions)
+        logger._write_to_chain = wrapped
+        return batches
+
+    async def test_threshold_coalesces_into_one_flush(self):
+        logger, _ = make_logger({"flush_threshold": 3})
+        batches = self.counting(logger)
+        logger.log({"i": 0})
+        logger.log({"i": 1})
+        await asyncio.sleep(0.05)
+        self.assertEqual(batches, [])
+        for i in range(2, 10):
+            logger.log({"i": i})  # crosses the threshold repeatedly before the flusher runs
+        await asyncio.sleep(0.1)
+        self.assertEqual([[a["i"] for a in batch] for batch in batches], [list(range(10))])
+        self.assertEqual(logger.actions, [])
+        await logger.close(flush=False)
+
+    async def test_max_bytes(self):
+        logger, _ = make_logger({"flush_max_bytes": 200})
+        batches = self.counting(logger)
+        logger.log({"note": "x" * 50})
+        await asyncio.sleep(0.05)
+        self.assertEqual(batches, [])
+        logger.log({"note": "x" * 200})
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(batches), 1)
+        await logger.close(flush=False)
+
+    async def test_max_age(self):
+        logger, _ = make_logger({"flush_max_age": 0.1})
+        batches = self.counting(logger)
+        logger.log({"i": 0})
+        await asyncio.sleep(0.03)
+        self.assertEqual(batches, [])
+        await asyncio.sleep(0.2)
+        self.assertEqual(len(batches), 1)
+        await logger.close(flush=False)
+
+    async def test_cancelled_flush_keeps_the_batch(self):
+        logger, _ = make_logger({"batch_mode": "memory"})
+
+        async def stalled(actions):
+            await asyncio.sleep(10)
+        logger._write_to_chain = stalled
+        logger.log({"i": 0})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(logger.flush(), 0.05)
+        self.assertEqual([a["i"] for a in logger.actions], [0])
+        await logger.close(flush=False)
+
+    async def test_failed_flush_is_retried_after_back_off(self):
+        for lanes in (1, 2):
+            logger, _ = make_logger({"flush_threshold": 1, "flush_retry_delay": 0.05, "lanes": lanes})
+            batches = self.counting(logger, fail=1)
+            logger.log({"i": 0})
+            await asyncio.sleep(0.02)
+            self.assertEqual((len(batches), len(logger.actions)), (1, 1))  # failed, batch pending again
+            await asyncio.sleep(0.2)
+            self.assertEqual(len(batches), 2, f"lanes={lanes}")  # retried without another log()
+            self.assertEqual(logger.actions, [])
+            await logger.close(flush=False)
+
+class TestLaneChaining(unittest.IsolatedAsyncioTestCase):
+    def counting(self, chain, method):
+        calls, call = [], getattr(chain, method)
+
+        async def wrapped(*args):
+            calls.append(args)
+            return await call(*args)
+        setattr(chain, method, wrapped)
+        return calls
+
+    async def flush(self, logger, i):
+        logger.log({"i": i})
+        return await logger.flush()
+
+    async def test_chains_off_the_cached_tx(self):
+        logger, chain = make_logger()
+        fetched = self.counting(chain, "get_tx_hex")
+        txids = [await self.flush(logger, i) for i in range(4)]
+        self.assertEqual(len(fetched), 1)  # only the funding tx; later flushes spend our own last tx
+        lane = logger.store.lanes(logger.address)[0]
+        self.assertEqual((lane["txid"], lane["unconfirmed"]), (txids[-1], txids))
+        self.assertEqual(chain.get_tx_sync(txids[1])["vin"][0]["txid"], txids[0])
+
+    async def test_failed_broadcast_resets_the_lane(self):
+        logger, chain = make_logger()
+        await self.flush(logger, 0)
+        broadcast = chain.broadcast
+
+        async def lost(tx_hex):
+            raise asyncio.TimeoutError()
+        chain.broadcast = lost
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.flush(logger, 1)
+        lane = logger.store.lanes(logger.address)[0]
+        self.assertEqual((lane["tx_hex"], lane["unconfirmed"]), (None, []))
+        self.assertEqual(len(logger.actions), 1)
+        chain.broadcast = broadcast
+        fetched = self.counting(chain, "get_tx_hex")
+        self.assertIsNotNone(await logger.flush())
+        self.assertEqual(len(fetched), 1)  # the lane's source was refetched, not taken from memory
+
+    async def test_failed_rebalance_keeps_the_flushed_batch(self):
+        logger, chain = make_logger({"lane_min_value": 10 ** 9})  # always low
+        rebalances = []
+
+        async def failing():
+            rebalances.append(1)
+            raise RuntimeError("Broadcast failed")
+        logger._rebalance_lanes = failing
+        txid = await self.flush(logger, 0)
+        self.assertEqual((len(rebalances), logger.actions), (1, []))
+        self.assertIn(txid, chain.txs)
+        self.assertIsNone(await logger.flush())  # nothing re-queued
+
+    async def test_lost_broadcast_reply(self):
+        logger, chain = make_logger()
+        await self.flush(logger, 0)
+        broadcast, get_tx = chain.broadcast, chain.get_tx
+
+        async def reply_lost(tx_hex):
+            await broadcast(tx_hex)  # the node accepted it
+            raise asyncio.TimeoutError()
+
+        async def unreachable(txid):
+            raise RuntimeError(f"GET /tx/{txid} failed")
+        chain.broadcast = reply_lost
+        txid = await self.flush(logger, 1)  # found on the node: logged once, not re-queued
+        self.assertEqual((chain.get_tx_sync(txid)["txid"], logger.actions), (txid, []))
+        chain.get_tx = unreachable
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.flush(logger, 2)
+        lost = logger.store.lanes(logger.address)[0]["txid"]
+        chain.broadcast, chain.get_tx = broadcast, get_tx
+        txid = await logger.flush()  # the lane is recovered onto the lost tx's change, no conflicting spend
+        spent = chain.get_tx_sync(txid)["vin"][0]["txid"]
+        self.assertNotEqual(spent, lost)
+        self.assertEqual(chain.get_tx_sync(spent)["vin"][0]["txid"], lost)
+
+    async def test_lanes_are_created_when_another_process_gives_up(self):
+        logger, chain = make_logger()
+        self.assertTrue(logger.store.try_lock(logger.address, "other-process"))
+        logger.log({"i": 0})
+        flushing = asyncio.ensure_future(logger.flush())
+        await asyncio.sleep(0.1)
+        self.assertFalse(flushing.done())  # waits while the other process holds the lock
+        logger.store.unlock(logger.address, "other-process")  # ... and leaves without creating lanes
+        self.assertIn(await asyncio.wait_for(flushing, 5), chain.txs)
+
+    async def test_unconfirmed_depth_binary_search(self):
+        logger, chain = make_logger({"max_unconfirmed_chain": 4})
+        for i in range(2):
+            await self.flush(logger, i)
+        chain.mine()
+        for i in range(2, 4):
+            await self.flush(logger, i)
+        looked_up = self.counting(chain, "get_tx")
+        await self.flush(logger, 4)  # at the limit: finds the two confirmed txs
+        self.assertEqual(len(looked_up), 2)
+        self.assertEqual(len(logger.store.lanes(logger.address)[0]["unconfirmed"]), 3)
+        await self.flush(logger, 5)
+        with self.assertRaisesRegex(RuntimeError, "waiting for a block"):
+            await self.flush(logger, 6)  # nothing else confirmed
+        chain.mine()
+        self.assertIsNotNone(await logger.flush())
+
+    async def test_crashed_lane_adopts_only_its_own_change(self):
+        logger, chain = make_logger({"lease_ttl": 0.05})
+        await self.flush(logger, 0)
+        # A worker spends the lane and dies before saving; the change is the only output of ours
+        lane = await logger.lanes.acquire()
+        tx, _ = logger._build_log_tx(lane, await logger._source_tx(lane), [b"lost"])
+        await chain.broadcast(tx.hex())
+        chain.fund(logger.address, 90_000)  # unclaimed too, e.g. a live worker's unsaved change
+        await asyncio.sleep(0.1)
+        txid = await self.flush(logger, 1)
+        self.assertEqual(chain.get_tx_sync(txid)["vin"][0]["txid"], tx.txid())
+
+class TestMerkleMode(unittest.IsolatedAsyncioTestCase):
+    async def test_anchor_only_in_merkle_mode(self):
+        cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+        try:
+            plain = AuditLogger(WIF, config={"batch_mode": "memory"}, client=SimulatedChain())
+            self.assertFalse(os.path.exists("audit_leaves"))  # no leaf directory or frontier file
+            with self.assertRaisesRegex(ValueError, "anchor='merkle'"):
+                plain.merkle_root()
+            with self.assertRaisesRegex(ValueError, "anchor='merkle'"):
+                await plain.get_anchored_actions("00" * 32)
+            await plain.close(flush=False)
+        finally:
+            os.chdir(cwd)
+
+    async def test_failed_anchor_broadcast_is_not_pending(self):
+        logger, chain = make_logger({"anchor": "merkle"})
+
+        async def rejected(tx_hex):
+            raise RuntimeError("Broadcast failed")
+        broadcast, chain.broadcast = chain.broadcast, rejected
+        logger.log({"i": 0})
+        with self.assertRaises(RuntimeError):
+            await logger.flush()
+        self.assertEqual(logger.anchor._pending, {})
+        chain.broadcast = broadcast
+        txid = await logger.flush()
+        self.assertEqual([a["i"] for a in await logger.get_anchored_actions(txid)], [0])
+        self.assertEqual(logger.merkle_root()["count"], 1)
+
+class TestVerifyLogs(unittest.IsolatedAsyncioTestCase):
+    async def test_needs_a_trusted_checkpoint(self):
+        logger, chain = make_logger()
+        logger.log({"i": 0})
+        txid = await logger.flush()
+        chain.mine()
+        with self.assertRaisesRegex(ValueError, "header_checkpoint"):
+            await logger.verify_logs([txid])
+        logger.config.update({"header_checkpoint": 1, "header_checkpoint_hash": chain.blocks[1]["hash"]})
+        self.assertEqual((await logger.verify_logs([txid]))["verified"], {txid: chain.height})
+
+class TestLaneHistory(unittest.IsolatedAsyncioTestCase):
+    LANES = {"lanes": 4, "lane_min_value": 4500, "fee_rate": 0.5}
+
+    async def log_concurrently(self, logger, flushes, width=4):
+        async def one(i):
+            logger.log({"i": i})
+            await logger.flush()
+        for start in range(0, flushes, width):
+            await asyncio.gather(*(one(i) for i in range(start, min(flushes, start + width))))
+
+    async def test_history_follows_every_lane_through_splits_and_merges(self):
+        logger, chain = make_logger(self.LANES, fund=20_000)
+        await self.log_concurrently(logger, 24)
+        merges = [t for t in chain.txs.values() if len(t["parsed"]["vin"]) > 1]
+        self.assertTrue(merges)  # lanes ran low and were merged and re-split
+        self.assertEqual([p["seq"] for p in await logger.get_history()], list(range(24)))
+        # A fresh index walks every lane back from the chain, across the merge
+        fresh, _ = make_logger(self.LANES, chain=chain, fund=0)
+        self.assertEqual([p["seq"] for p in await fresh.get_history(refresh=True)], list(range(24)))
+        streamed, _ = make_logger({**self.LANES, "history_read_ahead": 1}, chain=chain, fund=0)
+        self.assertEqual([p["seq"] async for p in streamed.iter_history(refresh=True)], list(range(23, -1, -1)))
+        self.assertEqual([p["seq"] async for p in streamed.iter_history()], list(range(23, -1, -1)))
+
+    async def test_unindexed_split_triggers_a_resync(self):
+        logger, chain = make_logger(self.LANES, fund=20_000)
+        await self.log_concurrently(logger, 4)
+        # The first split spends the funding tx, which is not a log and never indexed
+        self.assertTrue(logger._history_gaps)
+        looked_up = []
+        get_tx = chain.get_tx
+
+        async def counting(txid):
+            looked_up.append(txid)
+            return await get_tx(txid)
+        chain.get_tx = counting
+        self.assertEqual([p["seq"] for p in await logger.get_history()], list(range(4)))
+        self.assertTrue(looked_up)
+        self.assertFalse(logger._history_gaps)
+        looked_up.clear()
+        await logger.get_history()
+        self.assertEqual(looked_up, [])  # indexed now: served locally
+
+class TestShardedHistory(unittest.IsolatedAsyncioTestCase):
+    async def test_sharded_payloads_are_reassembled(self):
+        config = {"max_payload_kb": 1, "shard_kb": 0.25, "shards_per_tx": 2, "codec": "none"}
+        logger, chain = make_logger(config)
+        notes = [os.urandom(1200).hex() for _ in range(2)]
+        for note in notes:
+            logger.log({"note": note})
+            await logger.flush()
+        self.assertGreater(len(chain.txs), 2 * 4)  # several txs per payload
+        self.assertEqual([p["metrics"][0]["note"] for p in await logger.get_history()], notes)
+        fresh, _ = make_logger(config, chain=chain, fund=0)
+        self.assertEqual([p["metrics"][0]["note"] for p in await fresh.get_history(refresh=True)], notes)
+        streamed, _ = make_logger(config, chain=chain, fund=0)
+        self.assertEqual([p["metrics"][0]["note"] async for p in streamed.iter_history(refresh=True)], notes[::-1])
+
+    async def test_tampered_shard_set_is_skipped(self):
+        logger, chain = make_logger({"max_payload_kb": 1, "shard_kb": 0.25, "codec": "none"})
+        logger.log({"note": "kept"})
+        await logger.flush()
+        # Anyone can pay our address a tx carrying a shard set that fails its integrity check
+        shard = bytearray(ShardUtils.split(os.urandom(60), 512)[0])
+        shard[-1] ^= 0xFF
+        script = address_to_script(logger.address)
+        raw = (b"\x01\x00\x00\x00" + b"\x01" + b"\x00" * 32 + b"\xff\xff\xff\xff" + b"\x01\x07\xff\xff\xff\xff"
+               + b"\x02" + bytes(8) + bytes([len(shard) + 3, 0x6a, 0x4c, len(shard)]) + bytes(shard)
+               + (1000).to_bytes(8, "little") + bytes([len(script)]) + script + bytes(4))
+        chain._accept(raw.hex(), parse_tx(raw.hex()), spends=[])
+        chain.mine()
+        fresh, _ = make_logger(chain=chain, fund=0)
+        self.assertEqual([p["metrics"][0]["note"] for p in await fresh.get_history(refresh=True)], ["kept"])
+        streamed, _ = make_logger(chain=chain, fund=0)
+        self.assertEqual([p["metrics"][0]["note"] async for p in streamed.iter_history(refresh=True)], ["kept"])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+from batch_journal import BatchJournal
+
+class TestBatchJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def test_append_rotate_replay_discard(self):
+        journal = BatchJournal(self.dir, fsync="never", segment_kb=1)
+        for i in range(100):
+            journal.append({"action": "test", "i": i})
+        self.assertGreater(len(journal.segments()), 1)  # rotated by size
+        sealed = journal.rotate()
+        journal.append({"action": "late"})
+        self.assertEqual([r["i"] for r in journal.replay(sealed)], list(range(100)))
+        journal.discard(sealed)
+        self.assertEqual(journal.replay(), [{"action": "late"}])
+
+    def test_torn_tail_is_skipped(self):
+        journal = BatchJournal(self.dir, fsync="always")
+        journal.append({"i": 1})
+        journal.close()
+        with open(journal.segments()[-1], "ab") as f:
+            f.write(b'{"i": 2')
+        reopened = BatchJournal(self.dir)
+        reopened.append({"i": 3})
+        self.assertEqual(reopened.replay(), [{"i": 1}, {"i": 3}])
+
+    def test_directory_is_exclusive(self):
+        journal = BatchJournal(self.dir)
+        with self.assertRaises(RuntimeError):
+            BatchJournal(self.dir)  # would replay and discard the first journal's segments
+        journal.close()
+        BatchJournal(self.dir).close()
+
+if __name__ == '__main__':
+    unittest.main()
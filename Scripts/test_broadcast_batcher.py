@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from broadcast_batcher import BroadcastBatcher, tx_id
+
+def raw_tx(parent_txid, tag):
+    # version | 1 input spending parent:0 | 1 OP_RETURN <tag> output | locktime
+    return ("01000000" + "01" + bytes.fromhex(parent_txid)[::-1].hex() + "00000000" + "00" + "ffffffff"
+            + "01" + "00" * 8 + "02" + "6a" + f"{tag:02x}" + "00000000")
+
+class StandInBroadcaster:
+    """Local stand-in for a multi-tx endpoint: rejects txs whose parent it has not seen."""
+    def __init__(self, known):
+        self.known = set(known)
+        self.batches = []
+
+    async def broadcast_many(self, tx_hexes):
+        self.batches.append([tx_id(h) for h in tx_hexes])
+        results = []
+        for h in tx_hexes:
+            if h[10:74] and bytes.fromhex(h[10:74])[::-1].hex() in self.known:
+                self.known.add(tx_id(h))
+                results.append((tx_id(h), None))
+            else:
+                results.append((None, "Missing inputs"))
+        return results
+
+class SlowBroadcaster(StandInBroadcaster):
+    async def broadcast_many(self, tx_hexes):
+        await asyncio.sleep(0.05)
+        return await super().broadcast_many(tx_hexes)
+
+class TestBroadcastBatcher(unittest.TestCase):
+    def test_batches_in_dependency_order(self):
+        funding = "ab" * 32
+        parent = raw_tx(funding, 1)
+        child = raw_tx(tx_id(parent), 2)
+        orphan = raw_tx("cd" * 32, 3)
+        stand_in = StandInBroadcaster([funding])
+        batcher = BroadcastBatcher(stand_in, window=0.01)
+
+        async def run():
+            return await asyncio.gather(batcher.submit(child), batcher.submit(parent),
+                                        batcher.submit(orphan), return_exceptions=True)
+        child_result, parent_result, orphan_result = asyncio.run(run())
+        self.assertEqual(len(stand_in.batches), 1)
+        self.assertEqual(stand_in.batches[0][:2], [tx_id(parent), tx_id(child)])
+        self.assertEqual((parent_result, child_result), (tx_id(parent), tx_id(child)))
+        self.assertIsInstance(orphan_result, RuntimeError)
+
+    def test_sync_callers(self):
+        funding = "ef" * 32
+        tx = raw_tx(funding, 4)
+        batcher = BroadcastBatcher(StandInBroadcaster([funding]), window=0.01)
+        self.assertEqual(batcher.submit_threadsafe(tx, timeout=5), tx_id(tx))
+
+    def test_close_resolves_every_caller(self):
+        funding = "12" * 32
+        first, second = raw_tx(funding, 5), raw_tx(funding, 6)
+        batcher = BroadcastBatcher(SlowBroadcaster([funding]), window=0.01)
+
+        async def run():
+            sending = asyncio.ensure_future(batcher.submit(first))
+            await asyncio.sleep(0.03)  # the first batch is on the network now
+            queued = asyncio.ensure_future(batcher.submit(second))
+            await batcher.close()
+            return await asyncio.wait_for(asyncio.gather(sending, queued), 1)  # none left hanging
+        self.assertEqual(asyncio.run(run()), [tx_id(first), tx_id(second)])
+
+    def test_one_event_loop_at_a_time(self):
+        funding = "34" * 32
+        batcher = BroadcastBatcher(StandInBroadcaster([funding]), window=0.01)
+        self.assertEqual(asyncio.run(batcher.submit(raw_tx(funding, 7))), tx_id(raw_tx(funding, 7)))
+        self.assertEqual(asyncio.run(batcher.submit(raw_tx(funding, 8))), tx_id(raw_tx(funding, 8)))  # loop finished
+        self.assertEqual(batcher.submit_threadsafe(raw_tx(funding, 9), timeout=5), tx_id(raw_tx(funding, 9)))
+        with self.assertRaisesRegex(RuntimeError, "another event loop"):
+            asyncio.run(batcher.submit(raw_tx(funding, 10)))  # the worker lives on the batcher's own loop
+        asyncio.run(batcher.close())
+        self.assertIsNone(batcher._worker)
+
+if __name__ == '__main__':
+    unittest.main()
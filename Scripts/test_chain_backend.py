@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from chain_backend import ChainBackend, SimulatedChain, hash160, iter_pushes, op_return_data, pubkey_to_address, tx_id, _varint
+
+PUBKEY = bytes.fromhex("02" + "11" * 32)
+
+def spend(txid, vout, value, pubkey=PUBKEY):
+    # 1 input with <sig> <pubkey> | 1 P2PKH output back to the same key
+    script_sig = b"\x47" + b"\x30" * 71 + bytes([len(pubkey)]) + pubkey
+    script = b"\x76\xa9\x14" + hash160(PUBKEY) + b"\x88\xac"
+    raw = (b"\x01\x00\x00\x00" + b"\x01" + bytes.fromhex(txid)[::-1] + vout.to_bytes(4, "little")
+           + _varint(len(script_sig)) + script_sig + b"\xff\xff\xff\xff"
+           + b"\x01" + value.to_bytes(8, "little") + _varint(len(script)) + script + b"\x00" * 4)
+    return raw.hex()
+
+class TestSimulatedChain(unittest.TestCase):
+    def setUp(self):
+        self.chain = SimulatedChain()
+        self.address = pubkey_to_address(PUBKEY)
+        self.funding = self.chain.fund(self.address, 10_000)
+
+    def test_spend_and_mine(self):
+        tx_hex = spend(self.funding, 0, 9_900)
+        self.assertEqual(self.chain.broadcast_sync(tx_hex), tx_id(tx_hex))
+        utxos = self.chain.get_unspent_sync(self.address)
+        self.assertEqual([(u["txid"], u["value"], u["height"]) for u in utxos], [(tx_id(tx_hex), 9_900, 0)])
+        self.assertEqual(self.chain.get_tx_sync(tx_id(tx_hex))["confirmations"], 0)
+        self.chain.mine(2)
+        self.assertEqual(self.chain.get_tx_sync(tx_id(tx_hex))["confirmations"], 2)
+        self.assertEqual(len(self.chain.get_history_sync(self.address)), 2)
+
+    def test_rejects_invalid_spends(self):
+        first = spend(self.funding, 0, 9_900)
+        self.chain.broadcast_sync(first)
+        with self.assertRaisesRegex(RuntimeError, "already spent"):
+            self.chain.broadcast_sync(spend(self.funding, 0, 9_800))
+        with self.assertRaisesRegex(RuntimeError, "Missing inputs"):
+            self.chain.broadcast_sync(spend("ab" * 32, 0, 100))
+        with self.assertRaisesRegex(RuntimeError, "in-belowout"):
+            self.chain.broadcast_sync(spend(tx_id(first), 0, 10_000))
+        with self.assertRaisesRegex(RuntimeError, "pubkey"):
+            self.chain.broadcast_sync(spend(tx_id(first), 0, 100, pubkey=bytes.fromhex("03" + "22" * 32)))
+        self.assertEqual((self.chain.accepted, self.chain.rejected), (2, 4))
+
+class TestScriptParser(unittest.TestCase):
+    def test_every_pushdata_form(self):
+        pushes = [b"", b"a" * 75, b"b" * 76, b"c" * 300, b"d" * 70_000]
+        script = (b"\x6a" + b"\x00" + b"\x4b" + pushes[1] + b"\x4c\x4c" + pushes[2]
+                  + b"\x4d" + (300).to_bytes(2, "little") + pushes[3]
+                  + b"\x4e" + (70_000).to_bytes(4, "little") + pushes[4])
+        data = op_return_data(script)
+        self.assertTrue(all(isinstance(d, memoryview) for d in data))
+        self.assertEqual([bytes(d) for d in data], pushes)
+        self.assertEqual([bytes(d) for d in op_return_data(b"\x00" + script)], pushes)
+
+    def test_non_data_and_truncated_scripts(self):
+        self.assertIsNone(op_return_data(b"\x76\xa9\x14" + b"\x00" * 20 + b"\x88\xac"))
+        self.assertEqual(list(iter_pushes(b"\x51\x02ab\x87")), [b"ab"])
+        with self.assertRaises(ValueError):
+            op_return_data(b"\x6a\x4d\x00\x01" + b"x" * 10)
+        with self.assertRaises(ValueError):
+            op_return_data(b"\x6a\x4e\x00")
+
+class TestChainBackend(unittest.TestCase):
+    def test_incomplete_backend_fails_at_construction(self):
+        class NoBroadcast(ChainBackend):
+            def get_unspent_sync(self, address): return []
+            def get_tx_sync(self, txid): return {"txid": txid, "hex": "00"}
+            def get_history_sync(self, address): return []
+        with self.assertRaisesRegex(TypeError, "broadcast_sync"):
+            NoBroadcast()
+
+        class Minimal(NoBroadcast):
+            BLOCKING = False
+            def broadcast_sync(self, tx_hex): return None
+        backend = Minimal()
+        self.assertEqual(asyncio.run(backend.get_tx_hex("ab")), "00")  # async and derived calls come free
+        self.assertEqual(backend.get_balance_sync("addr"), 0)
+        with self.assertRaises(NotImplementedError):
+            backend.get_chain_height_sync()  # SPV calls are optional
+
+if __name__ == '__main__':
+    unittest.main()
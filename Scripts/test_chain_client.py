@@ -0,0 +1,95 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from chain_client import ChainClient
+
+class ChainInfo(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so the pool holds the connection open
+
+    def do_GET(self):
+        body = b'{"blocks": 850000}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class Stalled(ChainInfo):
+    def do_POST(self):
+        time.sleep(0.5)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class TestChainClient(unittest.TestCase):
+    def test_broadcast_result(self):
+        self.assertEqual(ChainClient._broadcast_result(200, '"ab12"\n'), "ab12")
+        self.assertEqual(ChainClient._broadcast_result(200, "ab12"), "ab12")
+        self.assertEqual(ChainClient._broadcast_result(200, '{"txid": "ab12"}'), "ab12")
+        self.assertIsNone(ChainClient._broadcast_result(200, '""'))
+        with self.assertRaisesRegex(RuntimeError, "Broadcast failed: 257: txn-already-known"):
+            ChainClient._broadcast_result(400, "257: txn-already-known")
+
+    def test_tsc_proof(self):
+        proof = {"index": 1, "txOrId": "ab" * 32, "target": "cd" * 32, "nodes": ["*"]}
+        self.assertEqual(ChainClient._tsc_proof([proof]), proof)
+        self.assertEqual(ChainClient._tsc_proof(proof), proof)
+        for unconfirmed in ([], None, {}):
+            with self.assertRaisesRegex(RuntimeError, "unconfirmed"):
+                ChainClient._tsc_proof(unconfirmed)
+
+    def test_tx_cache_evicts_least_recently_used(self):
+        client = ChainClient("http://127.0.0.1:9", tx_cache_size=2)
+        client.cache_tx("a", "00")
+        client.cache_tx("b", "01")
+        self.assertEqual(client.get_tx_hex_sync("a"), "00")
+        asyncio.run(client.get_tx_hex("a"))  # a is now the most recently used
+        client.cache_tx("c", "02")
+        self.assertEqual(list(client._tx_cache), ["a", "c"])
+        self.assertEqual(client.get_tx_hex_sync("a"), "00")  # sync reads count as use too
+        client.cache_tx("d", "03")
+        self.assertEqual(list(client._tx_cache), ["a", "d"])
+        ChainClient("http://127.0.0.1:9", tx_cache_size=0).cache_tx("a", "00")  # caching disabled: no-op
+
+    def test_new_event_loop_closes_the_old_pool(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ChainInfo)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = ChainClient(f"http://127.0.0.1:{server.server_port}")
+        try:
+            self.assertEqual(asyncio.run(client.get_chain_height()), 850000)
+            first = client._session
+            self.assertEqual(asyncio.run(client.get_chain_height()), 850000)
+            self.assertTrue(first.closed)
+            self.assertIsNot(client._session, first)
+        finally:
+            asyncio.run(client.close())
+            server.shutdown()
+            server.server_close()
+
+    def test_transport_errors_raise_runtime_error(self):
+        refused = ChainClient(f"http://127.0.0.1:{free_port()}")
+        with self.assertRaisesRegex(RuntimeError, "GET /chain/info failed"):
+            asyncio.run(refused.get_chain_height())
+        with self.assertRaisesRegex(RuntimeError, "GET /chain/info failed"):
+            refused.get_chain_height_sync()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Stalled)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        slow = ChainClient(f"http://127.0.0.1:{server.server_port}", timeout=0.1)
+        try:
+            with self.assertRaisesRegex(RuntimeError, "POST /tx/raw failed: .*Timeout"):
+                asyncio.run(slow.broadcast("00"))
+        finally:
+            asyncio.run(refused.close())
+            asyncio.run(slow.close())
+            server.shutdown()
+            server.server_close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from unittest import mock
+from fee_utils import FeeEngine, P2PKH_SCRIPT_SIZE
+
+class TestFeeEngine(unittest.TestCase):
+    def test_fee_scales_with_size(self):
+        fees = FeeEngine(rate=0.5)
+        self.assertEqual(FeeEngine.tx_size(1, [P2PKH_SCRIPT_SIZE] * 2), 226)
+        self.assertEqual(fees.payment_fee(), 113)
+        small = fees.fee_for(1, [FeeEngine.op_return_size(10), P2PKH_SCRIPT_SIZE])
+        large = fees.fee_for(1, [FeeEngine.op_return_size(50000), P2PKH_SCRIPT_SIZE])
+        self.assertLess(small, 300)
+        self.assertGreater(large, 25000)
+
+    def test_discovered_rate_is_cached(self):
+        resp = mock.Mock(status_code=200)
+        resp.json.return_value = {"policy": {"miningFee": {"satoshis": 1, "bytes": 1000}}}
+        fees = FeeEngine(policy_url="https://arc.example/v1/policy", ttl=60)
+        with mock.patch("fee_utils.requests.get", return_value=resp) as get:
+            self.assertEqual(fees.rate(), 0.001)
+            self.assertEqual(fees.rate(), 0.001)
+            self.assertEqual(get.call_count, 1)
+        fees._fetched_at -= 61
+        with mock.patch("fee_utils.requests.get", side_effect=ValueError("down")):
+            self.assertEqual(fees.rate(), 0.001)  # keeps the last known rate
+
+if __name__ == '__main__':
+    unittest.main()
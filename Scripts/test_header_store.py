@@ -0,0 +1,107 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from chain_backend import SimulatedChain, pubkey_to_address
+from header_store import HeaderStore, block_hash, header_from_json, header_target, merkle_root_from_path
+
+# Bitcoin genesis block, as WhatsOnChain serves it
+GENESIS = {"hash": "000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f", "version": 1,
+           "merkleroot": "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b",
+           "time": 1231006505, "bits": "1d00ffff", "nonce": 2083236893}
+
+class TestHeaderStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "headers.bin")
+        self.chain = SimulatedChain()
+        address = pubkey_to_address(bytes.fromhex("02" + "11" * 32))
+        self.txids = [self.chain.fund(address, 1_000 + i, confirmed=False) for i in range(6)]
+        self.chain.mine(3)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_mainnet_genesis_header(self):
+        header = header_from_json(GENESIS)
+        self.assertEqual(block_hash(header), GENESIS["hash"])
+        with HeaderStore(self.path, checkpoint=GENESIS["hash"]) as headers:
+            headers.add([header], 0)
+            self.assertEqual(headers.height_of(GENESIS["hash"]), 0)
+            # the genesis block holds only its coinbase, so the txid is the merkle root
+            self.assertEqual(headers.verify_tsc({"index": 0, "txOrId": GENESIS["merkleroot"],
+                                                 "target": GENESIS["hash"], "nodes": []}), 0)
+
+    def test_sync_and_verify_proofs(self):
+        with HeaderStore(self.path, checkpoint=self.chain.blocks[0]["hash"]) as headers:
+            self.assertEqual(asyncio.run(headers.sync(self.chain)), 3)
+            for txid in self.txids:
+                proof = self.chain.get_merkle_proof_sync(txid)
+                self.assertEqual(headers.verify_tsc(proof, txid), 1)
+            proof = self.chain.get_merkle_proof_sync(self.txids[5])
+            self.assertEqual(proof["nodes"][0], "*")  # 7 leaves with the coinbase; the last pairs with itself
+            self.assertIsNone(headers.verify_tsc(proof, self.txids[4]))
+            proof = self.chain.get_merkle_proof_sync(self.txids[2])
+            self.assertIsNone(headers.verify_tsc(dict(proof, index=proof["index"] ^ 1), self.txids[2]))
+            self.chain.mine()
+            with self.assertRaisesRegex(ValueError, "not in"):
+                headers.verify_tsc({"index": 0, "txOrId": self.txids[0], "nodes": [],
+                                    "target": self.chain.blocks[4]["hash"]})
+        with HeaderStore(self.path) as reopened:  # persisted; picks up where it left off
+            self.assertEqual(reopened.tip, 3)
+            self.assertEqual(asyncio.run(reopened.sync(self.chain)), 4)
+            self.assertEqual(reopened.height_of(self.chain.blocks[4]["hash"]), 4)
+
+    def test_rejects_unlinked_or_unmined_headers(self):
+        with HeaderStore(self.path, base_height=1, checkpoint=self.chain.blocks[1]["hash"]) as headers:
+            other = SimulatedChain()
+            other.mine()
+            with self.assertRaisesRegex(ValueError, "checkpoint"):
+                headers.add([other.get_header_sync(1)], 1)  # mined, but not the trusted block
+            headers.add([self.chain.get_header_sync(1)], 1)
+            with self.assertRaisesRegex(ValueError, "link"):
+                headers.add([self.chain.get_header_sync(3)], 2)
+            bad = bytearray(self.chain.get_header_sync(2))
+            bad[-4:] = bytes(4)
+            while int(block_hash(bytes(bad)), 16) <= 0x7fffff << 232:  # grind a nonce that misses the target
+                bad[-1] += 1
+            with self.assertRaisesRegex(ValueError, "proof-of-work"):
+                headers.add([bytes(bad)], 2)
+            self.assertEqual(headers.tip, 1)
+
+    def test_checkpoint_is_required_and_kept(self):
+        with self.assertRaisesRegex(ValueError, "checkpoint"):
+            HeaderStore(self.path)
+        HeaderStore(self.path, checkpoint=self.chain.blocks[0]["hash"]).close()
+        with self.assertRaisesRegex(ValueError, "different checkpoint"):
+            HeaderStore(self.path, checkpoint=self.chain.blocks[1]["hash"])
+        with HeaderStore(self.path) as reopened:  # the stored checkpoint applies
+            with self.assertRaisesRegex(ValueError, "checkpoint"):
+                reopened.add([self.chain.get_header_sync(1)], 0)
+
+    def test_minimum_work_floor(self):
+        floor = header_target(SimulatedChain.BITS) >> 1
+        with HeaderStore(self.path, checkpoint=self.chain.blocks[0]["hash"], max_target=floor) as headers:
+            with self.assertRaisesRegex(ValueError, "floor"):
+                headers.add([self.chain.get_header_sync(0)], 0)
+
+    def test_reorg_needs_more_work(self):
+        with HeaderStore(self.path, checkpoint=self.chain.blocks[0]["hash"]) as headers:
+            asyncio.run(headers.sync(self.chain))
+            fork = SimulatedChain()  # same genesis, different blocks after it
+            fork.mine(3)
+            with self.assertRaisesRegex(ValueError, "less work"):
+                asyncio.run(headers.sync(fork))
+            self.assertEqual(headers.height_of(self.chain.blocks[3]["hash"]), 3)
+            fork.mine()
+            self.assertEqual(asyncio.run(headers.sync(fork)), 4)
+            self.assertEqual(headers.height_of(fork.blocks[3]["hash"]), 3)
+
+    def test_merkle_root_from_path_matches_block(self):
+        block = self.chain.blocks[1]
+        proof = self.chain.get_merkle_proof_sync(block["txids"][3])
+        self.assertEqual(merkle_root_from_path(block["txids"][3], proof["index"], proof["nodes"]),
+                         block["header"][36:68])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+from history_index import HistoryIndex
+
+class TestHistoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = HistoryIndex(os.path.join(tempfile.mkdtemp(), "history.db"))
+
+    def tearDown(self):
+        self.index.close()
+
+    def walk(self, walk_id, entries, base_txid=None):
+        # entries newest-first [(txid, prev_txid, payload)], as a chain walk stages them
+        for depth, (txid, prev_txid, payload) in enumerate(entries):
+            self.index.stage(walk_id, depth, "addr", txid, prev_txid, payload)
+        self.index.commit_walk(walk_id, base_txid)
+
+    def test_iter_logs_newest_first(self):
+        self.walk("w0", [("tx2", "tx1", {"seq": 2}), ("tx1", "tx0", {"seq": 1}), ("tx0", None, None)])
+        self.assertEqual([self.index.position(t) for t in ("tx0", "tx1", "tx2")], [0, 1, 2])
+        self.assertEqual([p["seq"] for p in self.index.iter_logs("addr")], [1, 2])
+        self.assertEqual([p["seq"] for p in self.index.iter_logs("addr", newest_first=True)], [2, 1])
+        self.assertEqual(self.index.log_txids("addr"), ["tx1", "tx2"])
+
+    def test_staged_walk_continues_from_base(self):
+        self.walk("w0", [("tx1", "tx0", {"seq": 1}), ("tx0", None, None)])
+        self.index.stage("w1", 0, "addr", "tx3", "tx2", {"seq": 3, "agent_id": "a"})
+        self.index.stage("w1", 1, "addr", "tx2", "tx1", {"seq": 2, "agent_id": "a"})
+        self.index.stage("w2", 0, "addr", "tx9", "tx8", {"seq": 9})
+        self.assertEqual(self.index.staged_by("tx2"), {"w1"})
+        self.assertFalse(self.index.contains("tx3"))
+        self.index.commit_walk("w1", base_txid="tx1")
+        self.index.drop_walk("w2")
+        self.assertEqual([self.index.position(t) for t in ("tx2", "tx3")], [2, 3])
+        self.assertEqual([p["seq"] for p in self.index.get_logs("addr", agent_id="a")], [2, 3])
+        self.assertEqual(self.index.staged_by("tx9"), set())
+
+    def test_append_needs_an_indexed_parent(self):
+        self.walk("w0", [("tx0", None, None)])
+        self.assertTrue(self.index.append("addr", "tx1", "tx0", {"seq": 0}))
+        self.assertFalse(self.index.append("addr", "tx5", "tx4", {"seq": 1}))
+        self.assertEqual(self.index.log_txids("addr"), ["tx1"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+from bsv import PrivateKey
+from chain_backend import SimulatedChain
+from logger_service import AuditLoggerService, ServiceClient
+
+WIFS = {"agent-1": "KwDiBf89QgGbjEhKnhXJuH7LrciVrZi3qYjgd9M7rFU73sVHnoWn",   # private keys 1 and 2
+        "agent-2": "KwDiBf89QgGbjEhKnhXJuH7LrciVrZi3qYjgd9M7rFU74NMTptX4"}
+
+class TestAuditLoggerService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.chain = SimulatedChain()
+        for wif in WIFS.values():
+            self.chain.fund(PrivateKey(wif).address(compressed=True), 50_000)
+        self.service = AuditLoggerService(config={"batch_mode": "file"}, state_dir=os.path.join(self.dir, "state"),
+                                          client=self.chain)
+
+    async def asyncTearDown(self):
+        await self.service.close(flush=False)
+
+    def test_agent_paths_are_per_agent(self):
+        one = self.service.register("agent-1", WIFS["agent-1"])
+        two = self.service.register("agent-2", WIFS["agent-2"], {"leaf_dir": os.path.join(self.dir, "mine")})
+        self.assertNotEqual(one.journal.directory, two.journal.directory)
+        self.assertTrue(one.cache_file.startswith(os.path.join(self.dir, "state", "agent-1")))
+        self.assertEqual(two.config["leaf_dir"], os.path.join(self.dir, "mine"))  # register() config still wins
+        self.assertIs(self.service.register("agent-1", WIFS["agent-1"]), one)
+        with self.assertRaises(ValueError):
+            self.service.register("agent-3", WIFS["agent-1"])  # one key, one agent
+        with self.assertRaisesRegex(ValueError, "journal_dir"):
+            AuditLoggerService(config={"journal_dir": "shared"}, state_dir=os.path.join(self.dir, "other"))
+
+    async def test_dispatch_errors(self):
+        response = await self.service._dispatch(b'{"id": 7, "op": "explode"}')
+        self.assertEqual((response["id"], response["ok"]), (7, False))
+        self.assertIn("Unknown op", response["error"])
+        response = await self.service._dispatch(b"not json")
+        self.assertFalse(response["ok"])
+        response = await self.service._dispatch(json.dumps({"id": 8, "op": "log", "agent_id": "nobody",
+                                                              "entry": {}}).encode())
+        self.assertEqual(response, {"id": 8, "ok": False, "error": "ValueError: Unknown agent: nobody"})
+
+    async def test_socket_round_trip(self):
+        path = os.path.join(self.dir, "service.sock")
+        await self.service.serve(path)
+        client = ServiceClient(path)
+        try:
+            self.assertTrue(await client.call("register", agent_id="agent-1", priv_wif=WIFS["agent-1"]))
+            self.assertTrue(await client.call("register", agent_id="agent-2", priv_wif=WIFS["agent-2"]))
+            for i in range(3):
+                await client.call("log", agent_id="agent-1", entry={"action": "tool_call", "i": i})
+            await client.call("log", agent_id="agent-2", entry={"action": "search"})
+            self.assertEqual(await client.call("pending", agent_id="agent-1"), 3)
+            txid = await client.call("flush", agent_id="agent-1")
+            self.assertIn(txid, self.chain.txs)
+            self.assertEqual(list(await client.call("flush_all")), ["agent-1", "agent-2"])
+            history = await client.call("history", agent_id="agent-1")
+            self.assertEqual([m["i"] for m in history[0]["metrics"]], [0, 1, 2])
+            newest = await client.call("history", agent_id="agent-2", action="search", limit=1)
+            self.assertEqual(newest[0]["agent_id"], "agent-2")
+            with self.assertRaisesRegex(RuntimeError, "Unknown agent"):
+                await client.call("flush", agent_id="nobody")
+            self.assertIsNone(await client.call("unregister", agent_id="agent-2"))
+            self.assertEqual(list(self.service.loggers), ["agent-1"])
+        finally:
+            await client.close()
+
+if __name__ == '__main__':
+    unittest.main()
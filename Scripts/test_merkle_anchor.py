@@ -0,0 +1,70 @@
+import asyncio
+import tempfile
+import unittest
+from merkle_anchor import MerkleAnchor, leaf_hash
+from merkle_utils import MerkleUtils
+from payload_pipeline import PayloadPipeline
+
+class TestMerkleAnchor(unittest.TestCase):
+    def setUp(self):
+        self.leaf_dir = tempfile.mkdtemp()
+        self.anchor = MerkleAnchor(PayloadPipeline(), store="local", leaf_dir=self.leaf_dir)
+
+    def commit(self, count):
+        actions = [{"action": "tool_call", "tokens_in": i, "ts": f"2025-01-01T00:00:{i % 60:02d}Z"} for i in range(count)]
+        return actions, asyncio.run(self.anchor.commit({"agent_id": "a", "seq": 1, "metrics": actions}))
+
+    def test_anchor_size_is_constant(self):
+        small = PayloadPipeline().encode(self.commit(3)[1])
+        large = PayloadPipeline().encode(self.commit(3000)[1])
+        self.assertLessEqual(abs(len(large) - len(small)), 4)
+
+    def test_proofs(self):
+        actions, payload = self.commit(7)
+        self.assertNotIn("metrics", payload)
+        self.assertEqual(asyncio.run(self.anchor.load(payload["merkle"])), actions)
+        for index in range(7):
+            proof = asyncio.run(self.anchor.prove(payload["merkle"], index))
+            self.assertEqual(proof["action"], actions[index])
+            self.assertTrue(MerkleAnchor.verify(proof))
+        proof["action"] = {**proof["action"], "tokens_in": 99}
+        self.assertFalse(MerkleAnchor.verify(proof))
+        proofs = asyncio.run(self.anchor.prove_many(payload["merkle"]))
+        self.assertEqual([p["action"] for p in proofs], actions)
+        self.assertTrue(all(MerkleAnchor.verify(p) for p in proofs))
+        self.assertEqual(MerkleAnchor.verify_many(proofs + [proof]), [True] * 7 + [False])
+        multi = asyncio.run(self.anchor.prove_multi(payload["merkle"], [5, 1, 2]))
+        self.assertEqual(multi["actions"], [actions[1], actions[2], actions[5]])
+        self.assertTrue(MerkleAnchor.verify_multi(multi))
+        multi["actions"][0] = actions[0]
+        self.assertFalse(MerkleAnchor.verify_multi(multi))
+
+    def test_running_root_survives_restart(self):
+        first, payload = self.commit(5)
+        self.anchor.advance(payload["merkle"])
+        second, payload = self.commit(3)
+        self.anchor.advance(payload["merkle"])
+        reopened = MerkleAnchor(PayloadPipeline(), store="local", leaf_dir=self.leaf_dir)
+        expected = MerkleUtils.build_merkle_root([leaf_hash(a) for a in first + second]).hex()
+        self.assertEqual(reopened.running_root(), {"root": expected, "count": 8})
+        with reopened.running_store() as tree:
+            self.assertEqual(tree.root().hex(), expected)
+            self.assertEqual(tree.node(0, 6), leaf_hash(second[1]))
+
+    def test_short_leaf_file_is_an_error(self):
+        _, payload = self.commit(4)
+        self.anchor.advance(payload["merkle"])
+        with open(self.anchor.running_leaves, "r+b") as f:
+            f.truncate(3 * 32)  # a leaf lost with the frontier already saved
+        with self.assertRaisesRegex(ValueError, "damaged"):
+            MerkleAnchor(PayloadPipeline(), store="local", leaf_dir=self.leaf_dir)
+
+    def test_discarded_batch_is_forgotten(self):
+        _, payload = self.commit(4)
+        self.anchor.discard(payload["merkle"])
+        self.assertEqual(self.anchor._pending, {})
+        with self.assertRaises(ValueError):
+            self.anchor.advance(payload["merkle"])
+
+if __name__ == '__main__':
+    unittest.main()
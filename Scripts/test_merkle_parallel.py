@@ -0,0 +1,16 @@
+import unittest
+from merkle_parallel import ParallelMerkleBuilder
+from merkle_utils import MerkleUtils, sha256d
+
+class TestParallelMerkleBuilder(unittest.TestCase):
+    def test_matches_serial_root(self):
+        with ParallelMerkleBuilder(workers=2, min_leaves=1, chunks_per_worker=2) as builder:
+            # Sizes around powers of two exercise partial last subtrees of every height
+            for n in (1, 2, 3, 5, 8, 9, 31, 33, 100, 1025):
+                leaves = [sha256d(i.to_bytes(4, "little")) for i in range(n)]
+                self.assertEqual(builder.root(leaves), MerkleUtils.build_merkle_root(leaves))
+            with self.assertRaises(ValueError):
+                builder.root([b"a"] * 20 + [b"bb"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+from merkle_store import MerkleStore
+from merkle_utils import MerkleTree, MerkleUtils, sha256d
+
+class TestMerkleStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.leaf_path = os.path.join(self.dir, "leaves.bin")
+
+    def test_matches_in_memory_tree(self):
+        for n in (1, 2, 5, 70):
+            leaves = [sha256d(bytes([i])) for i in range(n)]
+            MerkleStore.write_leaves(self.leaf_path, leaves)
+            # A tiny chunk forces every level through several streaming steps
+            with MerkleStore.build(self.leaf_path, os.path.join(self.dir, "tree.bin"), chunk=64) as store:
+                tree = MerkleTree(leaves)
+                self.assertEqual(len(store), n)
+                self.assertEqual(store.root(), MerkleUtils.build_merkle_root(leaves))
+                self.assertEqual(store.proofs(), tree.proofs())
+                self.assertEqual(store.multiproof(range(0, n, 3)), tree.multiproof(range(0, n, 3)))
+
+    def test_rejects_bad_files(self):
+        with open(self.leaf_path, "wb") as f:
+            f.write(b"\x00" * 33)
+        with self.assertRaises(ValueError):
+            MerkleStore.build(self.leaf_path, os.path.join(self.dir, "tree.bin"))
+        MerkleStore.write_leaves(self.leaf_path, [sha256d(b"a"), sha256d(b"b")])
+        path = os.path.join(self.dir, "tree.bin")
+        MerkleStore.build(self.leaf_path, path).close()
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 1)
+        with self.assertRaises(ValueError):
+            MerkleStore(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from merkle_utils import MerkleAccumulator, MerkleBatchVerifier, MerkleTree, MerkleUtils, sha256d
+
+def rebuild_root(leaves):
+    nodes = leaves[:]
+    while len(nodes) > 1:
+        if len(nodes) % 2 == 1:
+            nodes.append(nodes[-1])
+        nodes = [sha256d(nodes[i] + nodes[i + 1]) for i in range(0, len(nodes), 2)]
+    return nodes[0]
+
+class TestMerkleAccumulator(unittest.TestCase):
+    def test_roots_match_duplicate_last_convention(self):
+        leaves = [sha256d(bytes([i])) for i in range(70)]
+        acc = MerkleAccumulator()
+        for n, leaf in enumerate(leaves, 1):
+            self.assertEqual(acc.append(leaf), n - 1)
+            self.assertEqual(acc.root(), rebuild_root(leaves[:n]))
+        self.assertEqual(MerkleUtils.build_merkle_root(leaves), rebuild_root(leaves))
+
+    def test_frontier_persists(self):
+        path = os.path.join(tempfile.mkdtemp(), "frontier.bin")
+        leaves = [sha256d(bytes([i])) for i in range(45)]
+        acc = MerkleAccumulator(path).extend(leaves[:37])
+        acc.save()
+        reopened = MerkleAccumulator(path).extend(leaves[37:])
+        self.assertEqual(reopened.count, 45)
+        self.assertEqual(reopened.root(), rebuild_root(leaves))
+        self.assertEqual(os.path.getsize(path), 13 + 32 * bin(37).count("1"))
+
+class TestMerkleTree(unittest.TestCase):
+    def test_bulk_proofs_match_per_index(self):
+        for n in (1, 2, 7, 33):
+            leaves = [sha256d(bytes([i])) for i in range(n)]
+            tree = MerkleTree(leaves)
+            expected = [MerkleUtils.build_merkle_proof(leaves, i) for i in range(n)]
+            self.assertEqual(tree.root(), rebuild_root(leaves))
+            self.assertEqual(tree.proofs(), expected)
+            self.assertEqual(tree.proofs([n - 1, 0]), [expected[-1], expected[0]])
+        hex_leaves = [leaf.hex() for leaf in leaves]
+        self.assertEqual(MerkleUtils.build_merkle_proofs_hex(hex_leaves, [5])[0],
+                         MerkleUtils.build_merkle_proof_hex(hex_leaves, 5))
+        with self.assertRaises(IndexError):
+            tree.proof(n)
+
+    def test_multiproof_and_batch_verifier(self):
+        leaves = [sha256d(bytes([i])) for i in range(100)]
+        tree, indices = MerkleTree(leaves), list(range(20, 60))
+        multi = tree.multiproof(indices)
+        self.assertLess(len(multi), sum(len(tree.proof(i)) for i in indices) // 4)
+        chosen = {i: leaves[i] for i in indices}
+        self.assertTrue(MerkleUtils.verify_merkle_multiproof(chosen, multi, tree.root(), 100))
+        self.assertFalse(MerkleUtils.verify_merkle_multiproof({**chosen, 20: leaves[0]}, multi, tree.root(), 100))
+        self.assertFalse(MerkleUtils.verify_merkle_multiproof(chosen, multi[:-1], tree.root(), 100))
+        verifier = MerkleBatchVerifier(tree.root())
+        self.assertTrue(all(verifier.verify(leaves[i], tree.proof(i), i) for i in indices))
+        self.assertFalse(verifier.verify(leaves[0], tree.proof(1), 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import gzip
+import json
+import unittest
+from metrics_codec import MetricsCodec
+from payload_pipeline import PayloadPipeline, msgpack
+
+PAYLOAD = {
+    "agent_id": "test-agent",
+    "seq": 3,
+    "metrics": [{"action": "tool_call", "tokens_in": i, "tokens_out": 2 * i, "status": "success"} for i in range(50)],
+}
+
+class TestPayloadPipeline(unittest.TestCase):
+    def test_round_trip_codecs(self):
+        for codec in ("none", "zlib", "lzma"):
+            pipeline = PayloadPipeline(codec=codec)
+            data = pipeline.encode(PAYLOAD)
+            self.assertEqual(pipeline.decode(data), PAYLOAD)
+        self.assertLess(len(PayloadPipeline(codec="zlib").encode(PAYLOAD)), len(json.dumps(PAYLOAD)))
+
+    def test_custom_dictionary_is_recorded(self):
+        writer = PayloadPipeline(dictionary=b'{"action":"tool_call","tokens_in":')
+        data = writer.encode(PAYLOAD)
+        self.assertEqual(writer.decode(data), PAYLOAD)
+        with self.assertRaises(ValueError):
+            PayloadPipeline().decode(data)  # reader without that dictionary
+
+    def test_legacy_payloads(self):
+        pipeline = PayloadPipeline()
+        raw = json.dumps(PAYLOAD).encode("utf-8")
+        self.assertEqual(pipeline.decode(raw), PAYLOAD)
+        self.assertEqual(pipeline.decode(gzip.compress(raw)), PAYLOAD)
+
+    def test_metrics_columns_round_trip(self):
+        metrics = [
+            {"action": "tool_call", "tokens_in": 1, "status": "success", "ts": "2025-01-01T00:00:00.000001Z"},
+            {"action": "tool_call", "tokens_in": 2, "status": "failed", "ts": "2025-01-01T00:00:01Z"},
+            {"action": "session_end", "details": {"n": 1}, "ts": "2025-01-01T00:01:00.500000Z"},
+            {"action": "note", "ts": "not a timestamp"},
+        ]
+        self.assertEqual(MetricsCodec.decode(MetricsCodec.encode(metrics)), metrics)
+        kinds = {c[0]: c[1] for c in MetricsCodec.encode(metrics[:3])["c"]}
+        self.assertEqual((kinds["action"], kinds["ts"], kinds["tokens_in"]), ("s", "t", "r"))
+
+    @unittest.skipIf(msgpack is None, "msgpack not installed")
+    def test_columnar_serializer(self):
+        pipeline = PayloadPipeline(serializer="columnar")
+        data = pipeline.encode(PAYLOAD)
+        self.assertEqual(pipeline.decode(data), PAYLOAD)
+        self.assertEqual(PayloadPipeline().decode(data), PAYLOAD)  # readers need no serializer config
+        self.assertLess(len(PayloadPipeline(codec="none", serializer="columnar").encode(PAYLOAD)),
+                        len(PayloadPipeline(codec="none").encode(PAYLOAD)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import warnings
+import pgpy
+from pgpy.constants import CompressionAlgorithm, HashAlgorithm, KeyFlags, PubKeyAlgorithm, SymmetricKeyAlgorithm
+from pgp_utils import PGPManager
+
+def new_key(name):
+    key = pgpy.PGPKey.new(PubKeyAlgorithm.RSAEncryptOrSign, 1024)
+    key.add_uid(pgpy.PGPUID.new(name), usage={KeyFlags.EncryptCommunications, KeyFlags.EncryptStorage},
+                hashes=[HashAlgorithm.SHA256], ciphers=[SymmetricKeyAlgorithm.AES256],
+                compression=[CompressionAlgorithm.ZLIB])
+    return key
+
+class TestPGPManager(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        warnings.simplefilter("ignore")  # pgpy warns about 1024-bit test keys
+        cls.keys = [new_key(f"agent-{i}") for i in range(4)]
+        cls.pubs = [str(key.pubkey) for key in cls.keys]
+
+    def test_every_recipient_can_decrypt(self):
+        sender = PGPManager(multi_public_keys=self.pubs + [self.pubs[1]])
+        self.assertEqual(len(sender.multi_public_keys), 4)
+        encrypted = sender.encrypt_bytes(b"payload" * 100)
+        for key in self.keys:
+            self.assertEqual(PGPManager(private_key_str=str(key)).decrypt_bytes(encrypted), b"payload" * 100)
+        message = pgpy.PGPMessage.from_blob(encrypted)
+        self.assertEqual(len(message.encrypters), 4)  # one wrapped session key per recipient, one ciphertext
+
+    def test_keys_are_parsed_once(self):
+        first = PGPManager.load_key(self.pubs[2])
+        self.assertIs(PGPManager.load_key(self.pubs[2]), first)
+        self.assertIs(PGPManager(public_key_str=self.pubs[2]).public_key, first)
+        self.assertIs(PGPManager._keyring[first.fingerprint], first)
+        armored = PGPManager().encrypt("hi", recipients=[self.pubs[2], self.keys[3].pubkey])
+        self.assertEqual(PGPManager(private_key_str=str(self.keys[3])).decrypt(armored), "hi")
+
+if __name__ == "__main__":
+    unittest.main()
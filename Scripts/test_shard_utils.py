@@ -0,0 +1,57 @@
+import hashlib
+import os
+import unittest
+from shard_utils import ShardUtils, ShardAssembler
+
+class TestShardUtils(unittest.TestCase):
+    def test_round_trip(self):
+        data = os.urandom(5000)
+        shards = ShardUtils.split(data, 1024)
+        self.assertEqual(len(shards), 5)  # 1007-byte bodies
+        self.assertTrue(all(len(s) <= 1024 for s in shards))
+        self.assertEqual(ShardUtils.split(b"small", 1024)[0][ShardUtils.HEADER_SIZE:], b"small")
+        shard_id, index, count, body = ShardUtils.parse(shards[1])
+        self.assertEqual((shard_id, index, count), (hashlib.sha256(data).digest()[:8].hex(), 1, 5))
+        assembler = ShardAssembler()
+        self.assertEqual([assembler.add(s) for s in shards], [None] * 4 + [data])
+        self.assertEqual(assembler.pending, {})
+        with self.assertRaises(ValueError):
+            ShardUtils.split(data, ShardUtils.HEADER_SIZE)
+
+    def test_out_of_order_and_interleaved(self):
+        first, second = os.urandom(3000), os.urandom(2500)
+        a, b = ShardUtils.split(first, 600), ShardUtils.split(second, 600)
+        assembler = ShardAssembler()
+        results = []
+        for pair in zip(reversed(a), b[::-1]):  # newest-first, as a history walk sees them
+            results.extend(assembler.add(s) for s in pair)
+        results.extend(assembler.add(s) for s in a[:len(a) - len(b)][::-1])
+        self.assertEqual([r for r in results if r is not None], [second, first])
+        self.assertIsNone(ShardAssembler().add(a[0]))
+        duplicate = ShardAssembler()
+        self.assertEqual([duplicate.add(s) for s in [a[0], a[0]] + a[1:]][-1], first)  # a repeat does not count twice
+
+    def test_corrupted_shard(self):
+        data = os.urandom(2000)
+        shards = ShardUtils.split(data, 512)
+        bad = bytearray(shards[2])
+        bad[-1] ^= 0xFF
+        assembler = ShardAssembler()
+        self.assertEqual([assembler.add(s) for s in shards[:2] + [bytes(bad)] + shards[3:]], [None] * len(shards))
+        self.assertEqual(assembler.dropped, [ShardUtils.parse(shards[0])[0]])
+        self.assertEqual(assembler.pending, {})  # the bad set is dropped; a good copy still assembles
+        self.assertEqual([assembler.add(s) for s in shards][-1], data)
+        miscounted = shards[0][:15] + b"\x00\x02" + shards[0][17:]  # claims 2 shards instead of 4
+        self.assertEqual([assembler.add(s) for s in [shards[2], shards[3], miscounted]], [None] * 3)
+
+    def test_parse_rejects_non_shards(self):
+        shard = ShardUtils.split(os.urandom(100), 512)[0]
+        self.assertIsNone(ShardUtils.parse(b"not a shard, just a payload"))
+        self.assertIsNone(ShardUtils.parse(shard[:ShardUtils.HEADER_SIZE - 1]))
+        self.assertIsNone(ShardUtils.parse(b"XXXX" + shard[4:]))            # magic
+        self.assertIsNone(ShardUtils.parse(shard[:4] + b"\x02" + shard[5:]))  # version
+        self.assertIsNone(ShardUtils.parse(shard[:13] + b"\x00\x01\x00\x01" + shard[17:]))  # index >= count
+        self.assertIsNone(ShardAssembler().add(b"plain payload"))
+
+if __name__ == '__main__':
+    unittest.main()
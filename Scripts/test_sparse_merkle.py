@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from sparse_merkle import EMPTY, SparseMerkleTree
+
+class TestSparseMerkleTree(unittest.TestCase):
+    def test_inclusion_and_non_inclusion(self):
+        smt = SparseMerkleTree()
+        smt.update({f"session-{i}": f"tx{i}".encode() for i in range(50)})
+        root = smt.root()
+        proof = smt.prove("session-7")
+        self.assertTrue(SparseMerkleTree.verify(proof, root, "session-7", b"tx7"))
+        self.assertFalse(SparseMerkleTree.verify(proof, root, "session-7", b"tx8"))
+        self.assertFalse(SparseMerkleTree.verify(proof, root, "session-7"))
+        absent = smt.prove("session-99")
+        self.assertTrue(SparseMerkleTree.verify(absent, root, "session-99"))
+        self.assertFalse(SparseMerkleTree.verify(absent, root, "session-7"))
+        self.assertLess(len(absent["siblings"]), 20)
+
+    def test_batched_updates_are_canonical(self):
+        one_by_one, batched = SparseMerkleTree(), SparseMerkleTree()
+        for i in range(40):
+            one_by_one.set(f"k{i}", b"v")
+        for i in range(0, 40, 3):
+            one_by_one.delete(f"k{i}")
+        batched.update({f"k{i}": b"v" for i in range(40) if i % 3})
+        self.assertEqual(one_by_one.root(), batched.root())
+        self.assertEqual(one_by_one.branches, batched.branches)
+        batched.update({f"k{i}": None for i in range(40)})
+        self.assertEqual((batched.root(), batched.branches, batched.leaves), (EMPTY, {}, {}))
+
+    def test_persists(self):
+        path = os.path.join(tempfile.mkdtemp(), "sessions.smt")
+        smt = SparseMerkleTree(path)
+        smt.update({f"k{i}": b"v" for i in range(25)})
+        smt.save()
+        reopened = SparseMerkleTree(path)
+        self.assertEqual(reopened.root(), smt.root())
+        self.assertIn("k3", reopened)
+        self.assertNotIn("k30", reopened)
+
+if __name__ == '__main__':
+    unittest.main()
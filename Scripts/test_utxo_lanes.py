@@ -0,0 +1,68 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from utxo_lanes import LaneManager
+from utxo_store import UtxoStore
+
+def lanes(*values):
+    return [{"id": i, "txid": f"{i:02x}" * 32, "vout": 0, "value": v, "tx_hex": None, "unconfirmed": []}
+            for i, v in enumerate(values)]
+
+class TestLaneManager(unittest.IsolatedAsyncioTestCase):
+    async def test_acquire_waits_for_a_release(self):
+        manager = LaneManager(lanes(5000, 6000))
+        first, second = await manager.acquire(), await manager.acquire()
+        self.assertEqual({first["id"], second["id"]}, {0, 1})
+        waiting = asyncio.ensure_future(manager.acquire())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiting.done())
+        await manager.release(second)
+        self.assertIs(await waiting, second)
+        await manager.release(first)
+        await manager.release(first)  # releasing twice does not hand the lane out twice
+        self.assertEqual(manager._idle, [first["id"]])
+
+    async def test_acquire_all_and_reset(self):
+        manager = LaneManager(lanes(5000, 6000, 7000))
+        held = await manager.acquire()
+        everything = asyncio.ensure_future(manager.acquire_all())
+        await asyncio.sleep(0.01)
+        self.assertFalse(everything.done())  # waits for the in-flight lane
+        await manager.release(held)
+        self.assertEqual(sorted(lane["id"] for lane in await everything), [0, 1, 2])
+        waiting = asyncio.ensure_future(manager.acquire())
+        await manager.reset(lanes(9000))
+        self.assertEqual((await waiting)["value"], 9000)  # a flush waiting in acquire() gets the new lane
+        self.assertEqual(manager.total(), 9000)
+        self.assertTrue(manager.low(10_000))
+
+    async def test_store_lanes_are_shared_between_managers(self):
+        path = os.path.join(tempfile.mkdtemp(), "state.db")
+        store, other_store = UtxoStore(path), UtxoStore(path)  # two "processes"
+        store.import_state("addr", None, 0, lanes(5000, 6000))
+        one = LaneManager(store=store, address="addr", poll=0.01)
+        two = LaneManager(store=other_store, address="addr", poll=0.01)
+        try:
+            a, b = await one.acquire(), await two.acquire()
+            self.assertEqual((a["id"], b["id"]), (1, 0))  # highest value first, never the same lane
+            await one.release(a)
+            everything = asyncio.ensure_future(one.acquire_all())
+            await asyncio.sleep(0.03)
+            self.assertFalse(everything.done())  # lane 0 is still leased by the other manager
+            await two.release({**b, "value": 4000})
+            held = await everything
+            self.assertEqual([(lane["id"], lane["value"]) for lane in held], [(0, 4000), (1, 6000)])
+            self.assertEqual(len(two), 2)
+        finally:
+            store.close()
+            other_store.close()
+
+    def test_plan_count(self):
+        self.assertEqual(LaneManager.plan_count(10_000, 4, 2000, fee_sat=100), 4)
+        self.assertEqual(LaneManager.plan_count(10_000, 8, 2000, fee_sat=100), 4)  # (10000 - 100) // 2000
+        self.assertEqual(LaneManager.plan_count(1000, 4, 2000, fee_sat=100), 1)    # always at least one
+        self.assertEqual(LaneManager.plan_count(10_000, 4, 100, fee_sat=0), 4)      # min_value floors at dust
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+import unittest
+from utxo_store import UtxoStore
+
+LANES = [{"id": 0, "txid": "aa" * 32, "vout": 0, "value": 5000, "tx_hex": None, "unconfirmed": []},
+         {"id": 1, "txid": "aa" * 32, "vout": 1, "value": 9000, "tx_hex": None, "unconfirmed": []}]
+
+class TestUtxoStore(unittest.TestCase):
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), "state.db")
+        self.store, self.other = UtxoStore(path), UtxoStore(path)  # two "processes"
+        self.store.import_state("addr", "tx0", 7, LANES)
+
+    def tearDown(self):
+        self.store.close()
+        self.other.close()
+
+    def test_leases_are_exclusive(self):
+        first = self.store.lease("addr", "w1")
+        second = self.other.lease("addr", "w2")
+        self.assertEqual((first["id"], second["id"]), (1, 0))  # highest value first
+        self.assertIsNone(self.other.lease("addr", "w2"))
+        self.store.save("addr", {**first, "txid": "bb" * 32, "value": 8800}, "w1", release=True, last_txid="bb" * 32)
+        again = self.other.lease("addr", "w2")
+        self.assertEqual((again["txid"], again["value"], again["stale"]), ("bb" * 32, 8800, False))
+        self.assertEqual(self.other.state("addr")["last_txid"], "bb" * 32)
+
+    def test_expired_lease_is_taken_over(self):
+        lost = self.store.lease("addr", "crashed", ttl=0.01)
+        self.other.lease("addr", "w2")
+        time.sleep(0.02)
+        taken = self.other.lease("addr", "w2")
+        self.assertEqual((taken["id"], taken["stale"]), (lost["id"], True))
+        with self.assertRaises(RuntimeError):
+            self.store.save("addr", lost, "crashed")
+
+    def test_seq_and_lane_replacement(self):
+        self.assertEqual([self.store.next_seq("addr"), self.other.next_seq("addr")], [7, 8])
+        self.store.lease("addr", "w1")
+        with self.assertRaises(RuntimeError):
+            self.store.replace_lanes("addr", LANES[:1], "w1")  # lane 0 is not leased by w1
+        self.store.lease("addr", "w1")
+        self.assertTrue(self.store.try_lock("addr", "w1"))
+        self.assertFalse(self.other.try_lock("addr", "w2"))
+        self.store.replace_lanes("addr", LANES[:1], "w1")
+        self.assertEqual([lane["id"] for lane in self.other.lanes("addr")], [0])
+
+    def test_adopt_needs_the_lease_and_an_unclaimed_output(self):
+        lost = self.store.lease("addr", "crashed", ttl=0.01)
+        self.other.lease("addr", "w3")
+        time.sleep(0.02)
+        lane = self.other.lease("addr", "w2")
+        change = [{"txid": "cc" * 32, "vout": 1, "value": 8700}, {"txid": "aa" * 32, "vout": 0, "value": 5000}]
+        with self.assertRaises(RuntimeError):
+            self.store.adopt("addr", lost["id"], "crashed", change)  # lease taken over
+        self.assertEqual(self.other.adopt("addr", lane["id"], "w2", change), change[0])  # lane 0 claims aa:0
+        self.assertEqual(self.store.lanes("addr")[lane["id"]]["txid"], "cc" * 32)
+        self.assertIsNone(self.other.adopt("addr", lane["id"], "w2", change))  # both claimed now
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+"""
+utxo_lanes.py - Parallel UTXO lanes for OpenSoul audit logging
+
+Splits an agent's funding into N change outputs ("lanes") so concurrent flushes
+from one key each spend their own output instead of serializing on a single
+change UTXO. Each lane is its own unconfirmed tx chain; lanes are re-split or
+merged when they run low. With a UtxoStore the lanes are shared by every
+process using the key: acquiring a lane leases it in the store, so workers
+never spend the same output. Store writes may wait on another process's
+transaction, so they run in a worker thread, off the event loop.
+"""
+
+import asyncio
+import os
+import socket
+import uuid
+from typing import List, Optional
+
+from bsv import P2PKH, Transaction, TransactionInput, TransactionOutput
+from fee_utils import FeeEngine, P2PKH_SCRIPT_SIZE
+from utxo_store import UtxoStore
+
+DUST_LIMIT = 546
+
+
+class LaneManager:
+    """
+    A lane is a dict: {"id", "txid", "vout", "value", "tx_hex", "unconfirmed"}
+    where tx_hex is the signed source tx of the lane's output (if we built it) and
+    unconfirmed lists our in-flight txids on that lane, oldest first. A lane released
+    with "_stale" set (its output may have been spent unrecorded) comes back from
+    acquire() with "_stale" set, in this process or another one.
+    Usage:
+        lanes = LaneManager(cached_lanes)                        # this process only
+        lanes = LaneManager(store=UtxoStore.shared(path), address=address)  # shared across processes
+        lane = await lanes.acquire()
+        ... spend lane, update lane["txid"/"vout"/"value"/"tx_hex"] ...
+        await lanes.release(lane)
+    """
+
+    def __init__(self, lanes: List[dict] = None, store: UtxoStore = None, address: str = None,
+                 lease_ttl: float = 120.0, poll: float = 0.05):
+        self.lanes = {}
+        self._idle = []
+        self._free = None
+        self._loop = None
+        self.store = store
+        self.address = address
+        self.lease_ttl = lease_ttl  # a crashed worker's lanes become spendable again after this
+        self.poll = poll            # first back-off while every lane is leased by another process
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._released = None
+        if store is None:
+            self._install(lanes or [])
+
+    def __len__(self):
+        if self.store is not None:
+            return len(self.store.lanes(self.address))
+        return len(self.lanes)
+
+    def _queue(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._free is None or self._loop is not loop:
+            self._free = asyncio.Queue()
+            self._loop = loop
+            for lane_id in self._idle:
+                self._free.put_nowait(lane_id)
+        return self._free
+
+    async def reset(self, lanes: List[dict]):
+        """Replace the lane set. Callers must hold every lane (see acquire_all) or none be in use."""
+        if self.store is not None:
+            await asyncio.to_thread(self.store.replace_lanes, self.address, self.to_list(lanes), self.owner)
+        self._install(lanes)
+
+    def _install(self, lanes: List[dict]):
+        self.lanes = {lane["id"]: lane for lane in lanes}
+        self._idle = list(self.lanes)
+        if self._free is not None:
+            # Keep the same queue so flushes already waiting in acquire() pick up the new lanes
+            while not self._free.empty():
+                self._free.get_nowait()
+            for lane_id in self._idle:
+                self._free.put_nowait(lane_id)
+
+    async def acquire(self) -> dict:
+        """Wait for a free lane and take it. A store lane taken over from an expired lease has "_stale" set."""
+        if self.store is not None:
+            return await self._lease()
+        queue = self._queue()
+        while True:
+            lane_id = await queue.get()
+            if lane_id in self._idle:
+                self._idle.remove(lane_id)
+                return self.lanes[lane_id]
+
+    async def release(self, lane: dict):
+        if self.store is not None:
+            try:
+                if lane.pop("_stale", False):
+                    # Keep the lease but let it expire: the next lease reports the lane as stale
+                    await asyncio.to_thread(self.store.save, self.address, lane, self.owner, ttl=0)
+                else:
+                    await asyncio.to_thread(self.store.save, self.address, lane, self.owner, release=True)
+            except RuntimeError as e:
+                print(f"Lane {lane['id']} not saved: {e}")
+            self._wake()
+            return
+        if lane["id"] in self.lanes and lane["id"] not in self._idle:
+            self._idle.append(lane["id"])
+            self._queue().put_nowait(lane["id"])
+
+    async def acquire_all(self) -> List[dict]:
+        """Take every lane, waiting for in-flight flushes (in any process) to return theirs."""
+        if self.store is None:
+            return [await self.acquire() for _ in range(len(self.lanes))]
+        held = {}
+        while True:
+            missing = {lane["id"] for lane in self.store.lanes(self.address)} - held.keys()
+            if not missing:
+                return [held[lane_id] for lane_id in sorted(held)]
+            lane = await self._lease()
+            held[lane["id"]] = lane
+
+    async def save(self, lane: dict, last_txid: str = None):
+        """Persist a lane we are still holding (store only); raises RuntimeError if its lease was lost."""
+        if self.store is not None:
+            await asyncio.to_thread(self.store.save, self.address, lane, self.owner,
+                                    last_txid=last_txid, ttl=self.lease_ttl)
+
+    async def adopt(self, lane: dict, utxos: List[dict]) -> Optional[dict]:
+        """
+        Move a lane we are holding onto the highest-value output in utxos that no lane claims,
+        clearing its source tx and unconfirmed chain. With a store the check and the write are
+        one transaction under the lane's lease. Returns the adopted output, or None.
+        """
+        if self.store is not None:
+            utxo = await asyncio.to_thread(self.store.adopt, self.address, lane["id"], self.owner,
+                                           utxos, self.lease_ttl)
+        else:
+            claimed = {(other["txid"], other["vout"]) for other in self.lanes.values()}
+            utxo = max((u for u in utxos if (u["txid"], u["vout"]) not in claimed),
+                       key=lambda u: u["value"], default=None)
+        if utxo is not None:
+            lane.update({"txid": utxo["txid"], "vout": utxo["vout"], "value": utxo["value"],
+                         "tx_hex": None, "unconfirmed": []})
+            lane.pop("_tx", None)
+        return utxo
+
+    def low(self, min_value: int) -> bool:
+        return any(lane["value"] < min_value for lane in self._current())
+
+    def total(self) -> int:
+        return sum(lane["value"] for lane in self._current())
+
+    def to_list(self, lanes: List[dict] = None) -> List[dict]:
+        """Serializable lane state (drops in-memory-only keys such as parsed txs)."""
+        if lanes is None:
+            lanes = self._current()
+        return [{k: v for k, v in lane.items() if not k.startswith("_")} for lane in lanes]
+
+    # -- shared lanes (UtxoStore) -----------------------------------------------
+
+    def _current(self) -> List[dict]:
+        return self.store.lanes(self.address) if self.store is not None else list(self.lanes.values())
+
+    async def _leased_any(self):
+        lane = await asyncio.to_thread(self.store.lease, self.address, self.owner, self.lease_ttl)
+        if lane is None:
+            return None
+        # Keep the parsed source tx if the lane has not moved since we last held it
+        cached = self.lanes.get(lane["id"])
+        if lane.pop("stale"):
+            lane["_stale"] = True
+        elif cached is not None and cached.get("_tx") is not None and cached["txid"] == lane["txid"]:
+            lane["_tx"] = cached["_tx"]
+        self.lanes[lane["id"]] = lane
+        return lane
+
+    async def _lease(self) -> dict:
+        delay = self.poll
+        while True:
+            lane = await self._leased_any()
+            if lane is not None:
+                return lane
+            # Woken early by a release in this process; otherwise back off and poll the store
+            event = self._release_event()
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), delay)
+            except asyncio.TimeoutError:
+                delay = min(delay * 2, 1.0)
+
+    def _release_event(self) -> asyncio.Event:
+        loop = asyncio.get_running_loop()
+        if self._released is None or self._released[0] is not loop:
+            self._released = (loop, asyncio.Event())
+        return self._released[1]
+
+    def _wake(self):
+        if self._released is not None:
+            self._released[1].set()
+
+    async def try_lock(self) -> bool:
+        """Cross-process lock for changing the lane set; always granted without a store."""
+        return self.store is None or await asyncio.to_thread(self.store.try_lock, self.address, self.owner,
+                                                             self.lease_ttl)
+
+    async def unlock(self):
+        if self.store is not None:
+            await asyncio.to_thread(self.store.unlock, self.address, self.owner)
+
+    @staticmethod
+    def plan_count(total: int, wanted: int, min_value: int, fee_sat: int = None) -> int:
+        """How many lanes total can fund with at least min_value each (at least 1)."""
+        if fee_sat is None:
+            fee_sat = FeeEngine.shared().payment_fee(1, wanted)
+        return max(1, min(wanted, (total - fee_sat) // max(min_value, DUST_LIMIT + 1)))
+
+    @staticmethod
+    def build_split_tx(priv_key, address: str, sources: list, count: int, fee_sat: int = None):
+        """
+        Spend every (utxo, source_tx) in sources into count equal P2PKH outputs to address.
+        With one source this splits; with several it merges and re-splits in one tx.
+        fee_sat defaults to the shared FeeEngine's fee for the tx size. Returns (tx, output_values).
+        """
+        if fee_sat is None:
+            fee_sat = FeeEngine.shared().fee_for(len(sources), [P2PKH_SCRIPT_SIZE] * count)
+        total = sum(utxo["value"] for utxo, _ in sources)
+        share = (total - fee_sat) // count
+        if share <= DUST_LIMIT:
+            raise ValueError("Insufficient funds to split into lanes")
+        values = [share] * count
+        values[-1] += (total - fee_sat) - share * count  # remainder to the last lane
+        inputs = [
+            TransactionInput(
+                source_transaction=source_tx,
+                source_txid=utxo["txid"],
+                source_output_index=utxo["vout"],
+                unlocking_script_template=P2PKH().unlock(priv_key),
+            )
+            for utxo, source_tx in sources
+        ]
+        outputs = [TransactionOutput(locking_script=P2PKH().lock(address), satoshis=v) for v in values]
+        tx = Transaction(inputs=inputs, outputs=outputs, version=1)
+        tx.sign()
+        return tx, values
+
+# Example usage:
+# lanes = LaneManager([{"id": 0, "txid": txid, "vout": 1, "value": 50000, "tx_hex": None, "unconfirmed": []}])
+# lane = await lanes.acquire()
+# await lanes.release(lane)
+# shared = LaneManager(store=UtxoStore.shared("audit_state.db"), address=address, lease_ttl=60)
@@ -0,0 +1,239 @@
+"""
+utxo_store.py - Shared, crash-safe UTXO lane state for OpenSoul agents
+
+Replaces the per-process JSON cache with one SQLite (WAL) database keyed by
+address, so several worker processes logging with the same agent key see one
+set of lanes instead of overwriting each other's last UTXO. Every change is a
+single transaction, so a crash leaves either the old or the new state.
+
+Processes coordinate through leases: a lane is spendable by whoever holds its
+lease, and a lease that is not released (a crashed worker) expires after its
+TTL so the lane is not lost. The seq counter that orders payloads is allocated
+here too, so it stays unique across processes.
+
+A write may wait up to the busy timeout for another process's transaction, so
+async callers run store calls in a worker thread (see LaneManager); the
+connection is shared between threads behind a lock.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+
+class UtxoStore:
+    """
+    Usage:
+        store = UtxoStore.shared("audit_state.db")
+        lane = store.lease(address, owner, ttl=120)      # None if every lane is busy
+        ... spend lane, update lane["txid"/"vout"/"value"/"tx_hex"/"unconfirmed"] ...
+        store.save(address, lane, owner, release=True)
+    """
+    _shared = {}
+
+    def __init__(self, path: str = "audit_state.db", timeout: float = 30.0):
+        self.path = path
+        # Autocommit; writes use explicit BEGIN IMMEDIATE so read-modify-write steps are atomic across processes
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()  # one statement or transaction on the connection at a time
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS agents (
+                address TEXT PRIMARY KEY,
+                last_txid TEXT,
+                seq INTEGER NOT NULL DEFAULT 0,
+                lock_owner TEXT,
+                lock_until REAL
+            );
+            CREATE TABLE IF NOT EXISTS lanes (
+                address TEXT NOT NULL,
+                lane_id INTEGER NOT NULL,
+                txid TEXT NOT NULL,
+                vout INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                tx_hex TEXT,
+                unconfirmed TEXT NOT NULL DEFAULT '[]',
+                lease_owner TEXT,
+                lease_until REAL,
+                PRIMARY KEY (address, lane_id)
+            );
+        """)
+
+    @classmethod
+    def shared(cls, path: str = "audit_state.db") -> "UtxoStore":
+        """Return the process-wide store for path, opening it on first use."""
+        key = os.path.abspath(path)
+        store = cls._shared.get(key)
+        if store is None:
+            store = cls._shared[key] = cls(path)
+        return store
+
+    @contextmanager
+    def _write(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    @staticmethod
+    def _lane(row) -> dict:
+        lane_id, txid, vout, value, tx_hex, unconfirmed = row
+        return {"id": lane_id, "txid": txid, "vout": vout, "value": value, "tx_hex": tx_hex,
+                "unconfirmed": json.loads(unconfirmed)}
+
+    # -- agent state ----------------------------------------------------------
+
+    def state(self, address: str) -> Optional[dict]:
+        """{"last_txid", "seq"} for address, or None if the store has never seen it."""
+        with self._lock:
+            row = self.conn.execute("SELECT last_txid, seq FROM agents WHERE address = ?", (address,)).fetchone()
+        return {"last_txid": row[0], "seq": row[1]} if row else None
+
+    def import_state(self, address: str, last_txid: str = None, seq: int = 0, lanes: List[dict] = None) -> bool:
+        """Seed an address (e.g. from a legacy JSON cache). No-op if the store already has it."""
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM agents WHERE address = ?", (address,)).fetchone():
+                return False
+            conn.execute("INSERT INTO agents (address, last_txid, seq) VALUES (?, ?, ?)", (address, last_txid, seq))
+            self._insert_lanes(conn, address, lanes or [])
+        return True
+
+    def next_seq(self, address: str) -> int:
+        """Allocate the next payload seq for address."""
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO agents (address) VALUES (?)", (address,))
+            seq = conn.execute("SELECT seq FROM agents WHERE address = ?", (address,)).fetchone()[0]
+            conn.execute("UPDATE agents SET seq = ? WHERE address = ?", (seq + 1, address))
+        return seq
+
+    def try_lock(self, address: str, owner: str, ttl: float = 120.0) -> bool:
+        """Per-address lock for lane-set changes (initial funding, split/merge). Expires after ttl."""
+        now = time.time()
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO agents (address) VALUES (?)", (address,))
+            cur = conn.execute(
+                "UPDATE agents SET lock_owner = ?, lock_until = ? WHERE address = ? "
+                "AND (lock_owner IS NULL OR lock_owner = ? OR lock_until < ?)",
+                (owner, now + ttl, address, owner, now))
+        return cur.rowcount == 1
+
+    def unlock(self, address: str, owner: str):
+        with self._write() as conn:
+            conn.execute("UPDATE agents SET lock_owner = NULL, lock_until = NULL WHERE address = ? AND lock_owner = ?",
+                         (address, owner))
+
+    # -- lanes ----------------------------------------------------------------
+
+    def lanes(self, address: str) -> List[dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT lane_id, txid, vout, value, tx_hex, unconfirmed FROM lanes WHERE address = ? ORDER BY lane_id",
+                (address,)).fetchall()
+        return [self._lane(row) for row in rows]
+
+    def lease(self, address: str, owner: str, ttl: float = 120.0) -> Optional[dict]:
+        """
+        Lease a free lane (never leased or released first, then expired; highest value first).
+        Returns the lane, with "stale": True if it was taken over from an expired lease,
+        or None if every lane is leased.
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT lane_id, txid, vout, value, tx_hex, unconfirmed, lease_owner FROM lanes "
+                "WHERE address = ? AND (lease_owner IS NULL OR lease_until < ?) "
+                "ORDER BY lease_owner IS NOT NULL, value DESC LIMIT 1", (address, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE lanes SET lease_owner = ?, lease_until = ? WHERE address = ? AND lane_id = ?",
+                         (owner, now + ttl, address, row[0]))
+        lane = self._lane(row[:6])
+        lane["stale"] = row[6] is not None
+        return lane
+
+    def save(self, address: str, lane: dict, owner: str, release: bool = False, last_txid: str = None,
+             ttl: float = 120.0):
+        """
+        Persist a leased lane (and optionally the address's last_txid) in one transaction,
+        renewing the lease or releasing it. Raises RuntimeError if the lease was lost.
+        """
+        lease_owner, lease_until = (None, None) if release else (owner, time.time() + ttl)
+        with self._write() as conn:
+            cur = conn.execute(
+                "UPDATE lanes SET txid = ?, vout = ?, value = ?, tx_hex = ?, unconfirmed = ?, "
+                "lease_owner = ?, lease_until = ? WHERE address = ? AND lane_id = ? AND lease_owner = ?",
+                (lane["txid"], lane["vout"], lane["value"], lane.get("tx_hex"), json.dumps(lane.get("unconfirmed", [])),
+                 lease_owner, lease_until, address, lane["id"], owner))
+            if cur.rowcount != 1:
+                raise RuntimeError(f"Lease on lane {lane['id']} of {address} was lost")
+            if last_txid is not None:
+                conn.execute("UPDATE agents SET last_txid = ? WHERE address = ?", (last_txid, address))
+
+    def release(self, address: str, lane_id: int, owner: str):
+        """Give a lease back without changing the lane (e.g. nothing was spent)."""
+        with self._write() as conn:
+            conn.execute("UPDATE lanes SET lease_owner = NULL, lease_until = NULL "
+                         "WHERE address = ? AND lane_id = ? AND lease_owner = ?", (address, lane_id, owner))
+
+    def adopt(self, address: str, lane_id: int, owner: str, utxos: List[dict], ttl: float = 120.0) -> Optional[dict]:
+        """
+        Move a leased lane onto the highest-value output in utxos that no lane claims (change a
+        crashed worker broadcast but never saved). Checked and written in one transaction under
+        the lane's lease, so two workers never adopt the same output. Returns the adopted output
+        (the lane's tx_hex and unconfirmed are cleared), or None if every candidate is claimed.
+        Raises RuntimeError if the lease was lost.
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute("SELECT lease_owner, lease_until FROM lanes WHERE address = ? AND lane_id = ?",
+                               (address, lane_id)).fetchone()
+            if row is None or row[0] != owner or row[1] < now:
+                raise RuntimeError(f"Lease on lane {lane_id} of {address} was lost")
+            claimed = set(conn.execute("SELECT txid, vout FROM lanes WHERE address = ?", (address,)).fetchall())
+            free = [u for u in utxos if (u["txid"], u["vout"]) not in claimed]
+            if not free:
+                return None
+            utxo = max(free, key=lambda u: u["value"])
+            conn.execute("UPDATE lanes SET txid = ?, vout = ?, value = ?, tx_hex = NULL, unconfirmed = '[]', "
+                         "lease_until = ? WHERE address = ? AND lane_id = ?",
+                         (utxo["txid"], utxo["vout"], utxo["value"], now + ttl, address, lane_id))
+        return utxo
+
+    def replace_lanes(self, address: str, lanes: List[dict], owner: str):
+        """Swap the whole lane set (after a split/merge). owner must hold every current lane's lease."""
+        with self._write() as conn:
+            foreign = conn.execute(
+                "SELECT COUNT(*) FROM lanes WHERE address = ? AND (lease_owner IS NULL OR lease_owner != ?)",
+                (address, owner)).fetchone()[0]
+            if foreign:
+                raise RuntimeError(f"Cannot replace lanes of {address}: {foreign} not leased by {owner}")
+            conn.execute("INSERT OR IGNORE INTO agents (address) VALUES (?)", (address,))
+            conn.execute("DELETE FROM lanes WHERE address = ?", (address,))
+            self._insert_lanes(conn, address, lanes)
+
+    @staticmethod
+    def _insert_lanes(conn, address: str, lanes: List[dict]):
+        conn.executemany(
+            "INSERT INTO lanes (address, lane_id, txid, vout, value, tx_hex, unconfirmed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(address, lane["id"], lane["txid"], lane["vout"], lane["value"], lane.get("tx_hex"),
+              json.dumps(lane.get("unconfirmed", []))) for lane in lanes])
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+        key = os.path.abspath(self.path)
+        if self._shared.get(key) is self:
+            del self._shared[key]
+
+# Example usage:
+# store = UtxoStore.shared("audit_state.db")
+# lane = store.lease(address, "worker-1", ttl=60)
+# store.save(address, {**lane, "txid": new_txid, "vout": 1, "value": change}, "worker-1", release=True)
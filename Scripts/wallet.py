@@ -1,5 +1,6 @@
-import requests
 from bsv import PrivateKey, P2PKH, Transaction, TransactionInput, TransactionOutput
+from chain_client import ChainClient
+from fee_utils import FeeEngine
 
 API_BASE_MAIN = "https://api.whatsonchain.com/v1/bsv/main"
 API_BASE_TEST = "https://api.whatsonchain.com/v1/bsv/test"
@@ -26,26 +27,32 @@ class Wallet:
         return priv.address(compressed=True)
 
     @staticmethod
-    def get_balance(address: str, api_base=API_BASE_MAIN):
-        resp = requests.get(f"{api_base}/address/{address}/balance")
-        data = resp.json()
-        return data.get("confirmed", 0) + data.get("unconfirmed", 0)
+    def backend(api_base=API_BASE_MAIN, backend=None):
+        """The chain backend to use: the one passed in (e.g. a SimulatedChain) or WhatsOnChain at api_base."""
+        return backend or ChainClient.shared(api_base)
 
     @staticmethod
-    def get_tx_history(address: str, api_base=API_BASE_MAIN):
-        resp = requests.get(f"{api_base}/address/{address}/txs")
-        return resp.json()
+    def get_balance(address: str, api_base=API_BASE_MAIN, backend=None):
+        return Wallet.backend(api_base, backend).get_balance_sync(address)
 
     @staticmethod
-    def send_payment(priv_wif: str, to_address: str, amount_sat: int, fee_sat: int = 300, api_base=API_BASE_MAIN):
+    def get_tx_history(address: str, api_base=API_BASE_MAIN, backend=None):
+        return Wallet.backend(api_base, backend).get_history_sync(address)
+
+    @staticmethod
+    def send_payment(priv_wif: str, to_address: str, amount_sat: int, fee_sat: int = None, api_base=API_BASE_MAIN,
+                     batcher=None, backend=None):
+        # fee_sat=None: size-based fee from the shared FeeEngine (1 input, payment + change)
+        if fee_sat is None:
+            fee_sat = FeeEngine.shared().payment_fee(1, 2)
         priv = PrivateKey(priv_wif)
         from_address = priv.address(compressed=True)
-        utxos = requests.get(f"{api_base}/address/{from_address}/unspent").json()
+        chain = Wallet.backend(api_base, backend)
+        utxos = chain.get_unspent_sync(from_address)
         utxo = max(utxos, key=lambda u: u.get("height", 0) or u["value"]) if utxos else None
         if not utxo or utxo["value"] < amount_sat + fee_sat:
             raise ValueError("Insufficient funds")
-        source_tx_hex = requests.get(f"{api_base}/tx/{utxo['txid']}/hex").text.strip()
-        source_tx = Transaction.from_hex(source_tx_hex)
+        source_tx = Transaction.from_hex(chain.get_tx_hex_sync(utxo["txid"]))
         tx_input = TransactionInput(
             source_transaction=source_tx,
             source_txid=utxo["txid"],
@@ -61,10 +68,9 @@ class Wallet:
         tx = Transaction(inputs=[tx_input], outputs=outputs, version=1)
         tx.sign()
         tx_hex = tx.hex()
-        resp = requests.post(f"{api_base}/tx/raw", json={"txhex": tx_hex})
-        if resp.status_code != 200:
-            raise RuntimeError(f"Broadcast failed: {resp.text}")
-        return resp.json().get("txid") or tx.txid()
+        if batcher is not None:  # BroadcastBatcher: sent with other txs in one multi-tx broadcast
+            return batcher.submit_threadsafe(tx_hex)
+        return chain.broadcast_sync(tx_hex) or tx.txid()
 
     address_book = {}
     @classmethod
@@ -107,5 +113,6 @@ class Wallet:
         return API_BASE_MAIN if mainnet else API_BASE_TEST
 
     @staticmethod
-    def estimate_fee():
-        return 300  # Replace with dynamic estimation as needed
+    def estimate_fee(inputs: int = 1, outputs: int = 2):
+        """Size-based fee for a P2PKH tx (outputs includes change), at the shared FeeEngine's rate."""
+        return FeeEngine.shared().payment_fee(inputs, outputs)